@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Deadline-Aware Admission Control
+
+Limits how many requests run against the models on one device at a time
+and queues a bounded number of further requests in arrival order. Every
+request gets a deadline derived from its text length. A request that
+cannot start soon enough to finish by its deadline is rejected at once
+(429 when the queue is full, 503 when the backlog is too long, both with
+Retry-After) instead of being accepted and timing out later. Admitted
+requests therefore run at full speed, so goodput stays flat under overload.
+
+The time a request holds its slot is estimated from seconds per character
+of text, learned from recently completed requests. Queued requests are
+dropped when they can no longer make their deadline or when their client
+has disconnected, so a slot is never spent on an answer nobody will get.
+
+Environment Variables:
+    ADMISSION_ENABLED: Set to 0 to let every request through (default: 1)
+    ADMISSION_CONCURRENCY: Requests running at once per device
+        (default: WORKER_PROCESSES on CPU or BATCH_MAX_SIZE, whichever is larger, at least 1)
+    ADMISSION_QUEUE_SIZE: Requests waiting per device before new ones get 429 (default: 16)
+    ADMISSION_COST_PER_CHAR: Initial estimate of slot seconds per text character (default: 0.05)
+    DEADLINE_BASE_SECONDS: Fixed part of each request's deadline (default: 5)
+    DEADLINE_SECONDS_PER_CHAR: Deadline added per text character (default: 0.2)
+    DEADLINE_MAX_SECONDS: Upper bound on any deadline (default: 300)
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") != "0"
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "0"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "16"))
+ADMISSION_COST_PER_CHAR = float(os.getenv("ADMISSION_COST_PER_CHAR", "0.05"))
+DEADLINE_BASE_SECONDS = float(os.getenv("DEADLINE_BASE_SECONDS", "5"))
+DEADLINE_SECONDS_PER_CHAR = float(os.getenv("DEADLINE_SECONDS_PER_CHAR", "0.2"))
+DEADLINE_MAX_SECONDS = float(os.getenv("DEADLINE_MAX_SECONDS", "300"))
+
+# How often a queued request checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 0.25
+# Weight of the newest observation in the cost-per-character estimate
+COST_SMOOTHING = 0.2
+MIN_COST_SECONDS = 0.05
+
+ADMISSION_REJECTED = metrics.REGISTRY.register(metrics.Counter(
+    "xtts_admission_rejected_total", "Requests shed by admission control", labels=("device", "reason")
+))
+ADMISSION_COMPLETED = metrics.REGISTRY.register(metrics.Counter(
+    "xtts_admission_completed_total", "Admitted requests by whether they finished within their deadline",
+    labels=("device", "outcome")
+))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the HTTP status and a Retry-After hint."""
+
+    def __init__(self, message: str, status: int, retry_after: float):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class ClientDisconnected(Exception):
+    """Raised when a queued request's client went away before it was admitted."""
+
+
+def default_concurrency(device: str) -> int:
+    if ADMISSION_CONCURRENCY > 0:
+        return ADMISSION_CONCURRENCY
+    from batching import BATCH_MAX_SIZE
+    from worker_pool import WORKER_PROCESSES
+
+    workers = WORKER_PROCESSES if device == "cpu" else 0
+    return max(1, workers, BATCH_MAX_SIZE)
+
+
+def deadline_seconds(text_length: int) -> float:
+    """Time budget for a request with text_length characters."""
+    return min(DEADLINE_MAX_SECONDS, DEADLINE_BASE_SECONDS + DEADLINE_SECONDS_PER_CHAR * text_length)
+
+
+class Ticket:
+    """One request's claim on an inference slot."""
+
+    def __init__(self, text_length: int, cost: float, deadline):
+        self.text_length = text_length
+        self.cost = cost
+        self.deadline = deadline
+        self.started = None
+        self.released = False
+        self.rejection = None
+        self.admitted = threading.Event()
+        # Called when admitted.set() happens, for waiters on an event loop
+        self.waker = None
+
+    def remaining(self, now: float) -> float:
+        """Estimated seconds of work left, for queued and running tickets alike."""
+        if self.started is None:
+            return self.cost
+        return max(0.0, self.cost - (now - self.started))
+
+
+class AdmissionController:
+    """Concurrency limit, bounded FIFO queue and deadline checks for one device."""
+
+    def __init__(self, device: str, concurrency: int = None, queue_size: int = ADMISSION_QUEUE_SIZE,
+                 cost_per_char: float = ADMISSION_COST_PER_CHAR):
+        self.device = device
+        self.concurrency = concurrency or default_concurrency(device)
+        self.queue_size = queue_size
+        self.cost_per_char = cost_per_char
+        self._running = []
+        self._waiting = deque()
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.on_time = 0
+        self.late = 0
+        self.rejected = {"queue_full": 0, "overloaded": 0, "expired": 0, "disconnected": 0}
+
+    def estimate(self, text_length: int) -> float:
+        """Estimated seconds a request with text_length characters holds its slot."""
+        return max(MIN_COST_SECONDS, self.cost_per_char * text_length)
+
+    def _backlog(self, now: float) -> float:
+        """Estimated seconds until a request queued now would start."""
+        work = sum(t.remaining(now) for t in self._running) + sum(t.cost for t in self._waiting)
+        return work / self.concurrency
+
+    def _reject(self, ticket, reason: str, message: str, status: int, retry_after: float):
+        self.rejected[reason] += 1
+        if metrics.METRICS_ENABLED:
+            ADMISSION_REJECTED.inc(1, self.device, reason)
+        ticket.rejection = AdmissionRejected(message, status, retry_after)
+        return ticket.rejection
+
+    def _start(self, ticket, now: float):
+        ticket.started = now
+        self._running.append(ticket)
+        self.admitted += 1
+        self._wake(ticket)
+
+    @staticmethod
+    def _wake(ticket):
+        ticket.admitted.set()
+        if ticket.waker is not None:
+            ticket.waker()
+
+    def _enqueue(self, text_length: int, deadline: bool, waker=None) -> Ticket:
+        """Start the request or queue it, or raise AdmissionRejected if it cannot make its deadline."""
+        now = time.monotonic()
+        ticket = Ticket(text_length, self.estimate(text_length),
+                        now + deadline_seconds(text_length) if deadline else None)
+        ticket.waker = waker
+        with self._lock:
+            if len(self._running) < self.concurrency and not self._waiting:
+                self._start(ticket, now)
+                return ticket
+            wait = self._backlog(now)
+            if ticket.deadline is not None:
+                if len(self._waiting) >= self.queue_size:
+                    raise self._reject(ticket, "queue_full",
+                                       f"Too many requests waiting ({len(self._waiting)}), try again later",
+                                       429, wait)
+                if now + wait + ticket.cost > ticket.deadline:
+                    raise self._reject(ticket, "overloaded",
+                                       f"Server is overloaded (estimated wait {wait:.1f}s), try again later",
+                                       503, wait)
+            self._waiting.append(ticket)
+        return ticket
+
+    def _check_waiting(self, ticket: Ticket, is_disconnected):
+        """Drop a still-queued ticket whose client left or whose deadline can no longer be met."""
+        gone = is_disconnected is not None and is_disconnected()
+        expired = ticket.deadline is not None and time.monotonic() + ticket.cost > ticket.deadline
+        if not (gone or expired):
+            return
+        with self._lock:
+            if ticket not in self._waiting:
+                # Admitted or rejected in the meantime
+                return
+            self._waiting.remove(ticket)
+            if gone:
+                self.rejected["disconnected"] += 1
+                if metrics.METRICS_ENABLED:
+                    ADMISSION_REJECTED.inc(1, self.device, "disconnected")
+                raise ClientDisconnected("Client disconnected while queued")
+            raise self._reject(ticket, "expired", "Request could not start before its deadline",
+                               503, self._backlog(time.monotonic()))
+
+    def acquire(self, text_length: int, is_disconnected=None, deadline: bool = True) -> Ticket:
+        """
+        Wait for a slot and return the request's Ticket.
+
+        Raises AdmissionRejected if the request cannot finish by its deadline
+        or the queue is full, and ClientDisconnected if is_disconnected()
+        turns true while it waits. With deadline=False (background jobs) the
+        request never times out and is not bounded by the queue size; it
+        only waits its turn.
+        """
+        ticket = self._enqueue(text_length, deadline)
+        while not ticket.admitted.wait(DISCONNECT_POLL_SECONDS):
+            self._check_waiting(ticket, is_disconnected)
+        if ticket.rejection is not None:
+            raise ticket.rejection
+        return ticket
+
+    async def acquire_async(self, text_length: int, is_disconnected=None, deadline: bool = True) -> Ticket:
+        """
+        acquire() for asyncio servers: waits on the event loop instead of
+        blocking a thread. If the waiting task is cancelled, its place in
+        the queue (or a slot it was just given) is returned.
+        """
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        ticket = self._enqueue(text_length, deadline, waker=lambda: loop.call_soon_threadsafe(woken.set))
+        try:
+            while not ticket.admitted.is_set():
+                try:
+                    await asyncio.wait_for(woken.wait(), DISCONNECT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    self._check_waiting(ticket, is_disconnected)
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = ticket in self._waiting
+                if queued:
+                    self._waiting.remove(ticket)
+            if not queued and ticket.rejection is None:
+                self.release(ticket, success=False)
+            raise
+        if ticket.rejection is not None:
+            raise ticket.rejection
+        return ticket
+
+    def release(self, ticket: Ticket, success: bool = True):
+        """Return the slot and hand it to the next queued request that can still make its deadline."""
+        now = time.monotonic()
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._running.remove(ticket)
+
+            elapsed = now - ticket.started
+            if success and ticket.text_length > 0:
+                observed = elapsed / ticket.text_length
+                self.cost_per_char += COST_SMOOTHING * (observed - self.cost_per_char)
+            outcome = "on_time" if ticket.deadline is None or now <= ticket.deadline else "late"
+            if outcome == "on_time":
+                self.on_time += 1
+            else:
+                self.late += 1
+            if metrics.METRICS_ENABLED:
+                ADMISSION_COMPLETED.inc(1, self.device, outcome)
+
+            while self._waiting and len(self._running) < self.concurrency:
+                waiter = self._waiting.popleft()
+                if waiter.deadline is not None and now + waiter.cost > waiter.deadline:
+                    self._reject(waiter, "expired", "Request could not start before its deadline",
+                                 503, self._backlog(now))
+                    self._wake(waiter)
+                    continue
+                self._start(waiter, now)
+
+    @contextmanager
+    def admit(self, text_length: int, is_disconnected=None, deadline: bool = True):
+        """Hold a slot for the duration of the block (see acquire)."""
+        ticket = self.acquire(text_length, is_disconnected=is_disconnected, deadline=deadline)
+        success = False
+        try:
+            yield ticket
+            success = True
+        finally:
+            self.release(ticket, success=success)
+
+    def running(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._waiting)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "device": self.device,
+                "concurrency": self.concurrency,
+                "running": len(self._running),
+                "queued": len(self._waiting),
+                "queue_size": self.queue_size,
+                "estimated_wait_seconds": round(self._backlog(now), 3),
+                "cost_per_char_seconds": round(self.cost_per_char, 5),
+                "admitted": self.admitted,
+                "on_time": self.on_time,
+                "late": self.late,
+                "rejected": dict(self.rejected),
+            }
+
+
+# One controller per device
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission_controller(device: str) -> AdmissionController:
+    """Get the admission controller shared by all models on a device."""
+    with _controllers_lock:
+        if device not in _controllers:
+            _controllers[device] = AdmissionController(device)
+        return _controllers[device]
+
+
+def all_controllers() -> list:
+    with _controllers_lock:
+        return list(_controllers.values())
+
+
+metrics.register_gauge(
+    "xtts_admission_running", "Requests holding an inference slot",
+    lambda: {(c.device,): c.running() for c in all_controllers()}, labels=("device",),
+)
+metrics.register_gauge(
+    "xtts_admission_queued", "Requests waiting for an inference slot",
+    lambda: {(c.device,): c.queue_depth() for c in all_controllers()}, labels=("device",),
+)
@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+Asyncio Web Server for Voice Cloning
+
+Serves the same routes and web UI as web_server.py on an aiohttp event loop,
+so slow uploads, long audio streams and idle keep-alive connections cost a
+coroutine rather than a thread:
+
+- /api/clone, /api/stream, /api/batch and /api/jobs read their multipart
+  bodies as they arrive and stream their responses as audio is produced.
+  Synthesis runs on a dedicated executor sized to the inference hardware,
+  and requests waiting for admission (see admission.py) wait on the event
+  loop instead of holding a thread.
+- /api/jobs/<id>/events follows job progress without a thread per listener.
+- Every other route (the UI, voices, audio files, models, stats, probes and
+  metrics) is handed to the Flask app in web_server.py unchanged. Routes
+  that run the model (creating a voice profile) use the synthesis executor
+  too.
+
+Bodies over MAX_UPLOAD_BYTES (see web_server.py) get a 413 before they are read.
+
+Usage:
+    python async_server.py
+
+Environment Variables:
+    SYNTHESIS_THREADS: Threads running synthesis (default: the admission concurrency of the device)
+    All web_server.py, model_loader.py and admission.py settings apply as well.
+"""
+
+import asyncio
+import functools
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import WSMsgType, web
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+import metrics
+import web_server
+from admission import ADMISSION_ENABLED, AdmissionRejected, ClientDisconnected, default_concurrency, get_admission_controller
+from job_queue import QueueFullError, get_job_manager
+from model_loader import OUTPUT_SAMPLE_RATE, IncrementalSegmenter, get_device
+
+SYNTHESIS_THREADS = int(os.getenv("SYNTHESIS_THREADS", "0"))
+
+# Uploads larger than this are spooled to a temporary file while they arrive
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# How often /api/jobs/<id>/events checks the job for changes
+JOB_POLL_SECONDS = 0.25
+# Ping interval that keeps idle /api/stream/ws sockets open through proxies
+WS_HEARTBEAT_SECONDS = 30
+# Markers queued behind the text units of a /api/stream/ws session
+FLUSH = object()
+CLOSE = object()
+
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Forwarded Flask endpoints that run the model, so they share the synthesis thread limit
+FORWARDED_INFERENCE_ENDPOINTS = {"create_voice"}
+
+_synthesis_executor = None
+
+
+def synthesis_threads() -> int:
+    """How many requests the inference hardware runs at once (see admission.default_concurrency)."""
+    return SYNTHESIS_THREADS or default_concurrency(get_device())
+
+
+def get_synthesis_executor():
+    """Executor that runs synthesis."""
+    global _synthesis_executor
+    if _synthesis_executor is None:
+        _synthesis_executor = ThreadPoolExecutor(max_workers=synthesis_threads(), thread_name_prefix="synthesis")
+    return _synthesis_executor
+
+
+async def synthesize(fn, **kwargs):
+    """Run a blocking synthesis call on the synthesis executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_synthesis_executor(), functools.partial(fn, **kwargs))
+
+
+async def blocking(fn, **kwargs):
+    """Run short blocking work (validation, decoding, file I/O) on the default executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, **kwargs))
+
+
+def json_error(error, status=200):
+    return web.json_response({"success": False, "error": error}, status=status)
+
+
+def shed_response(error):
+    """Response for a request turned away by admission control (see web_server.shed_response)."""
+    if isinstance(error, ClientDisconnected):
+        return web.Response(status=499)
+    return web.json_response({"success": False, "error": str(error)}, status=error.status,
+                             headers={"Retry-After": str(error.retry_after)})
+
+
+def client_gone(request):
+    transport = request.transport
+    return transport is None or transport.is_closing()
+
+
+async def acquire_slot(request, loader, text_length, deadline=True):
+    """Async counterpart of web_server.acquire_slot; release with web_server.release_slot."""
+    if not ADMISSION_ENABLED:
+        return None, None
+    controller = get_admission_controller(loader.device)
+    ticket = await controller.acquire_async(text_length, is_disconnected=lambda: client_gone(request),
+                                            deadline=deadline)
+    return controller, ticket
+
+
+async def read_form(request):
+    """
+    Read a form body into werkzeug MultiDicts of fields and files.
+
+    Multipart bodies are consumed part by part as they arrive; uploads go
+    to memory in in-memory mode and are otherwise spooled to disk past
+    UPLOAD_SPOOL_BYTES, like Flask does.
+    """
+    form, files = MultiDict(), MultiDict()
+    if not request.content_type.startswith("multipart/"):
+        for name, value in (await request.post()).items():
+            form.add(name, value)
+        return form, files
+
+    reader = await request.multipart()
+    while True:
+        part = await reader.next()
+        if part is None:
+            break
+        if part.filename is None:
+            form.add(part.name, await part.text())
+            continue
+        if web_server.IN_MEMORY_MODE:
+            stream = io.BytesIO()
+        else:
+            stream = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+        while True:
+            chunk = await part.read_chunk(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            stream.write(chunk)
+        stream.seek(0)
+        files.add(part.name, FileStorage(stream=stream, filename=part.filename, name=part.name,
+                                         content_type=part.headers.get("Content-Type")))
+    return form, files
+
+
+async def send_stream(request, response, body):
+    """Send a blocking byte iterator (computed on the synthesis executor) as a chunked response."""
+    loop = asyncio.get_running_loop()
+    executor = get_synthesis_executor()
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    try:
+        while True:
+            data = await loop.run_in_executor(executor, next, body, None)
+            if data is None:
+                break
+            if data:
+                await response.write(data)
+        await response.write_eof()
+    finally:
+        await loop.run_in_executor(executor, body.close)
+    return response
+
+
+async def clone_voice(request):
+    try:
+        with metrics.stage("upload"):
+            form, files = await read_form(request)
+        in_memory = web_server.wants_in_memory(form)
+        params, error = await blocking(web_server.parse_synthesis_request, in_memory=in_memory, form=form, files=files)
+        if error:
+            return json_error(error)
+
+        save = form.get("save") == "1"
+        loader = await blocking(web_server.acquire_loader, model=params.pop("model"))
+        try:
+            controller, ticket = await acquire_slot(request, loader, len(params["text"]))
+            success = False
+            try:
+                # Return the audio itself in this response, saving the second round-trip
+                if form.get("response") == "audio":
+                    buffer = io.BytesIO()
+                    await synthesize(loader.tts_to_file, file_path=buffer, **params)
+                else:
+                    audio_url = await synthesize(web_server.synthesize_to_output, loader=loader,
+                                                 in_memory=in_memory, save=save, **params)
+                success = True
+            finally:
+                web_server.release_slot(controller, ticket, success)
+        finally:
+            loader.release()
+
+        if form.get("response") == "audio":
+            audio = buffer.getvalue()
+            if save:
+                await blocking(web_server.write_output, audio=audio)
+            return web.Response(body=audio, content_type="audio/wav")
+        return web.json_response({"success": True, "audio_url": audio_url})
+
+    except (AdmissionRejected, ClientDisconnected) as e:
+        return shed_response(e)
+    except Exception as e:
+        return json_error(str(e))
+
+
+async def stream_voice(request):
+    """Stream synthesized audio while it is generated (see web_server.stream_voice)."""
+    try:
+        with metrics.stage("upload"):
+            form, files = await read_form(request)
+        params, error = await blocking(web_server.parse_synthesis_request, in_memory=web_server.wants_in_memory(form),
+                                       form=form, files=files)
+        if error:
+            return json_error(error)
+
+        # The model and the slot are held until the last chunk is sent
+        loader = await blocking(web_server.acquire_loader, model=params.pop("model"))
+        try:
+            controller, ticket = await acquire_slot(request, loader, len(params["text"]))
+            try:
+                chunks = await synthesize(loader.tts_stream, **params)
+            except Exception:
+                web_server.release_slot(controller, ticket, success=False)
+                raise
+        except BaseException:
+            loader.release()
+            raise
+
+    except (AdmissionRejected, ClientDisconnected) as e:
+        return shed_response(e)
+    except Exception as e:
+        return json_error(str(e))
+
+    response = web.StreamResponse(headers={"Content-Type": "audio/wav", **STREAM_HEADERS})
+    try:
+        return await send_stream(request, response, web_server.wav_stream(chunks))
+    except ConnectionResetError:
+        return response
+    finally:
+        web_server.release_slot(controller, ticket)
+        loader.release()
+
+
+async def batch_voice(request):
+    """Synthesize a list of texts in one voice and stream back a zip archive (see web_server.batch_voice)."""
+    try:
+        with metrics.stage("upload"):
+            form, files = await read_form(request)
+        batch, error = await blocking(web_server.parse_batch_request, form=form, files=files)
+        if error:
+            return json_error(error)
+
+        loader = await blocking(web_server.acquire_loader, model=batch["model"])
+        try:
+            # Waits without a deadline, see web_server.batch_voice
+            controller, ticket = await acquire_slot(request, loader, sum(len(item["text"]) for item in batch["items"]),
+                                                    deadline=False)
+            try:
+                await synthesize(loader.get_conditioning_latents, speaker_wav=batch["speaker_wav"],
+                                 audio_hash=batch["audio_hash"])
+            except Exception:
+                web_server.release_slot(controller, ticket, success=False)
+                raise
+        except BaseException:
+            loader.release()
+            raise
+
+    except (AdmissionRejected, ClientDisconnected) as e:
+        return shed_response(e)
+    except Exception as e:
+        return json_error(str(e))
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/zip",
+        "Content-Disposition": "attachment; filename=batch.zip",
+        **STREAM_HEADERS,
+    })
+    body = web_server.archive_stream(loader, batch["items"], batch["speaker_wav"], batch["audio_hash"])
+    try:
+        return await send_stream(request, response, body)
+    except ConnectionResetError:
+        return response
+    finally:
+        web_server.release_slot(controller, ticket)
+        loader.release()
+
+
+def next_pcm(chunks):
+    """Next streamed chunk as 16-bit PCM bytes, or None at the end."""
+    chunk = next(chunks, None)
+    return None if chunk is None else web_server.pcm16_bytes(chunk)
+
+
+async def speak_units(request, socket, loader, units, voice):
+    """
+    Synthesize the units of a /api/stream/ws session in order and send their audio.
+
+    Each unit takes its own admission slot, so a session that is waiting
+    for more text does not hold one.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_synthesis_executor()
+    index = 0
+    while True:
+        unit = await units.get()
+        if unit is FLUSH:
+            await socket.send_json({"type": "flushed", "segments": index})
+            continue
+        if unit is CLOSE:
+            await socket.send_json({"type": "done", "segments": index})
+            await socket.close()
+            return
+
+        try:
+            controller, ticket = await acquire_slot(request, loader, len(unit))
+        except ClientDisconnected:
+            return
+        except AdmissionRejected as e:
+            await socket.send_json({"type": "error", "error": str(e), "retry_after": e.retry_after})
+            # 1013: try again later
+            await socket.close(code=1013)
+            return
+        try:
+            await socket.send_json({"type": "segment", "index": index, "text": unit})
+            chunks = await synthesize(loader.tts_stream, text=unit, **voice)
+            pending = None
+            try:
+                while True:
+                    # Shielded, so a cancelled session never closes the generator while a thread is inside it
+                    pending = loop.run_in_executor(executor, next_pcm, chunks)
+                    data = await asyncio.shield(pending)
+                    if data is None:
+                        break
+                    await socket.send_bytes(data)
+            finally:
+                if pending is not None and not pending.done():
+                    await asyncio.wait([pending])
+                await loop.run_in_executor(executor, chunks.close)
+        except ConnectionResetError:
+            return
+        except Exception as e:
+            # One failed unit does not end the session
+            await socket.send_json({"type": "error", "error": str(e), "index": index})
+        finally:
+            web_server.release_slot(controller, ticket)
+        index += 1
+
+
+async def stream_text(request):
+    """
+    WebSocket: text fragments in, 16-bit PCM out.
+
+    Query parameters select the voice_id (a stored voice profile), the
+    language and optionally the model. The client sends JSON messages:
+    {"type": "text", "text": ...} with the next fragment, {"type": "flush"}
+    to speak whatever is buffered, and {"type": "close"} to speak the rest
+    and end the session. Fragments are cut into sentence/clause units (see
+    IncrementalSegmenter) and each unit is synthesized as soon as it is
+    complete, while more text keeps arriving. The server sends a "ready"
+    message with the audio format, then for every unit a "segment" message
+    followed by binary PCM frames, and "flushed"/"done" when those commands
+    have been carried out.
+    """
+    socket = web.WebSocketResponse(heartbeat=WS_HEARTBEAT_SECONDS)
+    await socket.prepare(request)
+
+    voice_id = request.query.get("voice_id", "").strip()
+    language = request.query.get("language", "en")
+    model = request.query.get("model", "").strip() or None
+    try:
+        if not voice_id:
+            raise ValueError("No voice_id provided")
+        # Looking up an unknown model rescans MODELS_DIR
+        if not await blocking(lambda: web_server.get_model_registry().has(model)):
+            raise ValueError(f"Unknown model: {model}")
+        speaker_wav, audio_hash, error = await blocking(
+            web_server.resolve_speaker, form=MultiDict({"voice_id": voice_id}), files=MultiDict()
+        )
+        if error:
+            raise ValueError(error)
+        loader = await blocking(web_server.acquire_loader, model=model)
+        try:
+            # Condition up front, so the first unit only pays for synthesis
+            await synthesize(loader.get_conditioning_latents, speaker_wav=speaker_wav, audio_hash=audio_hash)
+            max_chars = loader.get_xtts_model().tokenizer.char_limits.get(language.split("-")[0], 250)
+        except BaseException:
+            loader.release()
+            raise
+    except Exception as e:
+        await socket.send_json({"type": "error", "error": str(e)})
+        await socket.close()
+        return socket
+
+    segmenter = IncrementalSegmenter(language=language, max_chars=max_chars)
+    units = asyncio.Queue()
+    voice = {"speaker_wav": speaker_wav, "audio_hash": audio_hash, "language": language}
+    speaker = asyncio.create_task(speak_units(request, socket, loader, units, voice))
+    # The session holds the model until its last unit has been spoken
+    speaker.add_done_callback(lambda _: loader.release())
+    closing = False
+    try:
+        await socket.send_json({"type": "ready", "sample_rate": OUTPUT_SAMPLE_RATE, "encoding": "pcm_s16le",
+                                "channels": 1})
+        async for message in socket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                command = json.loads(message.data)
+                if not isinstance(command, dict):
+                    raise ValueError
+            except ValueError:
+                await socket.send_json({"type": "error", "error": "Messages must be JSON objects"})
+                continue
+
+            kind = command.get("type", "text")
+            if kind == "text":
+                for unit in segmenter.feed(str(command.get("text", ""))):
+                    units.put_nowait(unit)
+            elif kind in ("flush", "close"):
+                for unit in segmenter.flush():
+                    units.put_nowait(unit)
+                units.put_nowait(FLUSH if kind == "flush" else CLOSE)
+                if kind == "close":
+                    closing = True
+                    break
+            else:
+                await socket.send_json({"type": "error", "error": f"Unknown message type: {kind}"})
+            if speaker.done():
+                break
+        if closing:
+            await speaker
+    finally:
+        # The client went away (or the session was shed): stop synthesizing for it
+        if not speaker.done():
+            speaker.cancel()
+    return socket
+
+
+async def submit_job(request):
+    """Queue a synthesis job and return its ID immediately."""
+    try:
+        with metrics.stage("upload"):
+            form, files = await read_form(request)
+        in_memory = web_server.wants_in_memory(form)
+        params, error = await blocking(web_server.parse_synthesis_request, in_memory=in_memory, form=form, files=files)
+        if error:
+            return json_error(error)
+
+        job = get_job_manager().submit(
+            web_server.synthesize_job,
+            in_memory=in_memory,
+            save=form.get("save") == "1",
+            **params,
+        )
+        return web.json_response({
+            "success": True,
+            "job_id": job.id,
+            "status_url": f"/api/jobs/{job.id}",
+            "events_url": f"/api/jobs/{job.id}/events",
+        }, status=202)
+
+    except QueueFullError as e:
+        return web.json_response({"success": False, "error": str(e)}, status=503, headers={"Retry-After": "5"})
+    except Exception as e:
+        return json_error(str(e))
+
+
+async def job_events(request):
+    """Server-Sent Events stream of job progress, ending when the job finishes."""
+    job_id = request.match_info["job_id"]
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return json_error(f"Unknown job: {job_id}", status=404)
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream; charset=utf-8", **STREAM_HEADERS})
+    await response.prepare(request)
+    loop = asyncio.get_running_loop()
+    version = None
+    last_sent = loop.time()
+    try:
+        while True:
+            if job.version != version:
+                version = job.version
+                await response.write(f"data: {json.dumps(web_server.job_status(job))}\n\n".encode())
+                last_sent = loop.time()
+                if job.finished:
+                    break
+            elif loop.time() - last_sent >= web_server.SSE_KEEPALIVE_SECONDS:
+                # Comment line keeps proxies from closing an idle stream
+                await response.write(b": keep-alive\n\n")
+                last_sent = loop.time()
+            await asyncio.sleep(JOB_POLL_SECONDS)
+        await response.write_eof()
+    except ConnectionResetError:
+        pass
+    return response
+
+
+def flask_endpoint(request):
+    """Name of the Flask endpoint a request is routed to, or None."""
+    try:
+        endpoint, _ = web_server.app.url_map.bind(request.host).match(request.path, method=request.method)
+    except HTTPException:
+        return None
+    return endpoint
+
+
+def declared_too_large(request, limit: int) -> bool:
+    """Whether the request announces a body over limit bytes (0: no limit)."""
+    return bool(limit) and request.content_length is not None and request.content_length > limit
+
+
+def too_large_response():
+    return json_error(f"Request body exceeds {web_server.MAX_UPLOAD_BYTES} bytes", status=413)
+
+
+async def read_body(request, limit: int):
+    """
+    Read the whole request body, or return None once it exceeds limit bytes (0: no limit).
+
+    A declared Content-Length over the limit is refused before anything is
+    read; chunked bodies are counted as they arrive.
+    """
+    if declared_too_large(request, limit):
+        return None
+    body = bytearray()
+    async for chunk in request.content.iter_chunked(UPLOAD_CHUNK_BYTES):
+        body += chunk
+        if limit and len(body) > limit:
+            return None
+    return bytes(body)
+
+
+async def forward_to_flask(request):
+    """
+    Serve any other route with the Flask app.
+
+    Views run on the default executor, except those that run the model,
+    which go to the synthesis executor.
+    """
+    loop = asyncio.get_running_loop()
+    body = await read_body(request, web_server.MAX_UPLOAD_BYTES)
+    if body is None:
+        return too_large_response()
+    executor = get_synthesis_executor() if flask_endpoint(request) in FORWARDED_INFERENCE_ENDPOINTS else None
+    environ = EnvironBuilder(
+        path=request.path,
+        base_url=f"{request.scheme}://{request.host}",
+        query_string=request.query_string,
+        method=request.method,
+        headers=list(request.headers.items()),
+        data=body,
+        environ_overrides={"REMOTE_ADDR": request.remote or ""},
+    ).get_environ()
+    app_iter, status, headers = await loop.run_in_executor(
+        executor, functools.partial(run_wsgi_app, web_server.app, environ)
+    )
+
+    code, _, reason = status.partition(" ")
+    response = web.StreamResponse(status=int(code), reason=reason)
+    for name, value in headers.items():
+        response.headers.add(name, value)
+    iterator = iter(app_iter)
+    try:
+        await response.prepare(request)
+        while True:
+            data = await loop.run_in_executor(None, next, iterator, None)
+            if data is None:
+                break
+            await response.write(data)
+        await response.write_eof()
+    except ConnectionResetError:
+        pass
+    finally:
+        # Runs Flask's teardown and call_on_close hooks
+        close = getattr(app_iter, "close", None)
+        if close is not None:
+            await loop.run_in_executor(None, close)
+    return response
+
+
+@web.middleware
+async def flask_hooks(request, handler):
+    """
+    Apply web_server's before/after request hooks to the natively served routes:
+    503 while the model is starting, and request metrics. Forwarded routes get
+    them from Flask itself.
+    """
+    endpoint = request.match_info.route.name
+    if endpoint is None:
+        return await handler(request)
+    if declared_too_large(request, web_server.MAX_UPLOAD_BYTES):
+        return too_large_response()
+
+    error = web_server.not_ready_error(endpoint)
+    if error is not None:
+        return web.json_response(error, status=503, headers={"Retry-After": "10"})
+
+    if not metrics.METRICS_ENABLED:
+        return await handler(request)
+    start = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc(1, endpoint)
+    status = "500"
+    try:
+        response = await handler(request)
+        status = str(response.status)
+        return response
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec(1, endpoint)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+        metrics.REQUESTS_TOTAL.inc(1, endpoint, status)
+
+
+def create_app():
+    app = web.Application(middlewares=[flask_hooks], client_max_size=web_server.MAX_UPLOAD_BYTES)
+    # Route names match the Flask endpoint names, for readiness checks and metrics
+    app.router.add_post("/api/clone", clone_voice, name="clone_voice")
+    app.router.add_post("/api/stream", stream_voice, name="stream_voice")
+    app.router.add_post("/api/batch", batch_voice, name="batch_voice")
+    app.router.add_post("/api/jobs", submit_job, name="submit_job")
+    app.router.add_get("/api/jobs/{job_id}/events", job_events, name="job_events")
+    app.router.add_get("/api/stream/ws", stream_text, name="stream_text")
+    app.router.add_route("*", "/{tail:.*}", forward_to_flask)
+    return app
+
+
+def main():
+    print("Starting Voice Cloning Web Server (asyncio)...")
+    web_server.load_on_startup()
+    print(f"Synthesis threads: {synthesis_threads()}")
+    print("Open http://localhost:5002 in your browser")
+    web.run_app(create_app(), host="0.0.0.0", port=5002, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Reference Audio Preprocessing
+
+Turns an uploaded reference clip into what conditioning actually needs:
+mono audio at the model's 22.05 kHz rate, with leading and trailing silence
+trimmed, speech level normalized and cropped to the PREPROCESS_MAX_SECONDS
+window with the most speech in it. Decoding stops after
+PREPROCESS_MAX_DECODE_SECONDS, so conditioning cost is bounded however long
+the upload is. Clips that are too short or heavily clipped are rejected
+before any inference runs.
+
+Every step is a vectorized NumPy/SciPy operation over the whole clip.
+Results are cached on disk by source content hash (and the settings below),
+so each distinct upload is processed once.
+
+Environment Variables:
+    PREPROCESS_ENABLED: Set to 0 to condition on the raw uploads (default: 1)
+    PREPROCESS_CACHE_DIR: Directory for processed clips (default: cache/preprocessed)
+    PREPROCESS_MAX_SECONDS: Speech kept per clip; XTTS reads at most 10 s per clip (default: 10)
+    PREPROCESS_MIN_SECONDS: Shortest usable speech after trimming (default: 2)
+    PREPROCESS_MAX_DECODE_SECONDS: Audio decoded from each upload (default: 300)
+    PREPROCESS_TARGET_DBFS: Speech level after normalization (default: -20)
+"""
+
+import hashlib
+import os
+import threading
+from math import gcd
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+PREPROCESS_ENABLED = os.getenv("PREPROCESS_ENABLED", "1") != "0"
+PREPROCESS_CACHE_DIR = os.getenv("PREPROCESS_CACHE_DIR", "cache/preprocessed")
+PREPROCESS_MAX_SECONDS = float(os.getenv("PREPROCESS_MAX_SECONDS", "10"))
+PREPROCESS_MIN_SECONDS = float(os.getenv("PREPROCESS_MIN_SECONDS", "2"))
+PREPROCESS_MAX_DECODE_SECONDS = float(os.getenv("PREPROCESS_MAX_DECODE_SECONDS", "300"))
+PREPROCESS_TARGET_DBFS = float(os.getenv("PREPROCESS_TARGET_DBFS", "-20"))
+
+# Rate XTTS conditioning runs at
+TARGET_SAMPLE_RATE = 22050
+
+# Bump when the processing below changes in a way that alters the output
+PREPROCESS_VERSION = 1
+
+FRAME_SECONDS = 0.02
+# Frames quieter than this below the loudest frame count as silence
+SILENCE_RANGE_DB = 40.0
+SILENCE_FLOOR_DBFS = -55.0
+# Silence kept around trimmed speech so onsets are not clipped
+TRIM_PADDING_SECONDS = 0.1
+# Share of samples at full scale above which a clip counts as clipped
+MAX_CLIPPED_FRACTION = 0.01
+PEAK_LIMIT = 0.95
+
+
+class UnusableAudioError(ValueError):
+    """Raised for reference audio that cannot produce a usable voice."""
+
+
+def settings_signature() -> str:
+    """Identifies the processing settings; part of every cache key that depends on them."""
+    if not PREPROCESS_ENABLED:
+        return "raw"
+    return (
+        f"pre{PREPROCESS_VERSION}:{TARGET_SAMPLE_RATE}:{PREPROCESS_MAX_SECONDS:g}:"
+        f"{PREPROCESS_MIN_SECONDS:g}:{PREPROCESS_MAX_DECODE_SECONDS:g}:{PREPROCESS_TARGET_DBFS:g}"
+    )
+
+
+def decode(source, max_seconds: float = PREPROCESS_MAX_DECODE_SECONDS):
+    """
+    Decode a file path or file object to mono float32, block by block.
+
+    Channels are averaged per block and decoding stops at max_seconds, so
+    neither memory nor time grows with the length of the upload.
+    """
+    try:
+        with sf.SoundFile(source) as f:
+            sample_rate = f.samplerate
+            limit = int(max_seconds * sample_rate)
+            blocks = []
+            read = 0
+            for block in f.blocks(blocksize=sample_rate, dtype="float32", always_2d=True):
+                blocks.append(block.mean(axis=1))
+                read += len(block)
+                if read >= limit:
+                    break
+    except RuntimeError as e:
+        raise UnusableAudioError(f"Could not decode audio: {e}") from e
+    samples = np.concatenate(blocks)[:limit] if blocks else np.zeros(0, dtype=np.float32)
+    return samples, sample_rate
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Polyphase resampling (anti-aliased) to target_rate."""
+    if source_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    from scipy.signal import resample_poly
+
+    divisor = gcd(source_rate, target_rate)
+    return resample_poly(samples, target_rate // divisor, source_rate // divisor).astype(np.float32)
+
+
+def frame_levels(samples: np.ndarray, frame: int) -> np.ndarray:
+    """RMS level in dBFS of consecutive frames of `frame` samples."""
+    count = len(samples) // frame
+    frames = samples[: count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def voiced_frames(levels: np.ndarray) -> np.ndarray:
+    """Boolean mask of frames that are not silence, relative to the loudest frame."""
+    if len(levels) == 0:
+        return np.zeros(0, dtype=bool)
+    threshold = max(SILENCE_FLOOR_DBFS, levels.max() - SILENCE_RANGE_DB)
+    return levels > threshold
+
+
+def best_window(voiced: np.ndarray, window: int) -> int:
+    """Start frame of the `window`-frame span containing the most voiced frames."""
+    if len(voiced) <= window:
+        return 0
+    counts = np.concatenate(([0], np.cumsum(voiced, dtype=np.int64)))
+    totals = counts[window:] - counts[:-window]
+    return int(np.argmax(totals))
+
+
+def process_samples(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    Run the preprocessing steps on decoded mono audio.
+
+    Returns float32 samples at TARGET_SAMPLE_RATE. Raises UnusableAudioError
+    for silent, clipped or too-short clips.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if len(samples) == 0:
+        raise UnusableAudioError("Reference audio is empty")
+
+    clipped = np.count_nonzero(np.abs(samples) >= 0.999) / len(samples)
+    if clipped > MAX_CLIPPED_FRACTION:
+        raise UnusableAudioError(
+            f"Reference audio is clipped ({clipped:.1%} of samples at full scale); "
+            "record at a lower input level"
+        )
+
+    # Silence detection and cropping run at the source rate, so only the
+    # kept window is resampled
+    samples = samples - samples.mean()
+    frame = max(1, int(round(FRAME_SECONDS * sample_rate)))
+    levels = frame_levels(samples, frame)
+    voiced = voiced_frames(levels)
+    if not voiced.any():
+        raise UnusableAudioError("Reference audio is silent")
+
+    # Trim leading and trailing silence
+    voiced_index = np.flatnonzero(voiced)
+    padding = int(TRIM_PADDING_SECONDS / FRAME_SECONDS)
+    first = max(0, voiced_index[0] - padding)
+    last = min(len(voiced), voiced_index[-1] + 1 + padding)
+    voiced = voiced[first:last]
+    levels = levels[first:last]
+
+    speech_seconds = np.count_nonzero(voiced) * FRAME_SECONDS
+    if speech_seconds < PREPROCESS_MIN_SECONDS:
+        raise UnusableAudioError(
+            f"Reference audio has only {speech_seconds:.1f}s of speech "
+            f"(at least {PREPROCESS_MIN_SECONDS:g}s needed)"
+        )
+
+    # Keep the window with the most speech
+    window = int(PREPROCESS_MAX_SECONDS / FRAME_SECONDS)
+    if len(voiced) > window:
+        start = best_window(voiced, window)
+        voiced = voiced[start: start + window]
+        levels = levels[start: start + window]
+        first += start
+        last = first + window
+    samples = resample(samples[first * frame: last * frame], sample_rate)
+
+    # Normalize the speech level (silent frames excluded), without exceeding PEAK_LIMIT
+    speech_rms = np.sqrt(np.mean(10 ** (levels[voiced] / 10)))
+    gain = 10 ** (PREPROCESS_TARGET_DBFS / 20) / max(speech_rms, 1e-10)
+    peak = np.abs(samples).max()
+    if peak * gain > PEAK_LIMIT:
+        gain = PEAK_LIMIT / peak
+    return (samples * gain).astype(np.float32)
+
+
+class ReferencePreprocessor:
+    """Preprocesses reference clips and caches the results by source hash."""
+
+    def __init__(self, cache_dir: str = PREPROCESS_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, source_hash: str) -> Path:
+        key = hashlib.sha256(f"{settings_signature()}\0{source_hash}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.npy"
+
+    def process(self, clip, source_hash: str):
+        """
+        Return the processed clip as InMemoryAudio.
+
+        clip is a file path or an InMemoryAudio; source_hash identifies its
+        content (hash_audio_files() of the clip).
+        """
+        from model_loader import InMemoryAudio
+
+        path = self._path(source_hash)
+        if path.exists():
+            try:
+                samples = np.load(path)
+            except (OSError, ValueError) as e:
+                print(f"Warning: discarding unreadable preprocessed clip {path}: {e}")
+                path.unlink(missing_ok=True)
+            else:
+                with self._lock:
+                    self.hits += 1
+                return InMemoryAudio(samples, TARGET_SAMPLE_RATE, source_hash)
+
+        with self._lock:
+            self.misses += 1
+        if isinstance(clip, InMemoryAudio):
+            samples, sample_rate = clip.samples, clip.sample_rate
+            limit = int(PREPROCESS_MAX_DECODE_SECONDS * sample_rate)
+            samples = samples[:limit]
+        else:
+            samples, sample_rate = decode(clip)
+        processed = process_samples(samples, sample_rate)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+        try:
+            np.save(tmp_path, processed)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not cache preprocessed clip {path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+        return InMemoryAudio(processed, TARGET_SAMPLE_RATE, source_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": PREPROCESS_ENABLED, "hits": self.hits, "misses": self.misses}
+
+
+# Singleton instance
+_preprocessor = None
+
+
+def get_preprocessor():
+    """Get the global reference preprocessor instance."""
+    global _preprocessor
+    if _preprocessor is None:
+        _preprocessor = ReferencePreprocessor()
+    return _preprocessor
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+In-Memory Audio Store
+
+Short-lived store for generated audio in in-memory mode, so results can be
+fetched from /audio/<name> without ever being written to disk.
+
+Environment Variables:
+    AUDIO_STORE_TTL_SECONDS: How long generated audio stays available (default: 300)
+    AUDIO_STORE_MAX_BYTES: Memory budget; oldest entries are dropped first (default: 268435456, i.e. 256 MB)
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+AUDIO_STORE_TTL_SECONDS = int(os.getenv("AUDIO_STORE_TTL_SECONDS", "300"))
+AUDIO_STORE_MAX_BYTES = int(os.getenv("AUDIO_STORE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+NAME_PREFIX = "mem-"
+
+
+class AudioMemoryStore:
+    """Bounded, expiring map from generated file names to WAV bytes."""
+
+    def __init__(self, ttl_seconds: int = AUDIO_STORE_TTL_SECONDS, max_bytes: int = AUDIO_STORE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes) -> str:
+        """Store audio and return the file name it can be fetched under."""
+        name = f"{NAME_PREFIX}{uuid.uuid4().hex[:16]}.wav"
+        with self._lock:
+            self._entries[name] = (time.time(), data)
+            self._bytes += len(data)
+            self._expire()
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._pop_oldest()
+        return name
+
+    def get(self, name: str):
+        """Return the stored bytes for name, or None if unknown or expired."""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(name)
+            return entry[1] if entry else None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        while self._entries and next(iter(self._entries.values()))[0] < cutoff:
+            self._pop_oldest()
+
+    def _pop_oldest(self):
+        _, (_, data) = self._entries.popitem(last=False)
+        self._bytes -= len(data)
+
+
+# Singleton instance
+_audio_store = None
+
+
+def get_audio_store():
+    """Get the global in-memory audio store."""
+    global _audio_store
+    if _audio_store is None:
+        _audio_store = AudioMemoryStore()
+    return _audio_store
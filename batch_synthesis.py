@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Batch Synthesis from a JSONL Manifest
+
+Synthesizes many prompts with one model load. Each manifest line is a JSON
+object:
+
+    {"id": "intro-001", "text": "Welcome back.", "speaker": "voice_samples/anna.wav"}
+
+Fields:
+    id        Unique line ID, used for the output name and the ledger
+              ("request_id" is accepted too; default: line-<number>)
+    text      Text to speak (required)
+    speaker   Reference audio path, or a list of paths
+    voice_id  Stored voice profile, used instead of speaker
+    language  Language code
+    model     Named model, see model_registry.py
+    output    Output path (default: <output dir>/<id>.wav)
+
+speaker, voice_id, language and model fall back to the command line values.
+
+Reference audio is hashed once per distinct speaker and its conditioning
+comes from the latent cache, so a speaker shared by thousands of lines is
+conditioned once. Finished audio is handed to a bounded write-behind thread,
+which writes each file atomically and then appends the line to a ledger
+(<output dir>/ledger.jsonl). A rerun skips lines the ledger records as done,
+so after a crash only unfinished lines are synthesized again.
+
+Environment Variables:
+    BATCH_WRITE_QUEUE: Finished clips buffered ahead of the writer (default: 16)
+"""
+
+import io
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+
+import soundfile as sf
+
+from model_loader import OUTPUT_SAMPLE_RATE, get_model_loader, hash_audio_files
+
+BATCH_WRITE_QUEUE = int(os.getenv("BATCH_WRITE_QUEUE", "16"))
+
+DONE = "done"
+FAILED = "failed"
+
+
+def safe_name(line_id: str) -> str:
+    """Turn a line ID into a file name."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", line_id).strip("._") or "line"
+
+
+def load_manifest(path: str, defaults: dict) -> list:
+    """Parse the manifest and apply defaults. Raises ValueError on bad or duplicate lines."""
+    entries = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: invalid JSON: {e}") from e
+
+            record = {k: v for k, v in record.items() if v is not None}
+            line_defaults = defaults
+            if "speaker" in record or "voice_id" in record:
+                # The line picks its own voice; a default of the other kind must not override it
+                line_defaults = {k: v for k, v in defaults.items() if k not in ("speaker", "voice_id")}
+            entry = {**line_defaults, **record}
+            entry["id"] = str(record.get("id") or record.get("request_id") or f"line-{number}")
+            entry["line"] = number
+            if not str(entry.get("text", "")).strip():
+                raise ValueError(f"{path}:{number}: no text")
+            if not entry.get("speaker") and not entry.get("voice_id"):
+                raise ValueError(f"{path}:{number}: no speaker or voice_id")
+            if entry["id"] in seen:
+                raise ValueError(f"{path}:{number}: duplicate id {entry['id']!r}")
+            seen.add(entry["id"])
+            entries.append(entry)
+    return entries
+
+
+class Ledger:
+    """Append-only JSONL record of finished lines; the last record per ID wins."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.records = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A torn last line from a crash
+                    self.records[record["id"]] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def is_done(self, entry: dict) -> bool:
+        record = self.records.get(entry["id"])
+        return (
+            record is not None
+            and record["status"] == DONE
+            and record.get("output") == entry["output"]
+            and os.path.exists(record["output"])
+        )
+
+    def append(self, record: dict):
+        with self._lock:
+            self.records[record["id"]] = record
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    """Throughput and ETA reporting."""
+
+    def __init__(self, total: int, skipped: int):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def update(self, ok: bool, audio_seconds: float = 0.0):
+        with self._lock:
+            if ok:
+                self.done += 1
+                self.audio_seconds += audio_seconds
+            else:
+                self.failed += 1
+            finished = self.done + self.failed
+            elapsed = time.perf_counter() - self.started
+            rate = finished / elapsed if elapsed > 0 else 0.0
+            remaining = self.total - finished
+            eta = time.strftime("%H:%M:%S", time.gmtime(remaining / rate)) if rate > 0 else "--:--:--"
+            print(
+                f"[{finished + self.skipped}/{self.total + self.skipped}] "
+                f"{rate:.2f} lines/s, {self.audio_seconds / elapsed if elapsed > 0 else 0.0:.2f}x real time, "
+                f"{self.failed} failed, ETA {eta}"
+            )
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "seconds": round(elapsed, 1),
+            "audio_seconds": round(self.audio_seconds, 1),
+            "lines_per_second": round(self.done / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+
+class WriteBehind:
+    """
+    Writes finished clips on a background thread.
+
+    The queue is bounded, so synthesis blocks instead of piling audio up in
+    memory when the disk falls behind. A line reaches the ledger only after
+    its file has been written and renamed into place.
+    """
+
+    def __init__(self, ledger: Ledger, progress: Progress, max_pending: int = BATCH_WRITE_QUEUE):
+        self.ledger = ledger
+        self.progress = progress
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, entry: dict, audio: bytes, seconds: float):
+        self._queue.put((entry, audio, seconds))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            entry, audio, seconds = item
+            try:
+                output = Path(entry["output"])
+                output.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = output.with_name(f".{output.name}.tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp_path, output)
+            except OSError as e:
+                self.fail(entry, f"write failed: {e}")
+                continue
+            audio_seconds = sf.info(io.BytesIO(audio)).frames / OUTPUT_SAMPLE_RATE
+            self.ledger.append({
+                "id": entry["id"],
+                "status": DONE,
+                "output": entry["output"],
+                "audio_seconds": round(audio_seconds, 3),
+                "synthesis_seconds": round(seconds, 3),
+            })
+            self.progress.update(True, audio_seconds)
+
+    def fail(self, entry: dict, error: str):
+        print(f"Line {entry['line']} ({entry['id']}) failed: {error}")
+        self.ledger.append({"id": entry["id"], "status": FAILED, "output": entry["output"], "error": error})
+        self.progress.update(False)
+
+
+class SpeakerResolver:
+    """Resolves speaker/voice_id fields once per distinct speaker."""
+
+    def __init__(self):
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, entry: dict):
+        """Return (speaker_wav, audio_hash)."""
+        voice_id = entry.get("voice_id")
+        speaker = entry.get("speaker")
+        key = ("voice", voice_id) if voice_id else ("files", json.dumps(speaker))
+        with self._lock:
+            if key in self._resolved:
+                return self._resolved[key]
+
+        if voice_id:
+            from voice_profiles import get_voice_store
+
+            profile = get_voice_store().get(voice_id)
+            if profile is None:
+                raise ValueError(f"Unknown voice profile: {voice_id}")
+            resolved = (profile["samples"], profile["audio_hash"])
+        else:
+            paths = speaker if isinstance(speaker, list) else [speaker]
+            resolved = (paths, hash_audio_files(paths))
+
+        with self._lock:
+            self._resolved[key] = resolved
+        return resolved
+
+
+def run_batch(manifest: str, output_dir: str = "output/batch", concurrency: int = None,
+              defaults: dict = None, ledger_path: str = None) -> dict:
+    """Synthesize every unfinished manifest line and return a summary."""
+    defaults = {"language": "en", **(defaults or {})}
+    entries = load_manifest(manifest, defaults)
+    output_root = Path(output_dir)
+    for entry in entries:
+        entry["output"] = str(entry.get("output") or output_root / f"{safe_name(entry['id'])}.wav")
+
+    ledger = Ledger(Path(ledger_path) if ledger_path else output_root / "ledger.jsonl")
+    pending = [entry for entry in entries if not ledger.is_done(entry)]
+    skipped = len(entries) - len(pending)
+    print(f"{len(entries)} lines in manifest, {skipped} already done, {len(pending)} to synthesize")
+    if not pending:
+        ledger.close()
+        return {"done": 0, "failed": 0, "skipped": skipped, "seconds": 0.0,
+                "audio_seconds": 0.0, "lines_per_second": 0.0}
+
+    loader = get_model_loader()
+    # Outputs go to disk anyway; keep tens of thousands of one-off results and
+    # their sentences out of the caches
+    loader.result_cache = None
+    loader.segment_cache = None
+    loader.load_model()
+
+    from worker_pool import start_worker_pool
+
+    pool = start_worker_pool(loader)
+    if concurrency is None:
+        concurrency = pool.live_workers() if pool is not None else 1
+
+    registry = None
+    if any(entry.get("model") for entry in pending):
+        from model_registry import get_model_registry
+
+        registry = get_model_registry()
+
+    progress = Progress(len(pending), skipped)
+    writer = WriteBehind(ledger, progress)
+    speakers = SpeakerResolver()
+
+    def synthesize(entry):
+        try:
+            speaker_wav, audio_hash = speakers.resolve(entry)
+            buffer = io.BytesIO()
+            with registry.use(entry["model"]) if entry.get("model") else nullcontext(loader) as model_loader:
+                start = time.perf_counter()
+                model_loader.tts_to_file(
+                    text=entry["text"],
+                    file_path=buffer,
+                    speaker_wav=speaker_wav,
+                    language=entry["language"],
+                    audio_hash=audio_hash,
+                )
+            writer.put(entry, buffer.getvalue(), time.perf_counter() - start)
+        except Exception as e:
+            writer.fail(entry, str(e))
+
+    try:
+        if concurrency <= 1:
+            for entry in pending:
+                synthesize(entry)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(synthesize, pending))
+    finally:
+        writer.close()
+        ledger.close()
+        if pool is not None:
+            pool.shutdown()
+
+    summary = progress.summary()
+    print(
+        f"Finished: {summary['done']} done, {summary['failed']} failed, {skipped} skipped "
+        f"in {summary['seconds']}s ({summary['lines_per_second']} lines/s, "
+        f"{summary['audio_seconds']}s of audio)"
+    )
+    return summary
+
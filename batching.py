@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Dynamic Micro-Batching for XTTS v2
+
+Collects synthesis requests that arrive within a short window and runs GPT
+decoding and the HiFi-GAN vocoder on one padded batch, then splits the audio
+back out per request.
+
+Environment Variables:
+    BATCH_MAX_SIZE: Maximum number of sentences per batch; 1 disables batching (default: 1)
+    BATCH_MAX_WAIT_MS: How long to wait for a batch to fill after the first request (default: 20)
+
+Benchmark (throughput and p95 latency for batch sizes 1/2/4/8):
+    python batching.py --speaker voice_samples/sample.wav
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "1"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "20"))
+
+
+class BatchItem:
+    """A single sentence waiting to be synthesized."""
+
+    def __init__(self, text, language, gpt_cond_latent, speaker_embedding):
+        self.text = text
+        self.language = language
+        self.gpt_cond_latent = gpt_cond_latent
+        self.speaker_embedding = speaker_embedding
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+@torch.inference_mode()
+def run_batch(xtts, items) -> list:
+    """
+    Synthesize several sentences in one pass and return one waveform each.
+
+    GPT prefixes (conditioning latents + text embeddings) are left-padded to
+    a common length and masked, so every sequence starts generating audio
+    tokens at the same position. Vocoder inputs are right-padded and the
+    output is trimmed back to each sequence's length.
+    """
+    gpt = xtts.gpt
+    config = xtts.config
+    device = xtts.device
+
+    # Build each prefix exactly as GPT.compute_embeddings does for batch size 1
+    text_tokens = []
+    prefixes = []
+    for item in items:
+        language = item.language.split("-")[0]
+        tokens = torch.IntTensor(
+            xtts.tokenizer.encode(item.text.strip().lower(), lang=language)
+        ).unsqueeze(0).to(device)
+        text_tokens.append(tokens)
+
+        padded = F.pad(tokens, (0, 1), value=gpt.stop_text_token)
+        padded = F.pad(padded, (1, 0), value=gpt.start_text_token)
+        emb = gpt.text_embedding(padded) + gpt.text_pos_embedding(padded)
+        prefixes.append(torch.cat([item.gpt_cond_latent.to(device), emb], dim=1))
+
+    batch_size = len(items)
+    prefix_len = max(p.shape[1] for p in prefixes)
+    prefix_emb = prefixes[0].new_zeros(batch_size, prefix_len, prefixes[0].shape[-1])
+    attention_mask = torch.zeros(batch_size, prefix_len + 1, dtype=torch.long, device=device)
+    for i, prefix in enumerate(prefixes):
+        prefix_emb[i, prefix_len - prefix.shape[1]:] = prefix[0]
+        attention_mask[i, prefix_len - prefix.shape[1]:] = 1
+
+    gpt.gpt_inference.store_prefix_emb(prefix_emb)
+    gpt_inputs = torch.full((batch_size, prefix_len + 1), fill_value=1, dtype=torch.long, device=device)
+    gpt_inputs[:, -1] = gpt.start_audio_token
+
+    generated = gpt.gpt_inference.generate(
+        gpt_inputs,
+        attention_mask=attention_mask,
+        bos_token_id=gpt.start_audio_token,
+        pad_token_id=gpt.stop_audio_token,
+        eos_token_id=gpt.stop_audio_token,
+        max_length=gpt.max_gen_mel_tokens + gpt_inputs.shape[-1],
+        do_sample=True,
+        top_p=config.top_p,
+        top_k=config.top_k,
+        temperature=config.temperature,
+        num_return_sequences=1,
+        num_beams=1,
+        length_penalty=config.length_penalty,
+        repetition_penalty=config.repetition_penalty,
+        output_attentions=False,
+    )[:, gpt_inputs.shape[1]:]
+
+    # Latents are a single parallel forward pass, run per sequence so text
+    # padding never leaks into another request's output
+    latents = []
+    for i, item in enumerate(items):
+        row = generated[i]
+        stops = (row == gpt.stop_audio_token).nonzero()
+        codes = row[: int(stops[0]) + 1] if len(stops) else row
+        codes = codes.unsqueeze(0)
+        tokens = text_tokens[i]
+        latents.append(gpt(
+            tokens,
+            torch.tensor([tokens.shape[-1]], device=device),
+            codes,
+            torch.tensor([codes.shape[-1] * gpt.code_stride_len], device=device),
+            cond_latents=item.gpt_cond_latent.to(device),
+            return_attentions=False,
+            return_latent=True,
+        ))
+
+    lengths = [lat.shape[1] for lat in latents]
+    max_len = max(lengths)
+    latent_batch = torch.cat([F.pad(lat, (0, 0, 0, max_len - lat.shape[1])) for lat in latents], dim=0)
+    speaker_batch = torch.cat([item.speaker_embedding.to(device) for item in items], dim=0)
+
+    wav_batch = xtts.hifigan_decoder(latent_batch, g=speaker_batch).cpu()
+    samples_per_latent = wav_batch.shape[-1] / max_len
+    return [
+        wav_batch[i].squeeze().numpy()[: int(round(lengths[i] * samples_per_latent))]
+        for i in range(batch_size)
+    ]
+
+
+class BatchScheduler:
+    """
+    Groups concurrent synthesis requests into micro-batches.
+
+    A single worker thread owns the model: it blocks for the first request,
+    then keeps collecting until max_batch_size requests are queued or
+    max_wait_ms has passed, and runs them together.
+    """
+
+    def __init__(self, xtts, max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.xtts = xtts
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self.batches_run = 0
+        self.items_run = 0
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, text, language, gpt_cond_latent, speaker_embedding) -> Future:
+        """Queue one sentence; the returned future resolves to its waveform."""
+        item = BatchItem(text, language, gpt_cond_latent, speaker_embedding)
+        self._queue.put(item)
+        return item.future
+
+    def synthesize(self, text, language, gpt_cond_latent, speaker_embedding):
+        """Blocking wrapper around submit()."""
+        return self.submit(text, language, gpt_cond_latent, speaker_embedding).result()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def close(self):
+        """Stop the worker thread once queued requests are done."""
+        self._queue.put(None)
+
+    def _collect(self) -> list:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Run what we have, then stop on the next collect
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                wavs = run_batch(self.xtts, batch)
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.items_run += len(batch)
+            for item, wav in zip(batch, wavs):
+                item.future.set_result(wav)
+
+
+def benchmark(xtts, gpt_cond_latent, speaker_embedding, batch_sizes=(1, 2, 4, 8),
+              num_requests: int = 16, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+              text: str = "The quick brown fox jumps over the lazy dog.", language: str = "en") -> list:
+    """
+    Measure throughput and latency for each batch size.
+
+    num_requests sentences are submitted concurrently per run; latency is
+    measured from submission to completion of each request.
+    """
+    results = []
+    for batch_size in batch_sizes:
+        scheduler = BatchScheduler(xtts, max_batch_size=batch_size, max_wait_ms=max_wait_ms)
+        # Warm up so one-time costs do not skew the first configuration
+        scheduler.synthesize(text, language, gpt_cond_latent, speaker_embedding)
+
+        latencies = []
+        start = time.perf_counter()
+        futures = [
+            scheduler.submit(text, language, gpt_cond_latent, speaker_embedding)
+            for _ in range(num_requests)
+        ]
+        for future in futures:
+            future.result()
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            "batch_size": batch_size,
+            "requests": num_requests,
+            "throughput_rps": round(num_requests / elapsed, 3),
+            "p50_latency_s": round(float(np.percentile(latencies, 50)), 3),
+            "p95_latency_s": round(float(np.percentile(latencies, 95)), 3),
+            "batches_run": scheduler.batches_run,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark XTTS micro-batching throughput and latency"
+    )
+    parser.add_argument(
+        "--speaker", "-s",
+        required=True,
+        nargs="+",
+        help="Path(s) to speaker audio file(s) used for conditioning"
+    )
+    parser.add_argument(
+        "--requests", "-n",
+        type=int,
+        default=16,
+        help="Concurrent requests per batch size (default: 16)"
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Batch sizes to compare (default: 1 2 4 8)"
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=BATCH_MAX_WAIT_MS,
+        help="Batch collection window in milliseconds"
+    )
+    parser.add_argument(
+        "--json",
+        help="Also write results to this JSON file"
+    )
+    args = parser.parse_args()
+
+    from model_loader import get_model_loader
+
+    loader = get_model_loader()
+    xtts = loader.get_xtts_model()
+    gpt_cond_latent, speaker_embedding = loader.get_conditioning_latents(args.speaker)
+
+    results = benchmark(
+        xtts, gpt_cond_latent, speaker_embedding,
+        batch_sizes=args.batch_sizes,
+        num_requests=args.requests,
+        max_wait_ms=args.max_wait_ms,
+    )
+
+    print(f"{'batch':>5}  {'req/s':>8}  {'p50 (s)':>8}  {'p95 (s)':>8}  {'batches':>7}")
+    for r in results:
+        print(f"{r['batch_size']:>5}  {r['throughput_rps']:>8}  {r['p50_latency_s']:>8}  "
+              f"{r['p95_latency_s']:>8}  {r['batches_run']:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
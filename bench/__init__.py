@@ -0,0 +1,7 @@
+"""
+Benchmark suite for XTTS synthesis.
+
+Run with `python -m bench run --stub` (no weights needed) or
+`python -m bench run --speaker voice_samples/sample.wav` (real model), and
+check for regressions with `python -m bench compare baseline.json results.json`.
+"""
@@ -0,0 +1,173 @@
+"""
+Benchmark CLI.
+
+Usage:
+    python -m bench run --stub --output bench_results.json
+    python -m bench run --speaker voice_samples/sample.wav --output nightly.json
+    python -m bench compare baseline.json bench_results.json --threshold 0.15
+
+Environment Variables:
+    Model settings (INFERENCE_ENGINE, BATCH_MAX_SIZE, WORKER_PROCESSES, ...)
+    are read as usual and recorded in the results. The result and segment
+    caches are always disabled, and latent caches go to a scratch
+    directory, so runs do not warm each other up.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def run(args):
+    # Paths are resolved before moving into the scratch directory
+    for name in ("CUSTOM_MODEL_PATH", "CUSTOM_CONFIG_PATH"):
+        if os.getenv(name):
+            os.environ[name] = os.path.abspath(os.environ[name])
+    speaker = os.path.abspath(args.speaker) if args.speaker else None
+    output = os.path.abspath(args.output)
+
+    scratch = Path(tempfile.mkdtemp(prefix="xtts-bench-"))
+    os.chdir(scratch)
+    os.environ["RESULT_CACHE_ENABLED"] = "0"
+    os.environ["SEGMENT_CACHE_ENABLED"] = "0"
+    os.environ["LATENT_CACHE_DIR"] = str(scratch / "latents")
+    if args.stub:
+        # The stub has no GPT internals to batch or fork around
+        os.environ["BATCH_MAX_SIZE"] = "1"
+        os.environ["WORKER_PROCESSES"] = "0"
+    sys.path.insert(0, str(REPO_ROOT))
+
+    from bench.runner import BenchmarkRunner, describe_environment, make_reference_clips
+    from model_loader import get_model_loader
+
+    loader = get_model_loader()
+    print(f"Scratch directory: {scratch}")
+
+    start = time.perf_counter()
+    if args.stub:
+        from bench.stub_model import StubXtts
+
+        loader.model = StubXtts(rtf=args.stub_rtf)
+    else:
+        loader.load_model()
+    load_seconds = time.perf_counter() - start
+
+    clips = make_reference_clips(scratch, speaker)
+    runner = BenchmarkRunner(
+        loader, clips,
+        repeats=args.repeats,
+        concurrency=args.concurrency,
+        requests=args.requests,
+        languages=args.languages,
+    )
+    runner.record("model_load_s", load_seconds, "s")
+    results = runner.run(scratch)
+
+    report = {
+        "environment": describe_environment("stub" if args.stub else "real"),
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {output}")
+
+
+def compare_command(args):
+    from bench.compare import compare, load_results, print_report
+
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+    rows = compare(baseline, current, threshold=args.threshold, min_delta=args.min_delta)
+    missing = [name for name in baseline if name not in current]
+    print_report(rows, missing)
+
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Benchmark XTTS synthesis latency, real-time factor and memory"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark suite")
+    run_parser.add_argument(
+        "--stub",
+        action="store_true",
+        help="Use a weightless stub model (fast, for CI)"
+    )
+    run_parser.add_argument(
+        "--stub-rtf",
+        type=float,
+        default=0.05,
+        help="Simulated real-time factor of the stub model (default: 0.05)"
+    )
+    run_parser.add_argument(
+        "--speaker", "-s",
+        help="Reference voice to cut the 3/10/30 s clips from (default: synthetic signal)"
+    )
+    run_parser.add_argument(
+        "--output", "-o",
+        default="bench_results.json",
+        help="Where to write the JSON results (default: bench_results.json)"
+    )
+    run_parser.add_argument(
+        "--repeats", "-n",
+        type=int,
+        default=3,
+        help="Repetitions per measurement; the median is reported (default: 3)"
+    )
+    run_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Concurrent clients in the throughput test (default: 4)"
+    )
+    run_parser.add_argument(
+        "--requests",
+        type=int,
+        default=16,
+        help="Requests in the throughput test (default: 16)"
+    )
+    run_parser.add_argument(
+        "--languages",
+        nargs="+",
+        choices=["en", "es", "de", "fr"],
+        help="Languages to measure (default: all)"
+    )
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare results against a baseline")
+    compare_parser.add_argument("baseline", help="Baseline results JSON")
+    compare_parser.add_argument("current", help="New results JSON")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Relative change counted as a regression (default: 0.15)"
+    )
+    compare_parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.005,
+        help="Ignore absolute changes smaller than this (default: 0.005)"
+    )
+    compare_parser.set_defaults(func=compare_command)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
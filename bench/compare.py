@@ -0,0 +1,48 @@
+"""
+Compare benchmark results against a baseline and flag regressions.
+"""
+
+import json
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r") as f:
+        data = json.load(f)
+    return {metric["name"]: metric for metric in data["results"]}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.15, min_delta: float = 0.005) -> list:
+    """
+    Return one row per metric present in both result sets.
+
+    change is relative to the baseline; a metric regresses when it moves in
+    its "worse" direction by more than threshold and by more than min_delta
+    in absolute terms, so sub-millisecond timings do not flag on jitter.
+    """
+    rows = []
+    for name, base in baseline.items():
+        if name not in current:
+            continue
+        base_value = base["value"]
+        value = current[name]["value"]
+        change = (value - base_value) / base_value if base_value else 0.0
+        worse = change if base["better"] == "lower" else -change
+        rows.append({
+            "name": name,
+            "baseline": base_value,
+            "current": value,
+            "unit": base["unit"],
+            "change": change,
+            "regression": worse > threshold and abs(value - base_value) > min_delta,
+        })
+    return rows
+
+
+def print_report(rows: list, missing: list):
+    print(f"{'metric':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['name']:<40} {row['baseline']:>12.4f} {row['current']:>12.4f} "
+              f"{row['change']:>+7.1%}{flag}")
+    for name in missing:
+        print(f"{name:<40} missing from current results")
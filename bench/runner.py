@@ -0,0 +1,312 @@
+"""
+Benchmark scenarios.
+
+Each scenario drives XTTSModelLoader directly or the Flask app through its
+test client and appends metrics to a flat list:
+
+    {"name": "rtf/en/medium", "value": 0.42, "unit": "x", "better": "lower"}
+
+Names are stable across runs so results can be compared with a baseline.
+"""
+
+import io
+import os
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+TEXTS = {
+    "short": "Hello, and welcome back.",
+    "medium": (
+        "The quick brown fox jumps over the lazy dog. It was a bright cold day in April, "
+        "and the clocks were striking thirteen. Nobody expected the results to arrive so early."
+    ),
+    "long": " ".join([
+        "Speech synthesis has come a long way in the last decade.",
+        "Early systems stitched together recorded fragments of speech.",
+        "Later, statistical models learned to predict acoustic features directly.",
+        "Today, neural networks generate audio that is often hard to tell apart from a real voice.",
+        "Voice cloning goes one step further and imitates a speaker from a short recording.",
+        "That makes the quality of the reference clip just as important as the model itself.",
+        "Background noise, music and reverb all leak into the cloned voice.",
+        "A clean recording of ten to thirty seconds usually gives the best results.",
+        "Longer texts are split into sentences and synthesized one after another.",
+        "The pieces are then joined with short crossfades so the seams are inaudible.",
+    ]),
+}
+
+LANGUAGE_TEXTS = {
+    "en": "This is a short test of the speech synthesis system in English.",
+    "es": "Esta es una breve prueba del sistema de síntesis de voz en español.",
+    "de": "Dies ist ein kurzer Test des Sprachsynthesesystems auf Deutsch.",
+    "fr": "Ceci est un court essai du système de synthèse vocale en français.",
+}
+
+REFERENCE_SECONDS = (3, 10, 30)
+
+
+class RssSampler:
+    """Tracks the peak resident set size of this process while active."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_rss() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            import resource
+            # ru_maxrss is the lifetime peak, in KiB on Linux and bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if platform.system() == "Darwin" else peak * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self.current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_bytes = self.current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self.current_rss())
+
+
+def make_reference_clips(directory: Path, speaker: str = None) -> dict:
+    """
+    Write reference clips of each length in REFERENCE_SECONDS.
+
+    Clips are cut from (or looped from) the given speaker file; without one a
+    synthetic voiced signal is used, which is enough for the stub model.
+    """
+    if speaker:
+        audio, sample_rate = sf.read(speaker, dtype="float32", always_2d=True)
+        audio = audio.mean(axis=1)
+    else:
+        sample_rate = 22050
+        rng = np.random.default_rng(0)
+        t = np.arange(sample_rate * max(REFERENCE_SECONDS)) / sample_rate
+        pitch = 120 + 20 * np.sin(2 * np.pi * 0.5 * t)
+        audio = 0.2 * np.sin(2 * np.pi * np.cumsum(pitch) / sample_rate) + 0.02 * rng.standard_normal(len(t))
+        audio = audio.astype(np.float32)
+
+    clips = {}
+    for seconds in REFERENCE_SECONDS:
+        needed = seconds * sample_rate
+        clip = np.tile(audio, int(np.ceil(needed / len(audio))))[:needed]
+        path = directory / f"reference_{seconds}s.wav"
+        sf.write(path, clip, sample_rate)
+        clips[seconds] = str(path)
+    return clips
+
+
+def describe_environment(mode: str) -> dict:
+    import torch
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "mode": mode,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            name: os.getenv(name)
+            for name in ("INFERENCE_ENGINE", "BATCH_MAX_SIZE", "WORKER_PROCESSES", "PIPELINE_DEPTH")
+            if os.getenv(name) is not None
+        },
+    }
+
+
+class BenchmarkRunner:
+    """Runs the benchmark scenarios against a loaded XTTSModelLoader."""
+
+    def __init__(self, loader, clips: dict, repeats: int = 3, concurrency: int = 4,
+                 requests: int = 16, languages=None):
+        self.loader = loader
+        self.clips = clips
+        self.repeats = repeats
+        self.concurrency = concurrency
+        self.requests = requests
+        self.languages = languages or list(LANGUAGE_TEXTS)
+        self.results = []
+
+    def record(self, name: str, value: float, unit: str, better: str = "lower"):
+        self.results.append({"name": name, "value": round(float(value), 6), "unit": unit, "better": better})
+        print(f"  {name:<40} {value:>12.4f} {unit}")
+
+    def _fresh_latent_cache(self, directory: str):
+        from model_loader import ConditioningLatentCache
+
+        self.loader.latent_cache = ConditioningLatentCache(cache_dir=directory)
+
+    def _synthesize(self, text: str, language: str, speaker_wav: str):
+        """Synthesize into memory; return (seconds taken, seconds of audio)."""
+        from model_loader import OUTPUT_SAMPLE_RATE
+
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        self.loader.tts_to_file(text=text, file_path=buffer, speaker_wav=[speaker_wav], language=language)
+        elapsed = time.perf_counter() - start
+        buffer.seek(0)
+        return elapsed, sf.info(buffer).frames / OUTPUT_SAMPLE_RATE
+
+    def bench_conditioning(self, scratch: Path):
+        """Cold (uncached) and warm (cached) conditioning per reference length."""
+        print("Conditioning")
+        with RssSampler() as rss:
+            for seconds, clip in self.clips.items():
+                cold = []
+                for attempt in range(self.repeats):
+                    self._fresh_latent_cache(str(scratch / f"latents-{seconds}-{attempt}"))
+                    start = time.perf_counter()
+                    self.loader.get_conditioning_latents([clip])
+                    cold.append(time.perf_counter() - start)
+                warm = []
+                for _ in range(self.repeats):
+                    start = time.perf_counter()
+                    self.loader.get_conditioning_latents([clip])
+                    warm.append(time.perf_counter() - start)
+                self.record(f"conditioning_cold_s/ref{seconds}s", statistics.median(cold), "s")
+                self.record(f"conditioning_warm_s/ref{seconds}s", statistics.median(warm), "s")
+        self.record("peak_rss_mb/conditioning", rss.peak_bytes / 1024 ** 2, "MB")
+
+    def bench_synthesis(self):
+        """Real-time factor across text lengths, languages and reference lengths."""
+        print("Synthesis")
+        default_clip = self.clips[10]
+        with RssSampler() as rss:
+            # Condition up front so RTF measures synthesis only
+            for clip in self.clips.values():
+                self.loader.get_conditioning_latents([clip])
+
+            for length, text in TEXTS.items():
+                rtfs = []
+                for _ in range(self.repeats):
+                    elapsed, audio_seconds = self._synthesize(text, "en", default_clip)
+                    rtfs.append(elapsed / audio_seconds)
+                self.record(f"rtf/en/{length}", statistics.median(rtfs), "x")
+
+            for language in self.languages:
+                rtfs = []
+                for _ in range(self.repeats):
+                    elapsed, audio_seconds = self._synthesize(LANGUAGE_TEXTS[language], language, default_clip)
+                    rtfs.append(elapsed / audio_seconds)
+                self.record(f"rtf/{language}/sentence", statistics.median(rtfs), "x")
+
+            for seconds, clip in self.clips.items():
+                rtfs = []
+                for _ in range(self.repeats):
+                    elapsed, audio_seconds = self._synthesize(TEXTS["medium"], "en", clip)
+                    rtfs.append(elapsed / audio_seconds)
+                self.record(f"rtf/en/medium/ref{seconds}s", statistics.median(rtfs), "x")
+        self.record("peak_rss_mb/synthesis", rss.peak_bytes / 1024 ** 2, "MB")
+
+    def bench_time_to_first_audio(self, client):
+        """First audio chunk latency from the loader and over HTTP (/api/stream)."""
+        print("Time to first audio")
+        clip = self.clips[10]
+        self.loader.get_conditioning_latents([clip])
+
+        for length in ("short", "long"):
+            latencies = []
+            for _ in range(self.repeats):
+                start = time.perf_counter()
+                chunks = self.loader.tts_stream(text=TEXTS[length], speaker_wav=[clip], language="en")
+                next(iter(chunks))
+                latencies.append(time.perf_counter() - start)
+                chunks.close()
+            self.record(f"ttfa_s/loader/{length}", statistics.median(latencies), "s")
+
+        with open(clip, "rb") as f:
+            reference = f.read()
+        latencies = []
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            response = client.post(
+                "/api/stream",
+                data={"text": TEXTS["long"], "language": "en", "voice_sample": (io.BytesIO(reference), "ref.wav")},
+                content_type="multipart/form-data",
+                buffered=False,
+            )
+            body = iter(response.response)
+            next(body)  # WAV header
+            next(body)  # first PCM chunk
+            latencies.append(time.perf_counter() - start)
+            response.close()
+        self.record("ttfa_s/http_stream/long", statistics.median(latencies), "s")
+
+    def bench_throughput(self, client):
+        """Concurrent /api/clone requests through the Flask app."""
+        print(f"Throughput ({self.requests} requests, concurrency {self.concurrency})")
+        with open(self.clips[10], "rb") as f:
+            reference = f.read()
+
+        def one_request(index):
+            start = time.perf_counter()
+            response = client.post(
+                "/api/clone",
+                data={
+                    # Distinct texts so no result cache can answer
+                    "text": f"Request number {index}. {TEXTS['medium']}",
+                    "language": "en",
+                    "in_memory": "1",
+                    "response": "audio",
+                    "voice_sample": (io.BytesIO(reference), "ref.wav"),
+                },
+                content_type="multipart/form-data",
+            )
+            if response.status_code != 200 or response.mimetype != "audio/wav":
+                raise RuntimeError(f"/api/clone failed: {response.status_code} {response.get_data()[:200]!r}")
+            audio_seconds = sf.info(io.BytesIO(response.get_data())).duration
+            return time.perf_counter() - start, audio_seconds
+
+        with RssSampler() as rss:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                outcomes = list(pool.map(one_request, range(self.requests)))
+            elapsed = time.perf_counter() - start
+
+        latencies = [latency for latency, _ in outcomes]
+        self.record("throughput_rps/clone", self.requests / elapsed, "req/s", better="higher")
+        self.record("throughput_audio_x/clone", sum(s for _, s in outcomes) / elapsed, "x", better="higher")
+        self.record("latency_p50_s/clone", float(np.percentile(latencies, 50)), "s")
+        self.record("latency_p95_s/clone", float(np.percentile(latencies, 95)), "s")
+        self.record("peak_rss_mb/throughput", rss.peak_bytes / 1024 ** 2, "MB")
+
+    def run(self, scratch: Path) -> list:
+        import web_server
+
+        client = web_server.app.test_client()
+        self.bench_conditioning(scratch)
+        self.bench_synthesis()
+        self.bench_time_to_first_audio(client)
+        self.bench_throughput(client)
+        return self.results
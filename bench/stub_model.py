@@ -0,0 +1,87 @@
+"""
+Weightless stand-in for the XTTS model.
+
+Implements the parts of the Xtts interface that XTTSModelLoader uses, with
+output shapes and a cost model loosely shaped like the real thing: audio
+length grows with the text, synthesis takes `rtf` seconds per audio second
+and conditioning cost grows with the reference length. It lets the benchmark
+exercise everything around the model (segmentation, caching, pipelining,
+WAV writing, HTTP) in CI without downloading weights.
+"""
+
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import soundfile as sf
+import torch
+
+SAMPLE_RATE = 24000
+
+# Roughly the speaking rate XTTS produces
+SECONDS_PER_CHAR = 0.065
+
+LANGUAGES = ["en", "es", "fr", "de", "it", "pt", "pl", "tr", "ru", "nl", "cs", "ar", "zh-cn", "ja", "hu", "ko"]
+
+
+class StubXtts(torch.nn.Module):
+    """Xtts look-alike that sleeps instead of running the networks."""
+
+    def __init__(self, rtf: float = 0.05, conditioning_rtf: float = 0.005, stream_chunk_seconds: float = 0.25):
+        super().__init__()
+        self.rtf = rtf
+        self.conditioning_rtf = conditioning_rtf
+        self.stream_chunk_seconds = stream_chunk_seconds
+        self.config = SimpleNamespace(
+            gpt_cond_len=30,
+            gpt_cond_chunk_len=4,
+            max_ref_len=30,
+            sound_norm_refs=False,
+            temperature=0.75,
+            length_penalty=1.0,
+            repetition_penalty=10.0,
+            top_k=50,
+            top_p=0.85,
+        )
+        self.tokenizer = SimpleNamespace(char_limits={language.split("-")[0]: 250 for language in LANGUAGES})
+        # A parameter so .device and .to() behave like a real module
+        self.anchor = torch.nn.Parameter(torch.zeros(1), requires_grad=False)
+
+    @property
+    def device(self):
+        return self.anchor.device
+
+    def _condition(self, seconds: float):
+        time.sleep(seconds * self.conditioning_rtf)
+        return torch.zeros(1, 32, 1024), torch.zeros(1, 512, 1)
+
+    def get_conditioning_latents(self, audio_path, max_ref_length=30, **kwargs):
+        seconds = 0.0
+        for path in audio_path:
+            # Decode like the real model does, so file I/O is part of the measurement
+            audio, sample_rate = sf.read(path, dtype="float32")
+            seconds += min(len(audio) / sample_rate, max_ref_length)
+        return self._condition(seconds)
+
+    def get_speaker_embedding(self, audio, sr):
+        return torch.zeros(1, 512, 1)
+
+    def get_gpt_cond_latents(self, audio, sr, length: int = 30, chunk_length: int = 6):
+        return self._condition(audio.shape[-1] / sr)[0]
+
+    def _tone(self, seconds: float):
+        t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+        return (0.3 * np.sin(2 * np.pi * 180.0 * t)).astype(np.float32)
+
+    def inference(self, text, language, gpt_cond_latent, speaker_embedding, **kwargs):
+        seconds = max(len(text), 1) * SECONDS_PER_CHAR
+        time.sleep(seconds * self.rtf)
+        return {"wav": self._tone(seconds)}
+
+    def inference_stream(self, text, language, gpt_cond_latent, speaker_embedding, **kwargs):
+        remaining = max(len(text), 1) * SECONDS_PER_CHAR
+        while remaining > 0:
+            seconds = min(self.stream_chunk_seconds, remaining)
+            time.sleep(seconds * self.rtf)
+            remaining -= seconds
+            yield torch.from_numpy(self._tone(seconds))
@@ -4,20 +4,26 @@ Voice Cloning with XTTS v2
 
 This script clones a voice from audio samples and generates speech.
 XTTS v2 can clone a voice with just 6+ seconds of clear audio.
+
+With --batch, every line of a JSONL manifest is synthesized with a single
+model load (see batch_synthesis.py).
 """
 
 import os
+import sys
 import argparse
 from pathlib import Path
 
 from model_loader import get_model_loader
+from voice_profiles import get_voice_store
 
 
 def clone_and_speak(
     text: str,
-    speaker_wav: str | list[str],
+    speaker_wav: str | list[str] | None = None,
     output_path: str = "output/cloned_speech.wav",
     language: str = "en",
+    voice_id: str | None = None,
 ):
     """
     Clone a voice from audio sample(s) and generate speech.
@@ -27,7 +33,18 @@ def clone_and_speak(
         speaker_wav: Path to speaker audio file(s) for voice cloning
         output_path: Where to save the generated audio
         language: Language code (en, es, fr, de, it, pt, pl, tr, ru, nl, cs, ar, zh-cn, ja, hu, ko)
+        voice_id: ID of a stored voice profile, used instead of speaker_wav
     """
+    audio_hash = None
+    if voice_id:
+        profile = get_voice_store().get(voice_id)
+        if profile is None:
+            raise ValueError(f"Unknown voice profile: {voice_id}")
+        speaker_wav = profile["samples"]
+        audio_hash = profile["audio_hash"]
+    elif not speaker_wav:
+        raise ValueError("Either speaker_wav or voice_id is required")
+
     # Load model (public or custom based on environment variables)
     loader = get_model_loader()
     model_info = loader.get_model_info()
@@ -59,6 +76,7 @@ def clone_and_speak(
         file_path=output_path,
         speaker_wav=speaker_wav_path,
         language=language,
+        audio_hash=audio_hash,
     )
 
     print(f"Audio saved to: {output_path}")
@@ -71,36 +89,88 @@ def main():
     )
     parser.add_argument(
         "--text", "-t",
-        required=True,
         help="Text to convert to speech"
     )
     parser.add_argument(
+        "--batch", "-b",
+        metavar="MANIFEST",
+        help="JSONL manifest of lines to synthesize (see batch_synthesis.py); "
+             "--speaker/--voice-id/--language become per-line defaults"
+    )
+    voice_group = parser.add_mutually_exclusive_group()
+    voice_group.add_argument(
         "--speaker", "-s",
-        required=True,
         nargs="+",
         help="Path(s) to speaker audio file(s) for voice cloning (WAV format, 6+ seconds recommended)"
     )
+    voice_group.add_argument(
+        "--voice-id", "-v",
+        help="ID of a voice profile registered via /api/voices (used instead of --speaker)"
+    )
     parser.add_argument(
         "--output", "-o",
-        default="output/cloned_speech.wav",
-        help="Output audio file path"
+        help="Output audio file path (default: output/cloned_speech.wav), "
+             "or the output directory with --batch (default: output/batch)"
     )
     parser.add_argument(
         "--language", "-l",
         default="en",
         help="Language code (default: en)"
     )
+    parser.add_argument(
+        "--model", "-m",
+        help="Named model for --batch lines without one (see model_registry.py)"
+    )
+    parser.add_argument(
+        "--concurrency", "-c",
+        type=int,
+        help="Lines synthesized at once in --batch mode (default: one per worker process)"
+    )
+    parser.add_argument(
+        "--ledger",
+        help="Progress ledger for --batch (default: <output dir>/ledger.jsonl)"
+    )
 
     args = parser.parse_args()
 
     # Handle single or multiple speaker files
-    speaker_wav = args.speaker[0] if len(args.speaker) == 1 else args.speaker
+    speaker_wav = None
+    if args.speaker:
+        speaker_wav = args.speaker[0] if len(args.speaker) == 1 else args.speaker
+
+    if args.batch:
+        from batch_synthesis import run_batch
+
+        defaults = {"language": args.language}
+        if speaker_wav:
+            defaults["speaker"] = speaker_wav
+        if args.voice_id:
+            defaults["voice_id"] = args.voice_id
+        if args.model:
+            defaults["model"] = args.model
+        try:
+            summary = run_batch(
+                args.batch,
+                output_dir=args.output or "output/batch",
+                concurrency=args.concurrency,
+                defaults=defaults,
+                ledger_path=args.ledger,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        sys.exit(1 if summary["failed"] else 0)
+
+    if not args.text:
+        parser.error("--text is required (or use --batch)")
+    if not speaker_wav and not args.voice_id:
+        parser.error("one of --speaker or --voice-id is required")
 
     clone_and_speak(
         text=args.text,
         speaker_wav=speaker_wav,
-        output_path=args.output,
+        output_path=args.output or "output/cloned_speech.wav",
         language=args.language,
+        voice_id=args.voice_id,
     )
 
 
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Dataset Preparation for Fine-Tuning
+
+Validates and normalizes a speaker dataset in parallel:
+
+    audio_dir/
+        speaker_name/
+            audio1.wav
+            audio1.txt  (transcription)
+            ...
+
+A process pool decodes every WAV and checks its duration, sample rate,
+clipping and silence ratio. Accepted clips are resampled to mono 16-bit at
+TRAINING_SAMPLE_RATE under output_dir/wavs/. Each result (accepted or
+rejected, with the reason) is appended to a manifest shard as soon as it is
+ready, so an interrupted run keeps its progress. On the next run, files
+whose size and modification time are unchanged are skipped without being
+read, and files that were touched but whose content hash is unchanged are
+skipped after hashing. A run ends by writing metadata.json (the accepted
+clips, as read by `train_voice.py train`) and speakers.json (per-speaker
+statistics).
+
+Environment Variables:
+    DATASET_WORKERS: Worker processes (default: number of CPUs)
+    DATASET_SHARD_SIZE: Records per manifest shard (default: 1000)
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+DATASET_WORKERS = int(os.getenv("DATASET_WORKERS", "0")) or os.cpu_count() or 1
+DATASET_SHARD_SIZE = int(os.getenv("DATASET_SHARD_SIZE", "1000"))
+
+# XTTS v2 is trained on 22.05 kHz audio
+TRAINING_SAMPLE_RATE = 22050
+
+# Bump when validation or resampling changes, so every file is redone
+PREPARE_VERSION = 1
+
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+
+
+class ClipLimits:
+    """Validation thresholds for training clips."""
+
+    def __init__(self, min_seconds: float = 1.0, max_seconds: float = 11.6, min_sample_rate: int = 16000,
+                 max_clipped_fraction: float = 0.001, max_silence_ratio: float = 0.5):
+        self.min_seconds = min_seconds
+        # XTTS fine-tuning drops clips longer than ~11.6 s (max_wav_length)
+        self.max_seconds = max_seconds
+        self.min_sample_rate = min_sample_rate
+        self.max_clipped_fraction = max_clipped_fraction
+        self.max_silence_ratio = max_silence_ratio
+
+    def signature(self) -> str:
+        return (f"v{PREPARE_VERSION}:{TRAINING_SAMPLE_RATE}:{self.min_seconds:g}:{self.max_seconds:g}:"
+                f"{self.min_sample_rate}:{self.max_clipped_fraction:g}:{self.max_silence_ratio:g}")
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prepare_clip(task: dict) -> dict:
+    """
+    Validate and resample one clip (runs in a worker process).
+
+    Returns the manifest record. When the content hash matches
+    task["previous_hash"], the clip is not decoded and the record is
+    marked unchanged.
+    """
+    from audio_preprocessing import frame_levels, resample, voiced_frames
+
+    source = task["source"]
+    limits = task["limits"]
+    stat = os.stat(source)
+    record = {
+        "source": source,
+        "speaker_name": task["speaker_name"],
+        "text": task["text"],
+        "source_size": stat.st_size,
+        "source_mtime": stat.st_mtime,
+        "settings": limits.signature(),
+    }
+    try:
+        content_hash = hash_file(source)
+        record["hash"] = content_hash
+        if content_hash == task.get("previous_hash"):
+            return {**record, "unchanged": True}
+
+        info = sf.info(source)
+        record["source_sample_rate"] = info.samplerate
+        record["source_channels"] = info.channels
+        duration = info.frames / info.samplerate
+        record["duration"] = round(duration, 3)
+
+        check = reason = None
+        if info.samplerate < limits.min_sample_rate:
+            check, reason = "sample_rate", f"sample rate {info.samplerate} Hz is below {limits.min_sample_rate} Hz"
+        elif duration < limits.min_seconds:
+            check, reason = "too_short", f"too short ({duration:.2f}s < {limits.min_seconds:g}s)"
+        elif duration > limits.max_seconds:
+            check, reason = "too_long", f"too long ({duration:.2f}s > {limits.max_seconds:g}s)"
+        if reason:
+            return {**record, "status": REJECTED, "check": check, "reason": reason}
+
+        audio, sample_rate = sf.read(source, dtype="float32", always_2d=True)
+        audio = audio.mean(axis=1)
+
+        clipped = np.count_nonzero(np.abs(audio) >= 0.999) / len(audio)
+        frame = max(1, sample_rate // 50)
+        levels = frame_levels(audio, frame)
+        voiced = voiced_frames(levels)
+        silence_ratio = 1.0 - (np.count_nonzero(voiced) / len(voiced) if len(voiced) else 0.0)
+        record["clipped_fraction"] = round(float(clipped), 5)
+        record["silence_ratio"] = round(float(silence_ratio), 3)
+        record["rms_dbfs"] = round(float(np.mean(levels[voiced])), 2) if voiced.any() else None
+
+        if not voiced.any():
+            check, reason = "silent", "silent"
+        elif clipped > limits.max_clipped_fraction:
+            check, reason = "clipped", f"clipped ({clipped:.2%} of samples at full scale)"
+        elif silence_ratio > limits.max_silence_ratio:
+            check, reason = "silence", f"mostly silence ({silence_ratio:.0%})"
+        if reason:
+            return {**record, "status": REJECTED, "check": check, "reason": reason}
+
+        audio = resample(audio, sample_rate, TRAINING_SAMPLE_RATE)
+        output = Path(task["wavs_dir"]) / task["speaker_name"] / f"{content_hash[:20]}.wav"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+        sf.write(tmp_path, np.clip(audio, -1.0, 1.0), TRAINING_SAMPLE_RATE, format="WAV", subtype="PCM_16")
+        os.replace(tmp_path, output)
+        return {**record, "status": ACCEPTED, "audio_file": str(output)}
+    except Exception as e:
+        return {**record, "status": REJECTED, "check": "unreadable", "reason": f"unreadable: {e}"}
+
+
+class ManifestShards:
+    """
+    Append-only JSONL manifest split into numbered shards.
+
+    Records are flushed one by one, so a crash loses at most the record
+    being written. Reading keeps the last record per source.
+    """
+
+    def __init__(self, directory: Path, shard_size: int = DATASET_SHARD_SIZE):
+        self.directory = directory
+        self.shard_size = max(1, shard_size)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file = None
+        self._count = 0
+
+    def shards(self) -> list:
+        return sorted(self.directory.glob("shard-*.jsonl"))
+
+    def load(self) -> dict:
+        records = {}
+        for shard in self.shards():
+            with open(shard, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A torn last line from a crash
+                    records[record["source"]] = record
+        return records
+
+    def append(self, record: dict):
+        if self._file is None or self._count >= self.shard_size:
+            self._open_next()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._count += 1
+
+    def _open_next(self):
+        if self._file is not None:
+            self._file.close()
+        shards = self.shards()
+        index = int(shards[-1].stem.split("-")[1]) + 1 if shards else 0
+        self._file = open(self.directory / f"shard-{index:05d}.jsonl", "w", encoding="utf-8")
+        self._count = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def compact(self, records: list):
+        """Rewrite the manifest to hold exactly records, dropping superseded lines."""
+        self.close()
+        old = self.shards()
+        tmp_dir = self.directory.with_name(self.directory.name + ".tmp")
+        tmp_dir.mkdir(exist_ok=True)
+        for stale in tmp_dir.glob("*"):
+            stale.unlink()
+        compacted = ManifestShards(tmp_dir, self.shard_size)
+        for record in records:
+            compacted.append(record)
+        compacted.close()
+        for shard in old:
+            shard.unlink()
+        for shard in sorted(tmp_dir.glob("shard-*.jsonl")):
+            os.replace(shard, self.directory / shard.name)
+        tmp_dir.rmdir()
+
+
+def speaker_statistics(records: list) -> dict:
+    """Per-speaker clip counts, durations, levels and rejection reasons."""
+    by_speaker = defaultdict(list)
+    for record in records:
+        by_speaker[record["speaker_name"]].append(record)
+
+    stats = {}
+    for speaker, items in sorted(by_speaker.items()):
+        accepted = [r for r in items if r["status"] == ACCEPTED]
+        durations = np.array([r["duration"] for r in accepted]) if accepted else np.zeros(0)
+        levels = [r["rms_dbfs"] for r in accepted if r.get("rms_dbfs") is not None]
+        reasons = Counter(r["check"] for r in items if r["status"] == REJECTED)
+        stats[speaker] = {
+            "clips": len(accepted),
+            "rejected": len(items) - len(accepted),
+            "total_seconds": round(float(durations.sum()), 1),
+            "mean_seconds": round(float(durations.mean()), 2) if len(durations) else 0.0,
+            "std_seconds": round(float(durations.std()), 2) if len(durations) else 0.0,
+            "mean_rms_dbfs": round(float(np.mean(levels)), 1) if levels else None,
+            "mean_silence_ratio": round(float(np.mean([r["silence_ratio"] for r in accepted])), 3) if accepted else None,
+            "rejection_reasons": dict(reasons),
+        }
+    return stats
+
+
+def find_clips(audio_path: Path):
+    """Yield (speaker_name, wav path, transcript or None) for every WAV in the dataset."""
+    for speaker_dir in sorted(audio_path.iterdir()):
+        if not speaker_dir.is_dir():
+            continue
+        for audio_file in sorted(speaker_dir.glob("*.wav")):
+            transcript_file = audio_file.with_suffix(".txt")
+            transcript = None
+            if transcript_file.exists():
+                with open(transcript_file, "r", encoding="utf-8") as f:
+                    transcript = f.read().strip()
+            yield speaker_dir.name, audio_file, transcript
+
+
+def prepare_dataset(audio_dir: str, output_dir: str, workers: int = DATASET_WORKERS,
+                    limits: ClipLimits = None) -> Path:
+    """Validate, resample and index the dataset; return the path of metadata.json."""
+    limits = limits or ClipLimits()
+    audio_path = Path(audio_dir)
+    output_path = Path(output_dir)
+    wavs_dir = output_path / "wavs"
+    manifest = ManifestShards(output_path / "manifest")
+    previous = manifest.load()
+    signature = limits.signature()
+
+    start = time.perf_counter()
+    current = {}
+    tasks = []
+    missing_transcripts = 0
+    for speaker_name, audio_file, transcript in find_clips(audio_path):
+        source = str(audio_file)
+        if transcript is None:
+            print(f"Warning: No transcript for {audio_file}, skipping...")
+            missing_transcripts += 1
+            continue
+        old = previous.get(source)
+        reusable = (
+            old is not None
+            and old.get("settings") == signature
+            and (old["status"] == REJECTED or os.path.exists(old.get("audio_file", "")))
+        )
+        if reusable:
+            stat = audio_file.stat()
+            if stat.st_size == old["source_size"] and stat.st_mtime == old["source_mtime"]:
+                # Untouched since the last run; only the transcript may have changed
+                if old.get("text") != transcript:
+                    old = {**old, "text": transcript}
+                    manifest.append(old)
+                current[source] = old
+                continue
+        tasks.append({
+            "source": source,
+            "speaker_name": speaker_name,
+            "text": transcript,
+            "limits": limits,
+            "wavs_dir": str(wavs_dir),
+            "previous_hash": old["hash"] if reusable else None,
+        })
+
+    print(f"{len(current) + len(tasks)} clips found, {len(current)} unchanged, {len(tasks)} to check "
+          f"({workers} worker processes)")
+
+    if tasks:
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(prepare_clip, task) for task in tasks]
+            for future in as_completed(futures):
+                record = future.result()
+                if record.pop("unchanged", False):
+                    old = previous[record["source"]]
+                    record = {**old, "text": record["text"], "source_size": record["source_size"],
+                              "source_mtime": record["source_mtime"]}
+                manifest.append(record)
+                current[record["source"]] = record
+                done += 1
+                if done % 100 == 0 or done == len(tasks):
+                    elapsed = time.perf_counter() - start
+                    print(f"  [{done}/{len(tasks)}] {done / elapsed:.1f} clips/s")
+    manifest.close()
+
+    records = [current[source] for source in sorted(current)]
+    # Superseded or deleted entries pile up in append-only shards; rewrite once they dominate
+    stored_lines = sum(1 for shard in manifest.shards() for _ in open(shard, "rb"))
+    if stored_lines > 2 * len(records):
+        manifest.compact(records)
+
+    accepted = [r for r in records if r["status"] == ACCEPTED]
+    metadata = [
+        {
+            "audio_file": r["audio_file"],
+            "text": r["text"],
+            "speaker_name": r["speaker_name"],
+            "duration": r["duration"],
+            "source": r["source"],
+        }
+        for r in accepted
+    ]
+    metadata_file = output_path / "metadata.json"
+    with open(metadata_file, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+    stats = speaker_statistics(records)
+    with open(output_path / "speakers.json", "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+
+    for speaker, speaker_stats in stats.items():
+        print(f"  {speaker}: {speaker_stats['clips']} clips, {speaker_stats['total_seconds'] / 60:.1f} min, "
+              f"{speaker_stats['rejected']} rejected",
+              ", ".join(f"{check}={count}" for check, count in speaker_stats["rejection_reasons"].items()))
+    print(f"Prepared {len(accepted)} audio samples ({len(records) - len(accepted)} rejected, "
+          f"{missing_transcripts} without transcript) in {time.perf_counter() - start:.1f}s")
+    print(f"Metadata saved to: {metadata_file}")
+    return metadata_file
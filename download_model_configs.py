@@ -1,66 +1,507 @@
 #!/usr/bin/env python3
 """
-Manual model config downloader for XTTS v2
-Use this if automatic download fails due to DNS/network issues
+XTTS v2 Model Downloader
+
+Fetches every XTTS v2 artifact (model.pth included) in parallel. Each file
+is split into DOWNLOAD_CHUNK_MB ranges that are fetched concurrently with
+HTTP Range requests and written in place into a .part file. Finished
+ranges are recorded next to it, so an interrupted download resumes where
+it stopped instead of starting over. A file is renamed into place only
+after its size and checksum match the manifest, and a truncated or corrupt
+file from an earlier run is detected and fetched again.
+
+The manifest lists each file with its size and SHA-256 (or git blob SHA-1
+for small files). By default it is read from the Hugging Face file listing
+of the model repository. Point DOWNLOAD_MANIFEST at a JSON file or URL to
+pin it:
+
+    {"files": [{"name": "model.pth", "size": 1867929118, "sha256": "..."}, ...]}
+
+An entry may carry its own "url"; otherwise it is DOWNLOAD_BASE_URL + name.
+XTTSModelLoader calls ensure_model_files() before loading the public model.
+Use this script directly to provision a node, or when the automatic
+download fails because of DNS or network issues.
+
+Coqui's CPML applies to the model: downloads need COQUI_TOS_AGREED=1 or an
+earlier agreement (tos_agreed.txt in the model directory). Run the script
+from a terminal to be asked.
+
+Environment Variables:
+    TTS_HOME: Model root; files go to TTS_HOME/tts/tts_models--multilingual--multi-dataset--xtts_v2 (default: models)
+    DOWNLOAD_BASE_URL: Where files are fetched from (default: https://huggingface.co/coqui/XTTS-v2/resolve/main/)
+    DOWNLOAD_MANIFEST: Manifest file path or URL (default: the Hugging Face listing)
+    DOWNLOAD_CONCURRENCY: Parallel range requests (default: 8)
+    DOWNLOAD_CHUNK_MB: Range size in MB (default: 16)
+    DOWNLOAD_RETRIES: Attempts per range before giving up (default: 5)
+    DOWNLOAD_TIMEOUT: Socket timeout in seconds (default: 30)
 """
 
+import argparse
+import hashlib
+import json
 import os
+import sys
+import threading
+import time
+import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-# XTTS v2 config files from Hugging Face
-BASE_URL = "https://huggingface.co/coqui/XTTS-v2/resolve/main/"
+BASE_URL = os.getenv("DOWNLOAD_BASE_URL", "https://huggingface.co/coqui/XTTS-v2/resolve/main/")
+HUB_LISTING_URL = "https://huggingface.co/api/models/coqui/XTTS-v2/tree/main"
+DOWNLOAD_MANIFEST = os.getenv("DOWNLOAD_MANIFEST")
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+DOWNLOAD_CHUNK_MB = float(os.getenv("DOWNLOAD_CHUNK_MB", "16"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "5"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "30"))
 MODEL_DIR = Path(os.getenv("TTS_HOME", "models")) / "tts" / "tts_models--multilingual--multi-dataset--xtts_v2"
 
-CONFIG_FILES = [
-    "config.json",
-    "vocab.json",
-    "speakers_xtts.pth",
-    "mel_stats.pth",
-]
+# Files the loader cannot work without
+REQUIRED_FILES = ["model.pth", "config.json", "vocab.json"]
+# hash.md5 tells Coqui TTS the model is current; dvae.pth and mel_stats.pth are needed for fine-tuning
+OPTIONAL_FILES = ["speakers_xtts.pth", "hash.md5", "mel_stats.pth", "dvae.pth"]
+
+VERIFIED_FILE = ".verified.json"
+# The manifest of the last successful download, so later loads work offline
+MANIFEST_FILE = "download_manifest.json"
+TOS_FILE = "tos_agreed.txt"
+
+
+class DownloadError(Exception):
+    """Raised when an artifact cannot be fetched or fails verification."""
+
+
+def _open(url: str, headers: dict = None, timeout: float = DOWNLOAD_TIMEOUT):
+    request = urllib.request.Request(url, headers={"User-Agent": "xtts-downloader", **(headers or {})})
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def _read_json(source: str):
+    if source.startswith(("http://", "https://")):
+        with _open(source) as response:
+            return json.load(response)
+    with open(source, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_manifest(source: str = None, base_url: str = BASE_URL, names: list = None) -> list:
+    """
+    Return the artifacts to download as dicts with name, url, size and a checksum.
+
+    source is a manifest file or URL; without one the Hugging Face listing
+    is used (LFS files carry a SHA-256, small files a git blob SHA-1).
+    """
+    names = names or REQUIRED_FILES + OPTIONAL_FILES
+    if source:
+        entries = _read_json(source)["files"]
+    else:
+        entries = []
+        for item in _read_json(HUB_LISTING_URL):
+            if item.get("type") != "file":
+                continue
+            lfs = item.get("lfs")
+            entry = {"name": item["path"], "size": item["size"]}
+            if lfs:
+                entry["sha256"] = lfs["oid"]
+            else:
+                entry["git_sha1"] = item["oid"]
+            entries.append(entry)
+
+    by_name = {entry["name"]: entry for entry in entries}
+    missing = [name for name in REQUIRED_FILES if name in names and name not in by_name]
+    if missing:
+        raise DownloadError(f"Manifest does not list {', '.join(missing)}")
+
+    artifacts = []
+    for name in names:
+        entry = by_name.get(name)
+        if entry is None:
+            print(f"Note: {name} is not in the manifest, skipping")
+            continue
+        if not (entry.get("sha256") or entry.get("git_sha1")):
+            raise DownloadError(f"Manifest entry for {name} has no checksum")
+        artifacts.append({**entry, "size": int(entry["size"]), "url": entry.get("url") or base_url + name})
+    return artifacts
+
+
+def file_digest(path: Path, artifact: dict) -> str:
+    """Digest of the file in the form the manifest uses for this artifact."""
+    if artifact.get("sha256"):
+        digest = hashlib.sha256()
+    else:
+        digest = hashlib.sha1()
+        digest.update(f"blob {path.stat().st_size}\0".encode("ascii"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def expected_digest(artifact: dict) -> str:
+    return artifact.get("sha256") or artifact["git_sha1"]
+
+
+class Progress:
+    """Byte counter with a throttled throughput line."""
+
+    def __init__(self, total: int, already: int):
+        self.total = total
+        self.done = already
+        self.fetched = 0
+        self.started = time.perf_counter()
+        self._last_print = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count: int):
+        with self._lock:
+            self.done += count
+            self.fetched += count
+            now = time.perf_counter()
+            if now - self._last_print < 2.0 and self.done < self.total:
+                return
+            self._last_print = now
+            rate = self.fetched / max(now - self.started, 1e-6)
+            print(
+                f"  {self.done / 1024 ** 2:.1f}/{self.total / 1024 ** 2:.1f} MB "
+                f"({self.done / max(self.total, 1):.1%}), {rate / 1024 ** 2:.1f} MB/s"
+            )
+
+
+class PartialFile:
+    """A .part file being filled by range requests, plus the record of finished ranges."""
+
+    def __init__(self, directory: Path, artifact: dict, chunk_bytes: int):
+        self.artifact = artifact
+        self.path = directory / f".{artifact['name']}.part"
+        self.state_path = directory / f".{artifact['name']}.part.json"
+        self.size = artifact["size"]
+        self.chunk_bytes = chunk_bytes
+        self._lock = threading.Lock()
+
+        state = None
+        if self.path.exists() and self.state_path.exists():
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                state = None
+        if (state and state.get("digest") == expected_digest(artifact) and state.get("size") == self.size
+                and self.path.stat().st_size == self.size):
+            # Keep the original range size, so recorded ranges still line up
+            self.chunk_bytes = state["chunk_bytes"]
+            self.done = set(state["done"])
+        else:
+            self.done = set()
+            with open(self.path, "wb") as f:
+                f.truncate(self.size)
+            self._save()
 
-def download_file(url: str, dest_path: Path):
-    """Download a file with progress indicator."""
-    print(f"Downloading {dest_path.name}...", end=" ")
+    def _all_ranges(self) -> list:
+        count = max(1, -(-self.size // self.chunk_bytes))
+        return [
+            (index, index * self.chunk_bytes, min(self.size, (index + 1) * self.chunk_bytes) - 1)
+            for index in range(count)
+        ]
+
+    def ranges(self) -> list:
+        """(index, start, end) of every range not yet fetched; end is inclusive."""
+        return [piece for piece in self._all_ranges() if piece[0] not in self.done]
+
+    def bytes_done(self) -> int:
+        return sum(end - start + 1 for index, start, end in self._all_ranges() if index in self.done)
+
+    def mark_done(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            self._save()
+
+    def _save(self):
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "digest": expected_digest(self.artifact),
+                "size": self.size,
+                "chunk_bytes": self.chunk_bytes,
+                "done": sorted(self.done),
+            }, f)
+        os.replace(tmp_path, self.state_path)
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+        self.state_path.unlink(missing_ok=True)
+
+
+class Downloader:
+    """Parallel, resumable, verified download of a set of artifacts into one directory."""
+
+    def __init__(self, output_dir: Path = MODEL_DIR, concurrency: int = DOWNLOAD_CONCURRENCY,
+                 chunk_mb: float = DOWNLOAD_CHUNK_MB, retries: int = DOWNLOAD_RETRIES,
+                 timeout: float = DOWNLOAD_TIMEOUT):
+        self.output_dir = Path(output_dir)
+        self.concurrency = max(1, concurrency)
+        self.chunk_bytes = max(1, int(chunk_mb * 1024 ** 2))
+        self.retries = max(1, retries)
+        self.timeout = timeout
+        self._verified_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # Verification cache: files checked once are trusted while size and mtime are unchanged
+
+    def _load_verified(self) -> dict:
+        try:
+            with open(self.output_dir / VERIFIED_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _remember_verified(self, path: Path, digest: str):
+        with self._verified_lock:
+            verified = self._load_verified()
+            stat = path.stat()
+            verified[path.name] = {"size": stat.st_size, "mtime": stat.st_mtime, "digest": digest}
+            tmp_path = self.output_dir / f"{VERIFIED_FILE}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(verified, f, indent=2)
+            os.replace(tmp_path, self.output_dir / VERIFIED_FILE)
+
+    def is_complete(self, artifact: dict) -> bool:
+        """True if the file is in place with the manifest's size and checksum."""
+        path = self.output_dir / artifact["name"]
+        if not path.exists():
+            return False
+        stat = path.stat()
+        if stat.st_size != artifact["size"]:
+            return False
+        cached = self._load_verified().get(artifact["name"])
+        if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime:
+            return cached["digest"] == expected_digest(artifact)
+        digest = file_digest(path, artifact)
+        if digest != expected_digest(artifact):
+            return False
+        self._remember_verified(path, digest)
+        return True
+
+    def save_manifest(self, artifacts: list):
+        tmp_path = self.output_dir / f"{MANIFEST_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": artifacts}, f, indent=2)
+        os.replace(tmp_path, self.output_dir / MANIFEST_FILE)
+
+    def _supports_ranges(self, artifact: dict) -> bool:
+        try:
+            with _open(artifact["url"], {"Range": "bytes=0-0"}, self.timeout) as response:
+                return response.status == 206
+        except urllib.error.HTTPError as e:
+            if e.code == 416:
+                return False
+            raise
+
+    def _fetch_range(self, partial: PartialFile, index: int, start: int, end: int, progress: Progress):
+        artifact = partial.artifact
+        # Files that fit in one range (or whose server cannot serve ranges) are fetched plainly
+        headers = {"Range": f"bytes={start}-{end}"} if partial.size > partial.chunk_bytes else {}
+        delay = 1.0
+        for attempt in range(1, self.retries + 1):
+            written = 0
+            try:
+                with _open(artifact["url"], headers, self.timeout) as response:
+                    if headers and response.status != 206:
+                        raise DownloadError(f"{artifact['name']}: server ignored the range request")
+                    fd = os.open(partial.path, os.O_WRONLY)
+                    try:
+                        offset = start
+                        while offset <= end and not self._stop.is_set():
+                            block = response.read(min(1024 * 1024, end - offset + 1))
+                            if not block:
+                                break
+                            os.pwrite(fd, block, offset)
+                            offset += len(block)
+                            written += len(block)
+                            progress.add(len(block))
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                if self._stop.is_set():
+                    raise DownloadError(f"{artifact['name']}: cancelled")
+                if written != end - start + 1:
+                    raise ConnectionError(f"connection closed after {written} of {end - start + 1} bytes")
+                partial.mark_done(index)
+                return
+            except urllib.error.HTTPError as e:
+                progress.add(-written)
+                # Client errors other than timeouts and rate limits will not go away on retry
+                if 400 <= e.code < 500 and e.code not in (408, 429):
+                    raise DownloadError(f"{artifact['name']}: HTTP {e.code} from {artifact['url']}") from e
+                error = e
+            except (OSError, urllib.error.URLError) as e:
+                progress.add(-written)
+                error = e
+            if attempt == self.retries:
+                raise DownloadError(f"{artifact['name']} bytes {start}-{end}: {error}") from error
+            print(f"Retrying {artifact['name']} bytes {start}-{end} in {delay:.0f}s ({error})")
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _finish(self, partial: PartialFile):
+        artifact = partial.artifact
+        digest = file_digest(partial.path, artifact)
+        if digest != expected_digest(artifact):
+            partial.discard()
+            raise DownloadError(
+                f"{artifact['name']}: checksum mismatch (expected {expected_digest(artifact)}, got {digest}); "
+                "the partial file was discarded"
+            )
+        destination = self.output_dir / artifact["name"]
+        os.replace(partial.path, destination)
+        partial.state_path.unlink(missing_ok=True)
+        self._remember_verified(destination, digest)
+        print(f"✓ {artifact['name']} ({artifact['size'] // 1024} KB)")
+
+    def download(self, artifacts: list) -> dict:
+        """Fetch every artifact that is missing or fails verification. Raises DownloadError."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        pending = []
+        for artifact in artifacts:
+            if self.is_complete(artifact):
+                print(f"Skipping {artifact['name']} (verified)")
+            else:
+                pending.append(artifact)
+        if not pending:
+            self.save_manifest(artifacts)
+            return {"downloaded": 0, "skipped": len(artifacts), "bytes": 0, "seconds": 0.0}
+
+        partials = {}
+        jobs = []
+        # Small files first, so configs are in place early while model.pth streams in
+        for artifact in sorted(pending, key=lambda artifact: artifact["size"]):
+            partial = PartialFile(self.output_dir, artifact, self.chunk_bytes)
+            if len(partial.ranges()) > 1 and not self._supports_ranges(artifact):
+                # The server cannot serve ranges: fetch the file as one piece
+                partial.discard()
+                partial = PartialFile(self.output_dir, artifact, max(artifact["size"], 1))
+            partials[artifact["name"]] = partial
+            jobs.extend((partial, *piece) for piece in partial.ranges())
+
+        total = sum(artifact["size"] for artifact in pending)
+        progress = Progress(total, sum(partial.bytes_done() for partial in partials.values()))
+        print(f"Downloading {len(pending)} files ({total / 1024 ** 2:.1f} MB, "
+              f"{progress.done / 1024 ** 2:.1f} MB already present) with {self.concurrency} connections")
+
+        remaining = {name: len(partial.ranges()) for name, partial in partials.items()}
+        errors = []
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="download")
+        try:
+            futures = {executor.submit(self._fetch_range, partial, index, start, end, progress): partial
+                       for partial, index, start, end in jobs}
+            for name, count in remaining.items():
+                if count == 0:
+                    futures[executor.submit(self._finish, partials[name])] = None
+            for future in as_completed(list(futures)):
+                partial = futures[future]
+                try:
+                    future.result()
+                except DownloadError as e:
+                    errors.append(str(e))
+                    continue
+                if partial is None:
+                    continue
+                name = partial.artifact["name"]
+                remaining[name] -= 1
+                if remaining[name] == 0:
+                    try:
+                        self._finish(partial)
+                    except DownloadError as e:
+                        errors.append(str(e))
+        except KeyboardInterrupt:
+            # In-flight ranges stop at their next block; finished ranges stay recorded
+            self._stop.set()
+            print("Interrupted; rerun to resume")
+            raise
+        finally:
+            executor.shutdown(wait=not self._stop.is_set(), cancel_futures=True)
+
+        if errors:
+            raise DownloadError("; ".join(errors))
+        self.save_manifest(artifacts)
+        seconds = time.perf_counter() - progress.started
+        print(f"Downloaded {progress.fetched / 1024 ** 2:.1f} MB in {seconds:.1f}s "
+              f"({progress.fetched / 1024 ** 2 / max(seconds, 1e-6):.1f} MB/s)")
+        return {"downloaded": len(pending), "skipped": len(artifacts) - len(pending),
+                "bytes": progress.fetched, "seconds": round(seconds, 1)}
+
+
+def tos_agreed(model_dir: Path) -> bool:
+    return os.environ.get("COQUI_TOS_AGREED") == "1" or (Path(model_dir) / TOS_FILE).exists()
+
+
+def ensure_model_files(model_dir: Path = MODEL_DIR, manifest: str = DOWNLOAD_MANIFEST) -> bool:
+    """
+    Make sure the model directory holds verified copies of every artifact.
+
+    The manifest of the last successful run is reused, so a provisioned
+    node checks its files against it without going online. Returns False
+    (after printing why) when the files could not be made ready; the caller
+    can then fall back to Coqui TTS's own download.
+    """
+    model_dir = Path(model_dir)
+    if manifest is None and (model_dir / MANIFEST_FILE).exists():
+        manifest = str(model_dir / MANIFEST_FILE)
+    if not tos_agreed(model_dir):
+        print("Note: set COQUI_TOS_AGREED=1 to accept the CPML and enable the parallel model download")
+        return False
     try:
-        urllib.request.urlretrieve(url, dest_path)
-        print(f"✓ ({dest_path.stat().st_size // 1024} KB)")
-    except Exception as e:
-        print(f"✗ Error: {e}")
+        artifacts = load_manifest(manifest)
+        Downloader(model_dir).download(artifacts)
+    except (DownloadError, OSError, ValueError, KeyError) as e:
+        print(f"Warning: model download failed: {e}")
         return False
     return True
 
+
 def main():
-    print("XTTS v2 Config File Downloader")
+    parser = argparse.ArgumentParser(description="Download the XTTS v2 model files")
+    parser.add_argument("--output-dir", "-o", default=str(MODEL_DIR), help="Model directory")
+    parser.add_argument("--manifest", "-m", default=DOWNLOAD_MANIFEST,
+                        help="Manifest file or URL (default: the Hugging Face listing)")
+    parser.add_argument("--base-url", default=BASE_URL, help="URL prefix for files without their own URL")
+    parser.add_argument("--concurrency", "-c", type=int, default=DOWNLOAD_CONCURRENCY,
+                        help="Parallel range requests")
+    parser.add_argument("--chunk-mb", type=float, default=DOWNLOAD_CHUNK_MB, help="Range size in MB")
+    parser.add_argument("--configs-only", action="store_true", help="Skip model.pth and dvae.pth")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    print("XTTS v2 Model Downloader")
     print("=" * 50)
-    print(f"Target directory: {MODEL_DIR}")
+    print(f"Target directory: {output_dir}")
     print()
 
-    # Create directory if it doesn't exist
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if not tos_agreed(output_dir):
+        from TTS.utils.manage import ModelManager
 
-    # Download each config file
-    success_count = 0
-    for filename in CONFIG_FILES:
-        dest_path = MODEL_DIR / filename
+        if not ModelManager.ask_tos(str(output_dir)):
+            print("⚠ The model license was not accepted; nothing downloaded.")
+            sys.exit(1)
 
-        # Skip if already exists
-        if dest_path.exists():
-            print(f"Skipping {filename} (already exists)")
-            success_count += 1
-            continue
-
-        url = BASE_URL + filename
-        if download_file(url, dest_path):
-            success_count += 1
+    names = REQUIRED_FILES + OPTIONAL_FILES
+    if args.configs_only:
+        names = [name for name in names if name not in ("model.pth", "dvae.pth")]
+    try:
+        artifacts = load_manifest(args.manifest, base_url=args.base_url, names=names)
+        summary = Downloader(output_dir, concurrency=args.concurrency, chunk_mb=args.chunk_mb).download(artifacts)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except (DownloadError, OSError) as e:
+        print()
+        print(f"⚠ {e}")
+        print("Rerun to resume; finished ranges are kept.")
+        sys.exit(1)
 
     print()
-    print(f"Downloaded {success_count}/{len(CONFIG_FILES)} files")
+    print(f"✓ All files ready ({summary['downloaded']} downloaded, {summary['skipped']} already verified)")
 
-    if success_count == len(CONFIG_FILES):
-        print("✓ All config files ready!")
-    else:
-        print("⚠ Some files failed to download. Check your internet connection.")
 
 if __name__ == "__main__":
     main()
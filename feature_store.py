@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Precomputed Training Features
+
+Fine-tuning the XTTS GPT needs, for every clip: the BPE text tokens, the
+DVAE audio codes of the clip, and a conditioning mel spectrogram. These
+only depend on the audio, the text and the base checkpoint, so they are
+extracted once and stored instead of being recomputed every epoch.
+
+Features are appended to raw shard files under FEATURE_STORE_DIR:
+
+    shards/shard-00000.text.bin   int32 text tokens, back to back
+    shards/shard-00000.codes.bin  int32 DVAE codes
+    shards/shard-00000.mel.bin    float32 conditioning mel frames (frames x 80)
+    index.jsonl                   one line per sample: shard and element offsets
+
+Shards are memory-mapped when read, so a sample is a view into the page
+cache rather than a copy, and DataLoader workers share those pages. A
+sample's key covers the content hash of its audio, its text and language,
+and a signature of the base checkpoint (tokenizer, DVAE, mel statistics
+and the relevant config), so extraction is incremental: only new or
+changed clips are processed, and switching base checkpoints starts a fresh
+set of entries instead of reusing stale ones.
+
+The base checkpoint directory must contain config.json, vocab.json and the
+DVAE used to train it (dvae.pth). mel_stats.pth is used to normalize the
+mels when present.
+
+Environment Variables:
+    FEATURE_STORE_DIR: Store directory (default: features/ next to metadata.json)
+    FEATURE_SHARD_BYTES: Shard size before a new shard is started (default: 1073741824, i.e. 1 GB)
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from dataset_preparation import hash_file
+
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR")
+FEATURE_SHARD_BYTES = int(os.getenv("FEATURE_SHARD_BYTES", str(1024 ** 3)))
+
+# Bump when extraction changes in a way that alters stored features
+FEATURE_VERSION = 1
+
+N_MELS = 80
+# name -> dtype of each shard file; mel rows are N_MELS wide
+ARRAYS = {"text": np.int32, "codes": np.int32, "mel": np.float32}
+
+
+class FeatureExtractor:
+    """Computes text tokens, DVAE codes and conditioning mels with a base checkpoint's components."""
+
+    def __init__(self, checkpoint_dir: str, device: str = None):
+        from TTS.tts.configs.xtts_config import XttsConfig
+        from TTS.tts.layers.tortoise.arch_utils import TorchMelSpectrogram
+        from TTS.tts.layers.xtts.dvae import DiscreteVAE
+        from TTS.tts.layers.xtts.tokenizer import VoiceBpeTokenizer
+
+        from model_loader import get_device
+
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.device = device or get_device()
+        config_path = self.checkpoint_dir / "config.json"
+        vocab_path = self.checkpoint_dir / "vocab.json"
+        dvae_path = self.checkpoint_dir / "dvae.pth"
+        mel_stats_path = self.checkpoint_dir / "mel_stats.pth"
+        for required in (config_path, vocab_path, dvae_path):
+            if not required.exists():
+                raise FileNotFoundError(
+                    f"{required} not found; feature extraction needs the base checkpoint's "
+                    "config.json, vocab.json and dvae.pth"
+                )
+
+        self.config = XttsConfig()
+        self.config.load_json(str(config_path))
+        args = self.config.model_args
+        self.sample_rate = self.config.audio.sample_rate
+        self.tokenizer = VoiceBpeTokenizer(str(vocab_path))
+        self.max_text_tokens = args.gpt_max_text_tokens
+        self.max_audio_tokens = args.gpt_max_audio_tokens
+        self.code_stride = args.gpt_code_stride_len
+
+        mel_norm_file = str(mel_stats_path) if mel_stats_path.exists() else None
+        # Same extractors and DVAE shape as Coqui's GPT trainer
+        if args.gpt_use_perceiver_resampler:
+            self.cond_hop = 256
+            self.style_mel = TorchMelSpectrogram(
+                filter_length=2048, hop_length=256, win_length=1024, normalize=False,
+                sampling_rate=self.sample_rate, mel_fmin=0, mel_fmax=8000, n_mel_channels=N_MELS,
+                mel_norm_file=mel_norm_file,
+            )
+        else:
+            self.cond_hop = 1024
+            self.style_mel = TorchMelSpectrogram(
+                filter_length=4096, hop_length=1024, win_length=4096, normalize=False,
+                sampling_rate=self.sample_rate, mel_fmin=0, mel_fmax=8000, n_mel_channels=N_MELS,
+                mel_norm_file=mel_norm_file,
+            )
+        self.dvae_mel = TorchMelSpectrogram(mel_norm_file=mel_norm_file, sampling_rate=self.sample_rate)
+        self.dvae = DiscreteVAE(
+            channels=N_MELS,
+            normalization=None,
+            positional_dims=1,
+            num_tokens=args.gpt_num_audio_tokens - 2,
+            codebook_dim=512,
+            hidden_dim=512,
+            num_resnet_blocks=3,
+            kernel_size=3,
+            num_layers=2,
+            use_transposed_convs=False,
+        )
+        self.dvae.load_state_dict(torch.load(dvae_path, map_location="cpu", weights_only=True), strict=False)
+        self.dvae.eval().to(self.device)
+
+        parts = [
+            f"v{FEATURE_VERSION}",
+            hash_file(vocab_path),
+            hash_file(dvae_path),
+            hash_file(mel_stats_path) if mel_norm_file else "no-mel-stats",
+            str(self.sample_rate),
+            str(args.gpt_use_perceiver_resampler),
+            str(args.gpt_num_audio_tokens),
+        ]
+        self.signature = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    def load_audio(self, path: str) -> np.ndarray:
+        from audio_preprocessing import resample
+
+        wav, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+        return resample(wav.mean(axis=1), sample_rate, self.sample_rate)
+
+    @torch.inference_mode()
+    def extract(self, wav: np.ndarray, text: str, language: str) -> dict:
+        """Return the feature arrays for one clip. Raises ValueError for unusable samples."""
+        tokens = np.asarray(self.tokenizer.encode(text, language), dtype=np.int32)
+        if len(tokens) == 0 or np.any(tokens == 1):
+            raise ValueError(f"text has unknown tokens for language {language!r}")
+        if len(tokens) > self.max_text_tokens:
+            raise ValueError(f"text is {len(tokens)} tokens (limit {self.max_text_tokens})")
+        if len(wav) // self.code_stride + 3 > self.max_audio_tokens:
+            raise ValueError(f"audio is longer than {self.max_audio_tokens} codes")
+
+        audio = torch.from_numpy(wav).to(self.device).unsqueeze(0)
+        codes = self.dvae.get_codebook_indices(self.dvae_mel(audio))
+        mel = self.style_mel(audio)[0]
+        return {
+            "text": tokens,
+            "codes": codes[0].cpu().numpy().astype(np.int32),
+            "mel": np.ascontiguousarray(mel.cpu().numpy().T, dtype=np.float32),
+        }
+
+
+class FeatureStore:
+    """Sharded, memory-mapped store of extracted features with an append-only JSONL index."""
+
+    def __init__(self, directory: str, shard_bytes: int = FEATURE_SHARD_BYTES):
+        self.directory = Path(directory)
+        self.shard_dir = self.directory / "shards"
+        self.index_path = self.directory / "index.jsonl"
+        self.shard_bytes = shard_bytes
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.records = {}
+        if self.index_path.exists():
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A torn last line from a crash
+                    self.records[record["key"]] = record
+        self._maps = {}
+        self._writer = None
+        self._index = None
+
+    @staticmethod
+    def make_key(audio_hash: str, text: str, language: str, signature: str) -> str:
+        return hashlib.sha256(f"{signature}\0{audio_hash}\0{language}\0{text}".encode("utf-8")).hexdigest()
+
+    def _shard_path(self, shard: str, name: str) -> Path:
+        return self.shard_dir / f"{shard}.{name}.bin"
+
+    def append(self, key: str, features: dict, info: dict) -> dict:
+        """
+        Write one sample's features and index it.
+
+        The arrays are written before the index line, so a crash leaves at
+        most some unreferenced bytes at the end of a shard.
+        """
+        if self._writer is None or self._writer["bytes"] >= self.shard_bytes:
+            self._open_shard()
+        writer = self._writer
+        record = {"key": key, "shard": writer["name"], **info}
+        for name, dtype in ARRAYS.items():
+            array = np.ascontiguousarray(features[name], dtype=dtype)
+            handle = writer["files"][name]
+            record[f"{name}_offset"] = writer["lengths"][name]
+            record[f"{name}_length"] = len(array)
+            handle.write(array.tobytes())
+            writer["lengths"][name] += len(array)
+            writer["bytes"] += array.nbytes
+        for handle in writer["files"].values():
+            handle.flush()
+
+        if self._index is None:
+            self._index = open(self.index_path, "a", encoding="utf-8")
+        self._index.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._index.flush()
+        self.records[key] = record
+        return record
+
+    def _open_shard(self):
+        """Start a new shard; shards written by earlier runs are never appended to."""
+        self.close_writer()
+        existing = {path.name.split(".")[0] for path in self.shard_dir.glob("shard-*.bin")}
+        index = max((int(name.split("-")[1]) for name in existing), default=-1) + 1
+        name = f"shard-{index:05d}"
+        self._writer = {
+            "name": name,
+            "files": {array: open(self._shard_path(name, array), "wb") for array in ARRAYS},
+            "lengths": dict.fromkeys(ARRAYS, 0),
+            "bytes": 0,
+        }
+
+    def close_writer(self):
+        if self._writer is not None:
+            for handle in self._writer["files"].values():
+                handle.close()
+            self._writer = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def _map(self, shard: str, name: str) -> np.ndarray:
+        mapped = self._maps.get((shard, name))
+        if mapped is None:
+            path = self._shard_path(shard, name)
+            if path.stat().st_size == 0:
+                mapped = np.zeros(0, dtype=ARRAYS[name])
+            else:
+                # Copy-on-write mapping: tensors can wrap it without copying or modifying the file
+                mapped = np.memmap(path, dtype=ARRAYS[name], mode="c")
+            if name == "mel":
+                mapped = mapped.reshape(-1, N_MELS)
+            self._maps[(shard, name)] = mapped
+        return mapped
+
+    def read(self, record: dict) -> dict:
+        """Return the sample's arrays as views into the mapped shards."""
+        arrays = {}
+        for name in ARRAYS:
+            offset = record[f"{name}_offset"]
+            arrays[name] = self._map(record["shard"], name)[offset: offset + record[f"{name}_length"]]
+        return arrays
+
+    def __getstate__(self):
+        # Memory maps and open files are per process; DataLoader workers re-map lazily
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        state["_writer"] = None
+        state["_index"] = None
+        return state
+
+    def stats(self) -> dict:
+        return {
+            "samples": len(self.records),
+            "shards": len({record["shard"] for record in self.records.values()}),
+            "bytes": sum(path.stat().st_size for path in self.shard_dir.glob("*.bin")),
+        }
+
+
+class FeatureDataset(torch.utils.data.Dataset):
+    """
+    Training samples read zero-copy from a FeatureStore.
+
+    Each item holds views of the stored arrays: "text" (tokens),
+    "codes" (DVAE codes), "cond_mel" (80 x frames) and "wav_length" in
+    samples. `lengths` gives every sample's code count without touching the
+    shards, for length-bucketed batching.
+    """
+
+    def __init__(self, store: FeatureStore, records: list, cond_hop: int, code_stride: int = 1024):
+        self.store = store
+        self.records = records
+        self.cond_hop = cond_hop
+        self.code_stride = code_stride
+        self.lengths = [record["codes_length"] for record in records]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index: int) -> dict:
+        record = self.records[index]
+        arrays = self.store.read(record)
+        return {
+            "text": torch.from_numpy(arrays["text"]),
+            "codes": torch.from_numpy(arrays["codes"]),
+            "cond_mel": torch.from_numpy(arrays["mel"]).T,
+            "wav_length": record["wav_length"],
+            "speaker_name": record["speaker_name"],
+        }
+
+
+def default_store_dir(metadata_file: str) -> str:
+    return FEATURE_STORE_DIR or str(Path(metadata_file).parent / "features")
+
+
+def extract_features(metadata_file: str, checkpoint_dir: str, store_dir: str = None,
+                     language: str = "en", extractor: FeatureExtractor = None):
+    """
+    Bring the store up to date with metadata.json and return (store, dataset).
+
+    Clips already extracted with the same audio, text, language and base
+    checkpoint are reused; audio hashes are cached by file size and mtime,
+    so an up-to-date run reads no audio at all.
+    """
+    with open(metadata_file, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    store = FeatureStore(store_dir or default_store_dir(metadata_file))
+    extractor = extractor or FeatureExtractor(checkpoint_dir)
+
+    known_hashes = {
+        (record["audio_file"], record["audio_size"], record["audio_mtime"]): record["audio_hash"]
+        for record in store.records.values()
+    }
+
+    start = time.perf_counter()
+    records = []
+    extracted = skipped = 0
+    for number, sample in enumerate(metadata, start=1):
+        audio_file = sample["audio_file"]
+        sample_language = sample.get("language") or language
+        try:
+            stat = os.stat(audio_file)
+            audio_hash = known_hashes.get((audio_file, stat.st_size, stat.st_mtime)) or hash_file(audio_file)
+            key = FeatureStore.make_key(audio_hash, sample["text"], sample_language, extractor.signature)
+            record = store.records.get(key)
+            if record is None:
+                wav = extractor.load_audio(audio_file)
+                features = extractor.extract(wav, sample["text"], sample_language)
+                record = store.append(key, features, {
+                    "audio_file": audio_file,
+                    "audio_size": stat.st_size,
+                    "audio_mtime": stat.st_mtime,
+                    "audio_hash": audio_hash,
+                    "speaker_name": sample.get("speaker_name"),
+                    "language": sample_language,
+                    "text_chars": len(sample["text"]),
+                    "wav_length": len(wav),
+                })
+                extracted += 1
+            records.append(record)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Warning: skipping {audio_file}: {e}")
+            skipped += 1
+        if extracted and extracted % 100 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"  [{number}/{len(metadata)}] {extracted} extracted, {extracted / elapsed:.1f} clips/s")
+    store.close_writer()
+
+    print(f"Features: {len(records)} samples ({extracted} extracted, {len(records) - extracted} reused, "
+          f"{skipped} skipped) in {time.perf_counter() - start:.1f}s -> {store.directory}")
+    dataset = FeatureDataset(store, records, cond_hop=extractor.cond_hop, code_stride=extractor.code_stride)
+    return store, dataset
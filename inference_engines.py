@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Accelerated Inference Engines for XTTS v2
+
+Swaps the two hot loops of synthesis - the GPT decoder and the HiFi-GAN
+vocoder - for optimized implementations:
+
+    eager     plain PyTorch (default)
+    compiled  torch.compile for the GPT decoder and the vocoder
+    onnx      torch.compile for the GPT decoder, vocoder on ONNX Runtime (CPU)
+
+Each component is checked against eager PyTorch right after it is swapped
+in; if compilation, export or the check fails, that component stays eager.
+Compiled kernels and the exported vocoder are cached in an "engines"
+directory next to the model, so later starts skip the expensive work.
+
+Environment Variables:
+    INFERENCE_ENGINE: eager | compiled | onnx (default: eager)
+
+Compare real-time factor and audio similarity against eager:
+    python inference_engines.py --speaker voice_samples/sample.wav
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "eager").lower()
+
+ENGINES = ("eager", "compiled", "onnx")
+
+# Minimum vocoder agreement with eager PyTorch before an engine is trusted
+VOCODER_MIN_SNR_DB = 40.0
+
+# GPT decoding steps compared against eager when verifying a compiled decoder
+GPT_CHECK_STEPS = 8
+
+# Original modules, so engines can be switched back to eager
+_eager_modules = {}
+
+
+class OnnxWaveformDecoder(torch.nn.Module):
+    """
+    HiFi-GAN generator running on ONNX Runtime.
+
+    Drop-in replacement for HifiDecoder.waveform_decoder. The session is
+    created on first use in each process, so it is safe to fork workers
+    after the engine is applied and each one sizes its own thread pool.
+    """
+
+    def __init__(self, model_path: str):
+        super().__init__()
+        self.model_path = model_path
+        self._session = None
+        self._session_pid = None
+
+    def _get_session(self):
+        import onnxruntime as ort
+
+        if self._session is None or self._session_pid != os.getpid():
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = torch.get_num_threads()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._session = ort.InferenceSession(
+                self.model_path, options, providers=["CPUExecutionProvider"]
+            )
+            self._session_pid = os.getpid()
+        return self._session
+
+    def forward(self, z, g=None):
+        # HifiDecoder squeezes the batch dimension away for single items
+        unbatched = z.dim() == 2
+        if unbatched:
+            z = z.unsqueeze(0)
+        wav = self._get_session().run(None, {
+            "z": z.detach().cpu().float().numpy(),
+            "g": g.detach().cpu().float().numpy(),
+        })[0]
+        wav = torch.from_numpy(wav)
+        return wav[0] if unbatched else wav
+
+
+def _artifact_digest(model_id: str) -> str:
+    payload = f"{model_id}:{torch.__version__}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _remember_eager(xtts):
+    _eager_modules.setdefault(id(xtts), {
+        "transformer": xtts.gpt.gpt_inference.transformer,
+        "waveform_decoder": xtts.hifigan_decoder.waveform_decoder,
+    })
+
+
+def restore_eager(xtts):
+    """Put the original PyTorch modules back."""
+    original = _eager_modules.get(id(xtts))
+    if original:
+        xtts.gpt.gpt_inference.transformer = original["transformer"]
+        xtts.hifigan_decoder.waveform_decoder = original["waveform_decoder"]
+
+
+def snr_db(reference, candidate) -> float:
+    """Signal-to-noise ratio of candidate against reference, in dB."""
+    reference = np.asarray(reference, dtype=np.float64).ravel()
+    candidate = np.asarray(candidate, dtype=np.float64).ravel()
+    length = min(len(reference), len(candidate))
+    noise = np.sum((reference[:length] - candidate[:length]) ** 2)
+    if noise == 0:
+        return float("inf")
+    return float(10 * np.log10(np.sum(reference[:length] ** 2) / noise))
+
+
+def spectral_similarity(reference, candidate, n_fft: int = 1024) -> float:
+    """Cosine similarity of the average log-magnitude spectra (1.0 = identical timbre)."""
+    def profile(wav):
+        wav = np.asarray(wav, dtype=np.float64).ravel()
+        frames = [wav[i:i + n_fft] * np.hanning(n_fft) for i in range(0, len(wav) - n_fft, n_fft // 2)]
+        return np.log1p(np.abs(np.fft.rfft(frames, axis=-1))).mean(axis=0)
+
+    a, b = profile(reference), profile(candidate)
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+
+@torch.inference_mode()
+def _greedy_tokens(xtts, steps: int = GPT_CHECK_STEPS):
+    """Decode a few tokens greedily from fixed inputs, for comparing decoders."""
+    gpt = xtts.gpt
+    generator = torch.Generator().manual_seed(0)
+    cond = torch.randn(1, 32, gpt.model_dim, generator=generator).to(xtts.device)
+    tokens = torch.IntTensor(xtts.tokenizer.encode("engine check", lang="en")).unsqueeze(0).to(xtts.device)
+    gpt_inputs = gpt.compute_embeddings(cond, tokens)
+    return gpt.gpt_inference.generate(
+        gpt_inputs,
+        bos_token_id=gpt.start_audio_token,
+        pad_token_id=gpt.stop_audio_token,
+        eos_token_id=gpt.stop_audio_token,
+        max_length=gpt_inputs.shape[-1] + steps,
+        do_sample=False,
+        num_beams=1,
+        num_return_sequences=1,
+    ).cpu()
+
+
+def _vocoder_check_inputs(xtts, waveform_decoder, batch_size: int = 1):
+    generator = torch.Generator().manual_seed(0)
+    channels = waveform_decoder.conv_pre.in_channels
+    z = torch.randn(batch_size, channels, 64, generator=generator).to(xtts.device)
+    g = torch.randn(batch_size, xtts.args.d_vector_dim, 1, generator=generator).to(xtts.device)
+    return z, g
+
+
+def _check_vocoder(xtts, reference_decoder):
+    """Raise if the installed waveform decoder disagrees with the eager one."""
+    z, g = _vocoder_check_inputs(xtts, reference_decoder)
+    with torch.inference_mode():
+        expected = reference_decoder(z, g=g).cpu().numpy()
+        actual = xtts.hifigan_decoder.waveform_decoder(z, g=g).cpu().numpy()
+    if expected.shape != actual.shape:
+        raise RuntimeError(f"vocoder output shape {actual.shape} != {expected.shape}")
+    snr = snr_db(expected, actual)
+    if snr < VOCODER_MIN_SNR_DB:
+        raise RuntimeError(f"vocoder output differs from eager (SNR {snr:.1f} dB)")
+
+
+def _compile_gpt(xtts):
+    gpt_inference = xtts.gpt.gpt_inference
+    expected = _greedy_tokens(xtts)
+    gpt_inference.transformer = torch.compile(gpt_inference.transformer, dynamic=True)
+    # Compilation happens on first call; run it now so failures surface at startup
+    actual = _greedy_tokens(xtts)
+    if not torch.equal(expected, actual):
+        raise RuntimeError("compiled GPT decoder diverged from eager")
+
+
+def _compile_vocoder(xtts):
+    eager = xtts.hifigan_decoder.waveform_decoder
+    xtts.hifigan_decoder.waveform_decoder = torch.compile(eager, dynamic=True)
+    _check_vocoder(xtts, eager)
+
+
+def export_vocoder(xtts, path: Path):
+    """Export the HiFi-GAN generator to ONNX (atomically) with dynamic batch and length."""
+    eager = xtts.hifigan_decoder.waveform_decoder
+    z, g = _vocoder_check_inputs(xtts, eager, batch_size=2)
+    generator = copy.deepcopy(eager).cpu().eval()
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            generator,
+            (z.cpu(), g.cpu()),
+            str(tmp_path),
+            input_names=["z", "g"],
+            output_names=["wav"],
+            dynamic_axes={"z": {0: "batch", 2: "frames"}, "g": {0: "batch"}, "wav": {0: "batch", 2: "samples"}},
+            opset_version=17,
+        )
+    os.replace(tmp_path, path)
+
+
+def _onnx_vocoder(xtts, cache_dir: Path, model_id: str):
+    if xtts.device.type != "cpu":
+        raise RuntimeError("the ONNX vocoder runs on CPU only")
+    import onnxruntime  # noqa: F401  (fail early when the optional dependency is missing)
+
+    path = cache_dir / f"hifigan-{_artifact_digest(model_id)}.onnx"
+    if path.exists():
+        print(f"  Using cached ONNX vocoder: {path}")
+    else:
+        print(f"  Exporting HiFi-GAN vocoder to ONNX: {path}")
+        export_vocoder(xtts, path)
+
+    eager = xtts.hifigan_decoder.waveform_decoder
+    xtts.hifigan_decoder.waveform_decoder = OnnxWaveformDecoder(str(path))
+    _check_vocoder(xtts, eager)
+
+
+def _configure_compile_cache(cache_dir: Path):
+    # Persist inductor kernels and FX graphs so restarts skip most compilation
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir / "inductor"))
+    import torch._inductor.config as inductor_config
+    inductor_config.fx_graph_cache = True
+
+
+def apply_engine(xtts, engine: str, cache_dir, model_id: str) -> dict:
+    """
+    Install the requested engine on an Xtts model.
+
+    Returns the backend actually in use for each component, e.g.
+    {"gpt": "compiled", "vocoder": "eager"} when the vocoder fell back.
+    """
+    active = {"gpt": "eager", "vocoder": "eager"}
+    if engine not in ENGINES:
+        print(f"Warning: unknown INFERENCE_ENGINE {engine!r}, using eager")
+        return active
+    if engine == "eager":
+        return active
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _configure_compile_cache(cache_dir)
+    _remember_eager(xtts)
+    restore_eager(xtts)
+    original = _eager_modules[id(xtts)]
+    print(f"Applying {engine} inference engine (artifacts in {cache_dir})...")
+
+    steps = [("gpt", "compiled", _compile_gpt, "transformer")]
+    if engine == "compiled":
+        steps.append(("vocoder", "compiled", _compile_vocoder, "waveform_decoder"))
+    else:
+        steps.append(("vocoder", "onnx", lambda m: _onnx_vocoder(m, cache_dir, model_id), "waveform_decoder"))
+
+    for component, backend, apply, module_name in steps:
+        start = time.perf_counter()
+        try:
+            apply(xtts)
+        except Exception as e:
+            print(f"  Warning: {backend} {component} unavailable, falling back to eager: {e}")
+            if module_name == "transformer":
+                xtts.gpt.gpt_inference.transformer = original["transformer"]
+            else:
+                xtts.hifigan_decoder.waveform_decoder = original["waveform_decoder"]
+            continue
+        active[component] = backend
+        print(f"  {component}: {backend} ({time.perf_counter() - start:.1f}s)")
+
+    return active
+
+
+def _synthesize(xtts, text, language, gpt_cond_latent, speaker_embedding, seed: int = 0):
+    config = xtts.config
+    torch.manual_seed(seed)
+    with torch.inference_mode():
+        return xtts.inference(
+            text,
+            language,
+            gpt_cond_latent,
+            speaker_embedding,
+            temperature=config.temperature,
+            length_penalty=config.length_penalty,
+            repetition_penalty=config.repetition_penalty,
+            top_k=config.top_k,
+            top_p=config.top_p,
+        )
+
+
+def compare_engines(loader, speaker_wav, text: str, language: str = "en",
+                    engines=ENGINES, runs: int = 3) -> list:
+    """
+    Measure real-time factor per engine and compare its audio with eager.
+
+    vocoder_snr_db decodes the same GPT latents with eager and the engine's
+    vocoder (deterministic, should be very high). spectral_similarity
+    compares the full seeded synthesis with eager's.
+    """
+    from model_loader import OUTPUT_SAMPLE_RATE
+
+    xtts = loader.get_xtts_model()
+    gpt_cond_latent, speaker_embedding = loader.get_conditioning_latents(speaker_wav)
+    restore_eager(xtts)
+
+    reference = _synthesize(xtts, text, language, gpt_cond_latent, speaker_embedding)
+    gpt_latents = torch.from_numpy(reference["gpt_latents"]).to(xtts.device)
+    speaker_embedding = speaker_embedding.to(xtts.device)
+    with torch.inference_mode():
+        reference_vocoded = xtts.hifigan_decoder(gpt_latents, g=speaker_embedding).cpu().numpy()
+
+    results = []
+    for engine in engines:
+        restore_eager(xtts)
+        active = apply_engine(xtts, engine, loader.get_engine_cache_dir(), loader.get_model_id())
+        # Warm up so compilation is not counted
+        _synthesize(xtts, text, language, gpt_cond_latent, speaker_embedding)
+
+        rtfs = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            out = _synthesize(xtts, text, language, gpt_cond_latent, speaker_embedding)
+            elapsed = time.perf_counter() - start
+            rtfs.append(elapsed / (len(out["wav"]) / OUTPUT_SAMPLE_RATE))
+
+        with torch.inference_mode():
+            vocoded = xtts.hifigan_decoder(gpt_latents, g=speaker_embedding).cpu().numpy()
+
+        results.append({
+            "engine": engine,
+            "active": active,
+            "rtf": round(float(np.median(rtfs)), 4),
+            "vocoder_snr_db": round(snr_db(reference_vocoded, vocoded), 1),
+            "spectral_similarity": round(spectral_similarity(reference["wav"], out["wav"]), 4),
+        })
+
+    restore_eager(xtts)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare XTTS inference engines: real-time factor and similarity to eager"
+    )
+    parser.add_argument(
+        "--speaker", "-s",
+        required=True,
+        nargs="+",
+        help="Path(s) to speaker audio file(s) used for conditioning"
+    )
+    parser.add_argument(
+        "--text", "-t",
+        default="The quick brown fox jumps over the lazy dog, and then it takes a well deserved nap.",
+        help="Text to synthesize"
+    )
+    parser.add_argument(
+        "--language", "-l",
+        default="en",
+        help="Language code (default: en)"
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=ENGINES,
+        default=list(ENGINES),
+        help="Engines to compare (default: all)"
+    )
+    parser.add_argument(
+        "--runs", "-n",
+        type=int,
+        default=3,
+        help="Timed runs per engine (default: 3)"
+    )
+    parser.add_argument(
+        "--json",
+        help="Also write results to this JSON file"
+    )
+    args = parser.parse_args()
+
+    # Load eagerly; engines are applied one at a time below
+    os.environ["INFERENCE_ENGINE"] = "eager"
+    from model_loader import get_model_loader
+
+    loader = get_model_loader()
+    results = compare_engines(
+        loader, args.speaker, args.text,
+        language=args.language, engines=args.engines, runs=args.runs,
+    )
+
+    print(f"{'engine':>9}  {'gpt':>9}  {'vocoder':>9}  {'RTF':>7}  {'voc SNR':>8}  {'similarity':>10}")
+    for r in results:
+        print(f"{r['engine']:>9}  {r['active']['gpt']:>9}  {r['active']['vocoder']:>9}  {r['rtf']:>7}  "
+              f"{r['vocoder_snr_db']:>8}  {r['spectral_similarity']:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Synthesis Jobs
+
+Runs synthesis requests on a bounded worker pool and tracks their progress,
+so HTTP handlers can return a job ID immediately instead of holding a
+request open for the whole synthesis.
+
+Environment Variables:
+    JOB_WORKERS: Number of jobs synthesized concurrently (default: 1)
+    JOB_QUEUE_SIZE: Maximum number of unfinished jobs before new submissions are rejected (default: 32)
+    JOB_RETENTION_SECONDS: How long finished jobs stay queryable (default: 3600)
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "32"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work."""
+
+
+class Job:
+    """State of a single synthesis job. Updates notify waiting listeners."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.status = QUEUED
+        self.completed = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def progress(self, completed: int, total: int):
+        """Progress callback handed to the synthesis function."""
+        self.update(completed=completed, total=total)
+
+    def wait_for_change(self, version: int, timeout: float) -> int:
+        """Block until the job changes past `version` (or timeout); return the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "completed": self.completed,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Bounded pool of synthesis workers with job tracking."""
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE,
+                 retention_seconds: int = JOB_RETENTION_SECONDS):
+        self.queue_size = queue_size
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="synthesis")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, **kwargs) -> Job:
+        """
+        Queue fn(progress_callback=..., **kwargs) and return its Job.
+
+        The return value of fn becomes the job result. Raises QueueFullError
+        when queue_size jobs are already waiting or running.
+        """
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.queue_size:
+                raise QueueFullError(f"Too many pending jobs ({pending}), try again later")
+            job = Job()
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, fn, kwargs)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == QUEUED)
+
+    def _run(self, job: Job, fn, kwargs):
+        job.update(status=RUNNING)
+        try:
+            result = fn(progress_callback=job.progress, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            job.update(status=FAILED, error=str(e), finished_at=time.time())
+        else:
+            job.update(status=DONE, result=result, finished_at=time.time())
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Singleton instance
+_job_manager = None
+
+
+def get_job_manager():
+    """Get the global job manager instance."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Runtime Metrics
+
+Lightweight counters, gauges and histograms exposed in Prometheus text
+format at /metrics. Recording a value is a lock and a few additions, so the
+instrumentation can stay on in production.
+
+Pipeline stages recorded in xtts_stage_seconds:
+    upload       receiving and parsing the request body (and saving uploads)
+    decode       decoding an uploaded reference clip in memory
+    preprocess   trimming, normalizing and cropping reference clips (cache misses only)
+    conditioning computing speaker latents (cache misses only)
+    gpt_decode   autoregressive GPT decoding of audio tokens
+    gpt_latents  GPT forward pass producing the vocoder input
+    vocoder      HiFi-GAN waveform generation
+    write        crossfading and writing the output WAV
+
+Environment Variables:
+    METRICS_ENABLED: Set to 0 to disable instrumentation and /metrics (default: 1)
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# In forked inference workers, observations are buffered here and sent to
+# the parent process, which owns /metrics
+_forward_buffer = None
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type_name = None
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _forward(self, value, labels):
+        if _forward_buffer is not None:
+            _forward_buffer.append((self.name, labels, value))
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def _render_sample(self, labels, value) -> list:
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+        self._forward(amount, labels)
+
+    def replay(self, labels, amount):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        # callback() -> {label tuple: value}, evaluated at scrape time
+        self.callback = callback
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels):
+        self.inc(-amount, *labels)
+
+    def render(self) -> list:
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception as e:
+                print(f"Warning: metrics callback for {self.name} failed: {e}")
+                values = {}
+            with self._lock:
+                self._values = dict(values)
+        return super().render()
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        self.replay(labels, value)
+        self._forward(value, labels)
+
+    def replay(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _render_sample(self, labels, state) -> list:
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = _format_labels(self.label_names, labels, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        base = _format_labels(self.label_names, labels)
+        lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+        lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "xtts_stage_seconds", "Time spent per synthesis pipeline stage", labels=("stage",)
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "xtts_request_seconds", "HTTP request handling time", labels=("endpoint",)
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "xtts_requests_total", "HTTP requests handled", labels=("endpoint", "status")
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "xtts_requests_in_flight", "HTTP requests currently being handled", labels=("endpoint",)
+))
+AUDIO_SECONDS = REGISTRY.register(Counter(
+    "xtts_audio_seconds_total", "Seconds of audio produced", labels=("source",)
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    "xtts_model_load_seconds", "Time taken to load the model (including engine setup)"
+))
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block of code as a pipeline stage."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    with STAGE_SECONDS.time(name):
+        yield
+
+
+def observe_stage(name: str, seconds: float):
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, name)
+
+
+def add_audio_seconds(seconds: float, source: str = "synthesized"):
+    if METRICS_ENABLED:
+        AUDIO_SECONDS.inc(seconds, source)
+
+
+def register_gauge(name: str, help_text: str, callback, labels=()):
+    """Add a gauge whose values are computed by callback() at scrape time."""
+    return REGISTRY.register(Gauge(name, help_text, labels=labels, callback=callback))
+
+
+def _timing_hooks(module, stage_name: str):
+    local = threading.local()
+
+    def before(mod, args):
+        local.start = time.perf_counter()
+
+    def after(mod, args, output):
+        start = getattr(local, "start", None)
+        if start is not None:
+            observe_stage(stage_name, time.perf_counter() - start)
+            local.start = None
+
+    module.register_forward_pre_hook(before)
+    module.register_forward_hook(after)
+
+
+def _timed_method(owner, method_name: str, stage_name: str):
+    method = getattr(owner, method_name)
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            observe_stage(stage_name, time.perf_counter() - start)
+
+    setattr(owner, method_name, timed)
+
+
+def instrument_model(xtts):
+    """
+    Attach stage timers to an Xtts model.
+
+    Forward hooks time the GPT latent pass and the vocoder; GPT decoding is
+    timed around generate(). Modules a model does not have are skipped.
+    """
+    if not METRICS_ENABLED:
+        return
+    gpt = getattr(xtts, "gpt", None)
+    if gpt is not None:
+        _timing_hooks(gpt, "gpt_latents")
+        if hasattr(gpt, "gpt_inference"):
+            _timed_method(gpt.gpt_inference, "generate", "gpt_decode")
+    decoder = getattr(xtts, "hifigan_decoder", None)
+    if decoder is not None:
+        _timing_hooks(decoder, "vocoder")
+
+
+def start_forwarding():
+    """Buffer observations in this (worker) process for the parent to replay."""
+    global _forward_buffer
+    _forward_buffer = []
+
+
+def drain_forwarded() -> list:
+    global _forward_buffer
+    records, _forward_buffer = _forward_buffer, []
+    return records
+
+
+def replay(records: list):
+    """Apply observations recorded in a worker process."""
+    for name, labels, value in records:
+        metric = REGISTRY.get(name)
+        if metric is not None:
+            metric.replay(labels, value)
+
+
+def render() -> str:
+    return REGISTRY.render()
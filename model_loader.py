@@ -8,17 +8,66 @@ based on environment variables.
 Environment Variables:
     CUSTOM_MODEL_PATH: Path to custom model checkpoint directory
     CUSTOM_CONFIG_PATH: Path to custom model config.json file
+    LATENT_CACHE_DIR: Directory for cached speaker conditioning latents (default: cache/latents)
+    LATENT_CACHE_SIZE: Number of conditioning latents kept in memory (default: 64)
+    BATCH_MAX_SIZE / BATCH_MAX_WAIT_MS: Micro-batching window, see batching.py
+    STREAM_CHUNK_SIZE: GPT tokens decoded per streamed audio chunk (default: 20)
+    STREAM_MIN_CLAUSE_CHARS: Shortest unit cut at a comma/semicolon when text arrives incrementally (default: 30)
+    PIPELINE_DEPTH: Synthesized segments buffered ahead of the writer (default: 2)
+    SEGMENT_RETRIES: Retries for a failed text segment before giving up (default: 2)
+    CROSSFADE_MS: Crossfade between consecutive segments (default: 20)
+    PARAGRAPH_PAUSE_MS: Silence inserted between paragraphs (default: 400)
+    SENTENCE_PAUSE_MS: Silence after each trimmed sentence (default: 200)
+    RESULT_CACHE_*: Synthesis result cache settings, see result_cache.py
+    WORKER_PROCESSES / WORKER_THREADS: Forked inference workers, see worker_pool.py
+    INFERENCE_ENGINE: eager | compiled | onnx, see inference_engines.py (default: eager)
+    METRICS_ENABLED: Stage timing and /metrics, see metrics.py (default: 1)
+    MODELS_DIR / MODEL_MEMORY_BUDGET_MB: Additional named models, see model_registry.py
+    PREPROCESS_*: Reference audio preprocessing, see audio_preprocessing.py
+    SEGMENT_CACHE_*: Per-sentence audio cache, see segment_cache.py
+    MODEL_DOWNLOAD: Set to 0 to leave the public model download to Coqui TTS (default: 1)
+    DOWNLOAD_*: Parallel model download settings, see download_model_configs.py
+    ADMISSION_* / DEADLINE_*: Request admission control for the web server, see admission.py
 
 If these are not set, the default public XTTS v2 model will be used.
 """
 
+import gc
+import hashlib
 import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from pathlib import Path
 
 import torch
 from TTS.api import TTS
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
+from TTS.utils.generic_utils import get_user_data_dir
+
+import metrics
+from audio_preprocessing import PREPROCESS_ENABLED, frame_levels, get_preprocessor, settings_signature, voiced_frames
+from inference_engines import INFERENCE_ENGINE, apply_engine
+from result_cache import RESULT_CACHE_ENABLED, ResultCache
+from segment_cache import SEGMENT_CACHE_ENABLED, SegmentCache
+
+PUBLIC_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+OUTPUT_SAMPLE_RATE = 24000
+
+LATENT_CACHE_DIR = os.getenv("LATENT_CACHE_DIR", "cache/latents")
+LATENT_CACHE_SIZE = int(os.getenv("LATENT_CACHE_SIZE", "64"))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "20"))
+STREAM_MIN_CLAUSE_CHARS = int(os.getenv("STREAM_MIN_CLAUSE_CHARS", "30"))
+PIPELINE_DEPTH = int(os.getenv("PIPELINE_DEPTH", "2"))
+SEGMENT_RETRIES = int(os.getenv("SEGMENT_RETRIES", "2"))
+CROSSFADE_MS = float(os.getenv("CROSSFADE_MS", "20"))
+PARAGRAPH_PAUSE_MS = float(os.getenv("PARAGRAPH_PAUSE_MS", "400"))
+SENTENCE_PAUSE_MS = float(os.getenv("SENTENCE_PAUSE_MS", "200"))
+MODEL_DOWNLOAD = os.getenv("MODEL_DOWNLOAD", "1") != "0"
 
 
 def get_device():
@@ -30,43 +79,500 @@ def get_device():
     return "cpu"
 
 
+# Sentence ends: Latin/Arabic punctuation followed by whitespace, or
+# full-width CJK punctuation (which is not followed by a space)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…؟])\s+|(?<=[。！？])\s*")
+_CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:、，；])\s*")
+# In streamed text, Latin clause marks only count once whitespace follows ("3,5", "10:30")
+_STREAM_CLAUSE_BOUNDARY = re.compile(r"(?<=[,;:])\s+|(?<=[、，；])\s*")
+_PARAGRAPH_BOUNDARY = re.compile(r"\n\s*\n")
+
+# Words that end with a period without ending the sentence, per language
+_ABBREVIATIONS = {
+    "en": {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "no", "fig", "approx"},
+    "de": {"dr", "prof", "nr", "ca", "bzw", "usw", "z.b", "d.h", "vgl", "hr", "fr"},
+    "fr": {"m", "mme", "mlle", "dr", "prof", "etc", "p.ex", "cf"},
+    "es": {"sr", "sra", "srta", "dr", "dra", "etc", "ud", "uds", "pág"},
+    "it": {"sig", "sigg", "dott", "prof", "ecc", "pag"},
+    "pt": {"sr", "sra", "dr", "dra", "etc", "pág"},
+    "nl": {"dhr", "mevr", "dr", "bijv", "enz", "ca"},
+    "pl": {"dr", "prof", "np", "itd", "itp", "ul"},
+    "cs": {"dr", "prof", "např", "atd", "tj"},
+    "ru": {"г", "гг", "т.е", "т.д", "т.п", "им", "др"},
+    "tr": {"dr", "prof", "vb", "vs"},
+    "hu": {"dr", "prof", "stb", "pl", "ún"},
+}
+
+
+# Short sentence per language used to warm the model up at startup
+WARMUP_TEXTS = {
+    "en": "Hello, this is a warm-up sentence.",
+    "es": "Hola, esta es una frase de calentamiento.",
+    "fr": "Bonjour, ceci est une phrase d'échauffement.",
+    "de": "Hallo, dies ist ein Aufwärmsatz.",
+    "it": "Ciao, questa è una frase di riscaldamento.",
+    "pt": "Olá, esta é uma frase de aquecimento.",
+    "pl": "Cześć, to jest zdanie na rozgrzewkę.",
+    "tr": "Merhaba, bu bir ısınma cümlesidir.",
+    "ru": "Привет, это фраза для разогрева.",
+    "nl": "Hallo, dit is een opwarmzin.",
+    "cs": "Ahoj, toto je zahřívací věta.",
+    "ar": "مرحبا، هذه جملة للإحماء.",
+    "zh": "你好，这是一个预热句子。",
+    "ja": "こんにちは、これはウォームアップの文です。",
+    "hu": "Helló, ez egy bemelegítő mondat.",
+    "ko": "안녕하세요, 이것은 준비 문장입니다.",
+}
+
+
+def _ends_with_abbreviation(piece: str, abbreviations: set) -> bool:
+    if not piece.endswith("."):
+        return False
+    last_word = piece.rsplit(None, 1)[-1][:-1].lower()
+    # Single letters are initials ("J. R. Smith")
+    return last_word in abbreviations or (len(last_word) == 1 and last_word.isalpha())
+
+
+def split_sentences(text: str, language: str = "en", max_chars: int = 250) -> list:
+    """
+    Split text into sentences no longer than max_chars.
+
+    Periods after known abbreviations and initials for the language do not
+    end a sentence. Sentences that are still too long are split at clause
+    punctuation, then at whitespace, so every piece fits the model's
+    per-call text limit.
+    """
+    abbreviations = _ABBREVIATIONS.get(language.split("-")[0], set())
+
+    pieces = []
+    for piece in _SENTENCE_BOUNDARY.split(text.strip()):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if pieces and _ends_with_abbreviation(pieces[-1], abbreviations):
+            pieces[-1] = f"{pieces[-1]} {piece}"
+        else:
+            pieces.append(piece)
+
+    sentences = []
+    for sentence in pieces:
+        if len(sentence) <= max_chars:
+            sentences.append(sentence)
+        else:
+            sentences.extend(_split_long_sentence(sentence, max_chars))
+    return sentences
+
+
+def _split_long_sentence(sentence: str, max_chars: int) -> list:
+    pieces = []
+    current = ""
+    for part in _CLAUSE_BOUNDARY.split(sentence):
+        for word in (part.split(" ") if len(part) > max_chars else [part]):
+            if len(word) > max_chars:
+                # Unbroken runs (e.g. CJK text without punctuation) are hard-cut,
+                # after whatever precedes them
+                if current:
+                    pieces.append(current)
+                    current = ""
+                while len(word) > max_chars:
+                    pieces.append(word[:max_chars])
+                    word = word[max_chars:]
+            candidate = f"{current} {word}".strip() if current else word
+            if len(candidate) > max_chars:
+                pieces.append(current)
+                candidate = word
+            current = candidate
+    if current.strip():
+        pieces.append(current.strip())
+    return [p.strip() for p in pieces if p.strip()]
+
+
+def segment_text(text: str, language: str = "en", max_chars: int = 250) -> list:
+    """
+    Split text into synthesis segments.
+
+    Returns a list of (sentence, paragraph_end) tuples, where paragraph_end
+    marks the last sentence of a paragraph (blank-line separated).
+    """
+    segments = []
+    for paragraph in _PARAGRAPH_BOUNDARY.split(text):
+        sentences = split_sentences(paragraph, language=language, max_chars=max_chars)
+        segments.extend((sentence, i == len(sentences) - 1) for i, sentence in enumerate(sentences))
+    return segments
+
+
+class IncrementalSegmenter:
+    """
+    Turns text that arrives in fragments (e.g. LLM tokens) into synthesis units.
+
+    feed() returns the units completed so far: text up to a sentence or
+    paragraph end, or up to clause punctuation once the unit is at least
+    min_clause_chars long, so the first audio can start before the
+    sentence is finished. Sentence and clause ends only count once the
+    following whitespace has arrived, so "3.5", "10:30" and abbreviations
+    are not cut. Text longer than max_chars is split like split_sentences
+    does. flush() returns whatever is left.
+    """
+
+    def __init__(self, language: str = "en", max_chars: int = 250, min_clause_chars: int = STREAM_MIN_CLAUSE_CHARS):
+        self.language = language
+        self.max_chars = max_chars
+        self.min_clause_chars = min_clause_chars
+        self._abbreviations = _ABBREVIATIONS.get(language.split("-")[0], set())
+        self._buffer = ""
+
+    def feed(self, fragment: str) -> list:
+        self._buffer += fragment
+        units = []
+        while True:
+            end = self._next_boundary()
+            if end is None:
+                break
+            unit, self._buffer = self._buffer[:end].strip(), self._buffer[end:]
+            if len(unit) > self.max_chars:
+                units.extend(_split_long_sentence(unit, self.max_chars))
+            elif unit:
+                units.append(unit)
+        if len(self._buffer) > self.max_chars:
+            # The last piece may be cut mid-word, so it stays buffered (with any trailing space)
+            trailing = self._buffer[len(self._buffer.rstrip()):]
+            pieces = _split_long_sentence(self._buffer.strip(), self.max_chars)
+            units.extend(pieces[:-1])
+            self._buffer = pieces[-1] + trailing if pieces else ""
+        return units
+
+    def flush(self) -> list:
+        rest, self._buffer = self._buffer, ""
+        return split_sentences(rest, language=self.language, max_chars=self.max_chars) if rest.strip() else []
+
+    def _next_boundary(self):
+        """End offset of the first complete unit in the buffer, or None."""
+        text = self._buffer
+        ends = []
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            if not _ends_with_abbreviation(text[:match.start()].rstrip(), self._abbreviations):
+                ends.append(match.end())
+                break
+        match = _PARAGRAPH_BOUNDARY.search(text)
+        if match:
+            ends.append(match.end())
+        for match in _STREAM_CLAUSE_BOUNDARY.finditer(text):
+            if len(text[:match.start()].strip()) >= self.min_clause_chars:
+                ends.append(match.end())
+                break
+        return min(ends) if ends else None
+
+
+def _is_path(target) -> bool:
+    return isinstance(target, (str, os.PathLike))
+
+
+def _link_or_copy(source: str, destination: str):
+    """Hard-link source to destination (no extra disk space), copying across filesystems."""
+    import shutil
+
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class CrossfadeWriter:
+    """
+    Joins consecutive audio segments with short crossfades.
+
+    Each segment's last `crossfade` samples are held back and blended with
+    the start of the next one, so only that tail is ever kept in memory;
+    everything else goes straight to `sink` (e.g. SoundFile.write).
+    """
+
+    def __init__(self, sink, sample_rate: int = OUTPUT_SAMPLE_RATE,
+                 crossfade_ms: float = CROSSFADE_MS, pause_ms: float = PARAGRAPH_PAUSE_MS):
+        import numpy as np
+
+        self._np = np
+        self.sink = sink
+        self.crossfade = int(sample_rate * crossfade_ms / 1000)
+        self.pause = np.zeros(int(sample_rate * pause_ms / 1000), dtype=np.float32)
+        self._tail = None
+
+    def write(self, wav, pause_after: bool = False):
+        np = self._np
+        wav = np.asarray(wav, dtype=np.float32)
+
+        if self._tail is not None and len(self._tail):
+            overlap = min(len(self._tail), len(wav))
+            if overlap:
+                fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+                head = self._tail[len(self._tail) - overlap:] * (1.0 - fade_in) + wav[:overlap] * fade_in
+                wav = np.concatenate([self._tail[:len(self._tail) - overlap], head, wav[overlap:]])
+            else:
+                wav = np.concatenate([self._tail, wav])
+
+        if pause_after:
+            self.sink(np.concatenate([wav, self.pause]))
+            self._tail = None
+            return
+
+        split = max(len(wav) - self.crossfade, 0)
+        self.sink(wav[:split])
+        self._tail = wav[split:]
+
+    def close(self):
+        if self._tail is not None and len(self._tail):
+            self.sink(self._tail)
+        self._tail = None
+
+
+def trim_segment(wav, sample_rate: int = OUTPUT_SAMPLE_RATE, pause_ms: float = SENTENCE_PAUSE_MS):
+    """
+    Trim a sentence's leading and trailing silence and append a fixed pause.
+
+    XTTS ends each sentence with a variable amount of silence; normalizing
+    it keeps the rhythm even whether a sentence was just synthesized or
+    came from the segment cache.
+    """
+    import numpy as np
+
+    wav = np.asarray(wav, dtype=np.float32)
+    frame = sample_rate // 100
+    voiced = np.flatnonzero(voiced_frames(frame_levels(wav, frame)))
+    if len(voiced):
+        # Keep one frame either side so onsets and decays are not cut
+        wav = wav[max(0, voiced[0] - 1) * frame: (voiced[-1] + 2) * frame]
+    return np.concatenate([wav, np.zeros(int(sample_rate * pause_ms / 1000), dtype=np.float32)])
+
+
+class InMemoryAudio:
+    """
+    Reference audio decoded straight from an upload, never written to disk.
+
+    content_hash matches hash_audio_files() for a file with the same bytes,
+    so cached latents are shared between in-memory and on-disk requests.
+    """
+
+    def __init__(self, samples, sample_rate: int, content_hash: str):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.content_hash = content_hash
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Decode encoded audio (WAV, FLAC, OGG, MP3) into a mono float32 buffer."""
+        import io
+
+        import numpy as np
+        import soundfile as sf
+
+        content_hash = hashlib.sha256(data + b"\0").hexdigest()
+        try:
+            samples, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+        except Exception as e:
+            raise ValueError(f"Could not decode audio: {e}") from e
+        return cls(np.ascontiguousarray(samples.mean(axis=1)), sample_rate, content_hash)
+
+
+def get_public_model_dir() -> Path:
+    """Directory the public XTTS v2 model is downloaded to."""
+    return get_user_data_dir("tts") / PUBLIC_MODEL_NAME.replace("/", "--")
+
+
+def hash_audio_files(paths) -> str:
+    """Return a SHA-256 digest of the bytes of one or more reference audio files."""
+    if not isinstance(paths, (list, tuple)):
+        paths = [paths]
+    if len(paths) == 1 and isinstance(paths[0], InMemoryAudio):
+        return paths[0].content_hash
+
+    digest = hashlib.sha256()
+    for path in paths:
+        if isinstance(path, InMemoryAudio):
+            digest.update(path.content_hash.encode("ascii"))
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        # Separate files so that [a, b] and [ab] never collide
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ConditioningLatentCache:
+    """
+    Two-tier cache of XTTS speaker conditioning latents.
+
+    Entries are keyed by the reference audio content hash plus the model
+    identity. The memory tier is a bounded LRU; the disk tier stores one
+    torch file per entry and survives restarts.
+    """
+
+    def __init__(self, cache_dir: str = LATENT_CACHE_DIR, max_entries: int = LATENT_CACHE_SIZE):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.conditioning_seconds = 0.0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def make_key(audio_hash: str, model_id: str) -> str:
+        return hashlib.sha256(f"{model_id}\0{audio_hash}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pt"
+
+    def get(self, key: str):
+        """Return (gpt_cond_latent, speaker_embedding) or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                self.seconds_saved += entry["compute_seconds"]
+                return entry["gpt_cond_latent"], entry["speaker_embedding"]
+
+        path = self._path(key)
+        if path.exists():
+            try:
+                entry = torch.load(path, map_location="cpu", weights_only=True)
+            except Exception as e:
+                print(f"Warning: discarding unreadable latent cache entry {path}: {e}")
+                path.unlink(missing_ok=True)
+            else:
+                with self._lock:
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+                    self.seconds_saved += entry["compute_seconds"]
+                return entry["gpt_cond_latent"], entry["speaker_embedding"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, gpt_cond_latent, speaker_embedding, compute_seconds: float):
+        """Store freshly computed latents in both tiers."""
+        entry = {
+            "gpt_cond_latent": gpt_cond_latent.detach().cpu(),
+            "speaker_embedding": speaker_embedding.detach().cpu(),
+            "compute_seconds": float(compute_seconds),
+        }
+        with self._lock:
+            self._remember(key, entry)
+            self.conditioning_seconds += compute_seconds
+
+        # Write atomically so a crash never leaves a truncated entry behind
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            torch.save(entry, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not persist latent cache entry {path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries_in_memory": len(self._entries),
+                "conditioning_seconds": round(self.conditioning_seconds, 3),
+                "conditioning_seconds_saved": round(self.seconds_saved, 3),
+            }
+
+
 class XTTSModelLoader:
     """Loads and manages XTTS models (public or custom)."""
 
-    def __init__(self):
+    def __init__(self, checkpoint_dir: str = None, config_path: str = None,
+                 latent_cache=None, result_cache=None, segment_cache=None):
+        """
+        checkpoint_dir/config_path default to CUSTOM_MODEL_PATH and
+        CUSTOM_CONFIG_PATH. Loaders for several models can share their
+        caches, since all of them key their entries by model identity.
+        """
         self.model = None
         self.device = get_device()
-        self.is_custom_model = False
+        self.checkpoint_dir = checkpoint_dir or os.getenv("CUSTOM_MODEL_PATH")
+        self.config_path = config_path or os.getenv("CUSTOM_CONFIG_PATH")
+        self.latent_cache = latent_cache or ConditioningLatentCache()
+        if result_cache is None and RESULT_CACHE_ENABLED:
+            result_cache = ResultCache()
+        self.result_cache = result_cache
+        if segment_cache is None and SEGMENT_CACHE_ENABLED:
+            segment_cache = SegmentCache(sample_rate=OUTPUT_SAMPLE_RATE)
+        self.segment_cache = segment_cache
+        self.batcher = None
+        self.worker_pool = None
+        self.engine = {"gpt": "eager", "vocoder": "eager"}
+        # Size and mtime of model.pth for the weights in memory, see get_model_id
+        self.checkpoint_stamp = None
+        self.active_requests = 0
+        self._active_lock = threading.Lock()
+
+    @property
+    def is_custom_model(self) -> bool:
+        """
+        Whether this loader serves a custom checkpoint.
+
+        Follows from the configuration rather than the loaded model, so cache
+        keys built before the model loads already name the right weights.
+        """
+        return bool(self.checkpoint_dir and self.config_path)
 
     def load_model(self):
         """Load the appropriate model based on environment configuration."""
         if self.model is not None:
             return self.model
 
-        custom_model_path = os.getenv("CUSTOM_MODEL_PATH")
-        custom_config_path = os.getenv("CUSTOM_CONFIG_PATH")
-
+        start = time.perf_counter()
         try:
-            if custom_model_path and custom_config_path:
-                self.model = self._load_custom_model(custom_model_path, custom_config_path)
-                self.is_custom_model = True
+            if self.is_custom_model:
+                # Stamp the file before reading it, so a later overwrite cannot relabel these weights
+                self.checkpoint_stamp = self._read_checkpoint_stamp()
+                self.model = self._load_custom_model(self.checkpoint_dir, self.config_path)
             else:
                 self.model = self._load_public_model()
-                self.is_custom_model = False
         except Exception as e:
             print(f"ERROR loading model: {e}")
             import traceback
             traceback.print_exc()
             raise
 
+        self.engine = apply_engine(
+            self.get_xtts_model(), INFERENCE_ENGINE, self.get_engine_cache_dir(), self.get_model_id()
+        )
+        metrics.instrument_model(self.get_xtts_model())
+        metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - start)
         return self.model
 
     def _load_public_model(self):
         """Load the public XTTS v2 model."""
         print(f"Loading public XTTS v2 model on {self.device}...")
+        if MODEL_DOWNLOAD:
+            from download_model_configs import ensure_model_files
+
+            # Parallel, resumable and verified; on failure Coqui TTS downloads as before
+            ensure_model_files(get_public_model_dir())
         print("Initializing TTS model...")
         try:
-            tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
+            tts = TTS(PUBLIC_MODEL_NAME)
             print("TTS model initialized, moving to device...")
             tts = tts.to(self.device)
             print("Public model loaded successfully!")
@@ -101,50 +607,478 @@ class XTTSModelLoader:
         print("Custom model loaded successfully!")
         return model
 
-    def tts_to_file(self, text: str, file_path: str, speaker_wav, language: str = "en"):
+    def get_xtts_model(self):
+        """Return the underlying Xtts model for both public and custom loads."""
+        model = self.load_model()
+        # The public TTS API wraps the Xtts model in a synthesizer
+        if hasattr(model, "synthesizer"):
+            return model.synthesizer.tts_model
+        return model
+
+    def get_engine_cache_dir(self) -> Path:
+        """Directory next to the model where compiled/exported engine artifacts are cached."""
+        if self.is_custom_model:
+            return Path(self.checkpoint_dir) / "engines"
+        return get_public_model_dir() / "engines"
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the loaded model's parameters and buffers (0 if not loaded)."""
+        if self.model is None:
+            return 0
+        xtts = self.get_xtts_model()
+        tensors = list(xtts.parameters()) + list(xtts.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def acquire(self):
+        """Mark the model busy until release() (see model_registry.py)."""
+        with self._active_lock:
+            self.active_requests += 1
+
+    def release(self):
+        with self._active_lock:
+            self.active_requests -= 1
+
+    @contextmanager
+    def in_use(self):
+        """Mark the model busy for the duration of a request."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def unload(self):
+        """Release the model, its batching thread and any worker processes."""
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+            self.worker_pool = None
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+        self.model = None
+        self.checkpoint_stamp = None
+        gc.collect()
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+
+    def get_batcher(self):
+        """Return the micro-batching scheduler, or None when batching is disabled."""
+        from batching import BATCH_MAX_SIZE, BatchScheduler
+
+        if self.batcher is None and BATCH_MAX_SIZE > 1:
+            self.batcher = BatchScheduler(self.get_xtts_model())
+        return self.batcher
+
+    def _read_checkpoint_stamp(self) -> str:
+        checkpoint = Path(self.checkpoint_dir) / "model.pth"
+        if not checkpoint.exists():
+            return ""
+        stat = checkpoint.stat()
+        return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+    def get_model_id(self) -> str:
+        """
+        Return a string identifying the loaded weights (device independent).
+
+        Custom checkpoints are told apart by the size and mtime of model.pth
+        as it was when the model loaded, not as it is now: a checkpoint
+        overwritten in place must not change the keys of the weights still
+        in memory.
+        """
+        info = self.get_model_info()
+        if info["type"] == "custom":
+            if self.checkpoint_stamp is None:
+                # Keys built before the model loads name the weights it is about to read
+                self.checkpoint_stamp = self._read_checkpoint_stamp()
+            return f"custom:{info['checkpoint']}:{info['config']}:{self.checkpoint_stamp}"
+        return f"public:{info['model']}"
+
+    def get_cache_namespace(self) -> str:
+        """
+        Model identity plus every setting that changes the audio, for cache keys.
+
+        Covers reference preprocessing, how segments are joined and the
+        inference engine (the ONNX vocoder's output differs slightly from eager).
+        """
+        return (
+            f"{self.get_model_id()}|{settings_signature()}|"
+            f"join:{CROSSFADE_MS:g}:{PARAGRAPH_PAUSE_MS:g}|engine:{INFERENCE_ENGINE}"
+        )
+
+    def get_conditioning_latents(self, speaker_wav, audio_hash: str = None):
+        """
+        Return (gpt_cond_latent, speaker_embedding) for the reference audio.
+
+        Results are cached by audio content hash, so repeated requests with
+        the same reference clip skip the conditioning step entirely. Callers
+        that already know the hash (e.g. voice profiles) can pass it to skip
+        re-reading the files. On a miss each clip is preprocessed first (see
+        audio_preprocessing.py), which raises UnusableAudioError for clips
+        that are too short, silent or clipped.
+        """
+        paths = speaker_wav if isinstance(speaker_wav, (list, tuple)) else [speaker_wav]
+        audio_hash = audio_hash or hash_audio_files(paths)
+        key = self.latent_cache.make_key(audio_hash, self.get_cache_namespace())
+
+        cached = self.latent_cache.get(key)
+        if cached is not None:
+            return cached
+
+        xtts = self.get_xtts_model()
+        config = xtts.config
+        if PREPROCESS_ENABLED:
+            # Processed clips come back as InMemoryAudio at the conditioning rate
+            preprocessor = get_preprocessor()
+            with metrics.stage("preprocess"):
+                paths = [preprocessor.process(p, hash_audio_files([p])) for p in paths]
+
+        start = time.perf_counter()
+        if any(isinstance(p, InMemoryAudio) for p in paths):
+            gpt_cond_latent, speaker_embedding = self._conditioning_from_waveforms(xtts, paths)
+        else:
+            gpt_cond_latent, speaker_embedding = xtts.get_conditioning_latents(
+                audio_path=list(paths),
+                gpt_cond_len=config.gpt_cond_len,
+                gpt_cond_chunk_len=config.gpt_cond_chunk_len,
+                max_ref_length=config.max_ref_len,
+                sound_norm_refs=config.sound_norm_refs,
+            )
+        elapsed = time.perf_counter() - start
+        metrics.observe_stage("conditioning", elapsed)
+        self.latent_cache.put(key, gpt_cond_latent, speaker_embedding, elapsed)
+        return gpt_cond_latent, speaker_embedding
+
+    @torch.inference_mode()
+    def _conditioning_from_waveforms(self, xtts, clips):
+        """
+        Compute conditioning latents from decoded audio.
+
+        Mirrors Xtts.get_conditioning_latents, but starts from in-memory
+        waveforms instead of loading files. Paths are still accepted and
+        decoded with the model's own loader.
+        """
+        import torchaudio
+        from TTS.tts.models.xtts import load_audio
+
+        config = xtts.config
+        load_sr = 22050
+        audios = []
+        speaker_embeddings = []
+        for clip in clips:
+            if isinstance(clip, InMemoryAudio):
+                audio = torch.from_numpy(clip.samples).float().unsqueeze(0)
+                if clip.sample_rate != load_sr:
+                    audio = torchaudio.functional.resample(audio, clip.sample_rate, load_sr)
+                audio = audio.clip(-1, 1)
+            else:
+                audio = load_audio(clip, load_sr)
+            audio = audio[:, : load_sr * config.max_ref_len].to(xtts.device)
+            if config.sound_norm_refs:
+                audio = (audio / torch.abs(audio).max()) * 0.75
+
+            speaker_embeddings.append(xtts.get_speaker_embedding(audio, load_sr))
+            audios.append(audio)
+
+        gpt_cond_latent = xtts.get_gpt_cond_latents(
+            torch.cat(audios, dim=-1),
+            load_sr,
+            length=config.gpt_cond_len,
+            chunk_length=config.gpt_cond_chunk_len,
+        )
+        speaker_embedding = torch.stack(speaker_embeddings).mean(dim=0)
+        return gpt_cond_latent, speaker_embedding
+
+    def tts_to_file(
+        self,
+        text: str,
+        file_path,
+        speaker_wav,
+        language: str = "en",
+        audio_hash: str = None,
+        progress_callback=None,
+    ):
         """
         Generate speech and save to file.
 
+        file_path may also be a writable file object (e.g. io.BytesIO), and
+        speaker_wav may be InMemoryAudio, so a request can run without disk I/O.
         Handles both TTS API objects (public model) and Xtts objects (custom model).
+        Speaker conditioning comes from the latent cache, so inference runs
+        directly on the cached tensors.
+
+        Text is split into sentence segments that go through a bounded
+        pipeline: segment N+1 is synthesized while segment N is crossfaded
+        and appended to the output file, so memory stays flat regardless of
+        text length. progress_callback(completed, total) is called after
+        each segment is written. With a worker pool installed, the
+        synthesis itself runs in an idle worker process.
         """
-        if self.model is None:
-            self.load_model()
+        audio_hash = audio_hash or hash_audio_files(speaker_wav)
+
+        # Identical requests are served from the result cache without the model
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = self.result_cache.make_key(text, audio_hash, language, self.get_cache_namespace())
+            cached_path = self.result_cache.get(cache_key)
+            if cached_path is not None:
+                if _is_path(file_path):
+                    _link_or_copy(cached_path, file_path)
+                else:
+                    with open(cached_path, "rb") as f:
+                        file_path.write(f.read())
+                if metrics.METRICS_ENABLED:
+                    import soundfile as sf
+                    metrics.add_audio_seconds(sf.info(cached_path).duration, source="cache")
+                if progress_callback:
+                    progress_callback(1, 1)
+                return
 
-        # Public TTS API has tts_to_file method
-        if hasattr(self.model, 'tts_to_file'):
-            self.model.tts_to_file(
+        if self.worker_pool is not None:
+            self.worker_pool.tts_to_file(
                 text=text,
                 file_path=file_path,
                 speaker_wav=speaker_wav,
                 language=language,
+                audio_hash=audio_hash,
+                progress_callback=progress_callback,
             )
-        # Custom Xtts model uses inference_with_config
         else:
-            # For custom models, we need to handle inference differently
-            outputs = self.model.synthesize(
-                text=text,
-                config=self.model.config,
-                speaker_wav=speaker_wav,
-                language=language,
+            with self.in_use():
+                self._synthesize_to_file(text, file_path, speaker_wav, language, audio_hash, progress_callback)
+
+        if cache_key is not None:
+            self.result_cache.put(cache_key, file_path if _is_path(file_path) else file_path.getvalue())
+
+    def _synthesize_to_file(self, text, file_path, speaker_wav, language, audio_hash, progress_callback,
+                            use_segment_cache=True):
+        """
+        Run the segment pipeline in this process and write the result.
+
+        Sentences found in the segment cache are not synthesized again;
+        only the missing ones go through the model.
+        """
+        import soundfile as sf
+
+        xtts = self.get_xtts_model()
+        audio_hash = audio_hash or hash_audio_files(speaker_wav)
+        gpt_cond_latent, speaker_embedding = self.get_conditioning_latents(speaker_wav, audio_hash=audio_hash)
+
+        max_chars = xtts.tokenizer.char_limits.get(language.split("-")[0], 250)
+        segments = segment_text(text, language=language, max_chars=max_chars)
+        if progress_callback:
+            progress_callback(0, len(segments))
+
+        segment_cache = self.segment_cache if use_segment_cache else None
+        keys = None
+        if segment_cache is not None:
+            namespace = self.get_cache_namespace()
+            keys = [segment_cache.make_key(sentence, audio_hash, language, namespace) for sentence, _ in segments]
+
+        wavs = self._synthesize_segments(
+            xtts, [s for s, _ in segments], language, gpt_cond_latent, speaker_embedding,
+            segment_cache=segment_cache, keys=keys,
+        )
+        # The path may be a hard link to a cached result; never write through it
+        if _is_path(file_path) and os.path.exists(file_path):
+            os.remove(file_path)
+        with sf.SoundFile(file_path, "w", samplerate=OUTPUT_SAMPLE_RATE, channels=1,
+                          format="WAV", subtype="PCM_16") as out:
+            writer = CrossfadeWriter(out.write)
+            write_seconds = 0.0
+            for index, (wav, from_cache) in enumerate(wavs):
+                paragraph_end = segments[index][1] and index < len(segments) - 1
+                if not from_cache:
+                    wav = trim_segment(wav)
+                    if segment_cache is not None:
+                        segment_cache.put(keys[index], wav)
+                start = time.perf_counter()
+                writer.write(wav, pause_after=paragraph_end)
+                write_seconds += time.perf_counter() - start
+                if progress_callback:
+                    progress_callback(index + 1, len(segments))
+            start = time.perf_counter()
+            writer.close()
+            metrics.observe_stage("write", write_seconds + time.perf_counter() - start)
+            metrics.add_audio_seconds(out.frames / OUTPUT_SAMPLE_RATE)
+
+    def warm_up(self, language: str = "en", text: str = None):
+        """
+        Run one short synthesis so one-time costs (kernel selection, tokenizer
+        and language resources) are paid before the first request.
+
+        Runs in this process and bypasses the result and segment caches, so
+        the model is always exercised. Call it before forking workers so they inherit the
+        warmed state.
+        """
+        import io
+
+        import numpy as np
+
+        text = text or WARMUP_TEXTS.get(language.split("-")[0], WARMUP_TEXTS["en"])
+        sample_rate = 22050
+        t = np.arange(3 * sample_rate, dtype=np.float32) / sample_rate
+        # A plain voiced tone is enough to drive the conditioning encoders
+        clip = InMemoryAudio((0.3 * np.sin(2 * np.pi * 140.0 * t)).astype(np.float32), sample_rate, "warmup")
+        self._synthesize_to_file(text, io.BytesIO(), [clip], language, clip.content_hash, None,
+                                 use_segment_cache=False)
+
+    def _synthesize_segment(self, xtts, text, language, gpt_cond_latent, speaker_embedding):
+        """Synthesize one segment directly (or through the batcher) and return its waveform."""
+        batcher = self.get_batcher()
+        if batcher is not None:
+            return batcher.synthesize(text, language, gpt_cond_latent, speaker_embedding)
+
+        config = xtts.config
+        return xtts.inference(
+            text,
+            language,
+            gpt_cond_latent,
+            speaker_embedding,
+            temperature=config.temperature,
+            length_penalty=config.length_penalty,
+            repetition_penalty=config.repetition_penalty,
+            top_k=config.top_k,
+            top_p=config.top_p,
+        )["wav"]
+
+    def _synthesize_segments(self, xtts, texts, language, gpt_cond_latent, speaker_embedding,
+                             segment_cache=None, keys=None):
+        """
+        Yield (waveform, from_cache) per text, in order, from a background producer.
+
+        At most PIPELINE_DEPTH finished segments wait for the consumer. With
+        micro-batching enabled, the producer keeps a window of segments in
+        flight so they can share batches. Each failed segment is retried up
+        to SEGMENT_RETRIES times before the whole synthesis fails. Texts
+        whose key (keys is parallel to texts) is in segment_cache are read
+        from it when their turn comes, so cached audio is never held for
+        longer than the pipeline holds synthesized audio.
+        """
+        if segment_cache is not None:
+            expected = [segment_cache.contains(key) for key in keys]
+        else:
+            expected = [False] * len(texts)
+        results = queue.Queue(maxsize=max(PIPELINE_DEPTH, 1))
+        stop = threading.Event()
+        done = object()
+        batcher = self.get_batcher()
+
+        def synthesize_with_retries(index, first_attempt):
+            for attempt in range(SEGMENT_RETRIES + 1):
+                try:
+                    if attempt == 0 and first_attempt is not None:
+                        return first_attempt.result()
+                    return self._synthesize_segment(xtts, texts[index], language, gpt_cond_latent, speaker_embedding)
+                except Exception as e:
+                    if attempt == SEGMENT_RETRIES:
+                        raise RuntimeError(
+                            f"Segment {index + 1}/{len(texts)} failed after {attempt + 1} attempts: {e}"
+                        ) from e
+                    print(f"Warning: segment {index + 1}/{len(texts)} failed ({e}), retrying...")
+
+        def produce():
+            try:
+                in_flight = deque()
+                window = max(PIPELINE_DEPTH, batcher.max_batch_size) if batcher is not None else 0
+                missing = deque(i for i in range(len(texts)) if not expected[i])
+                for index in range(len(texts)):
+                    if stop.is_set():
+                        return
+                    if segment_cache is not None:
+                        # A miss here for an expected entry (evicted since) is synthesized outside the batch window
+                        wav = segment_cache.get(keys[index])
+                        if wav is not None:
+                            results.put((wav, True))
+                            continue
+                    # Keep the batcher fed with upcoming uncached segments
+                    while batcher is not None and missing and len(in_flight) < window:
+                        next_index = missing.popleft()
+                        in_flight.append((next_index, batcher.submit(
+                            texts[next_index], language, gpt_cond_latent, speaker_embedding
+                        )))
+                    future = in_flight.popleft()[1] if in_flight and in_flight[0][0] == index else None
+                    results.put((synthesize_with_retries(index, future), False))
+                results.put(done)
+            except BaseException as e:
+                results.put(e)
+
+        producer = threading.Thread(target=produce, name="segment-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Unblock and retire the producer if the consumer stops early
+            stop.set()
+            while producer.is_alive():
+                try:
+                    results.get_nowait()
+                except queue.Empty:
+                    producer.join(0.05)
+
+    def tts_stream(self, text: str, speaker_wav, language: str = "en", audio_hash: str = None):
+        """
+        Generate speech incrementally.
+
+        Returns an iterator of float32 NumPy chunks at OUTPUT_SAMPLE_RATE that
+        XTTS yields as soon as they are decoded, sentence by sentence, so
+        playback can start long before the whole text is synthesized.
+        Conditioning runs before this returns, so bad reference audio fails
+        here rather than mid-stream.
+        """
+        if self.worker_pool is not None:
+            return self.worker_pool.tts_stream(
+                text=text, speaker_wav=speaker_wav, language=language, audio_hash=audio_hash
             )
-            # Save the audio
-            import soundfile as sf
-            sf.write(file_path, outputs["wav"], 24000)
+
+        with self.in_use():
+            xtts = self.get_xtts_model()
+            gpt_cond_latent, speaker_embedding = self.get_conditioning_latents(speaker_wav, audio_hash=audio_hash)
+        max_chars = xtts.tokenizer.char_limits.get(language.split("-")[0], 250)
+        sentences = split_sentences(text, language=language, max_chars=max_chars)
+        return self._stream_sentences(xtts, sentences, language, gpt_cond_latent, speaker_embedding)
+
+    def _stream_sentences(self, xtts, sentences, language, gpt_cond_latent, speaker_embedding):
+        config = xtts.config
+        with self.in_use():
+            for sentence in sentences:
+                for chunk in xtts.inference_stream(
+                    sentence,
+                    language,
+                    gpt_cond_latent,
+                    speaker_embedding,
+                    stream_chunk_size=STREAM_CHUNK_SIZE,
+                    temperature=config.temperature,
+                    length_penalty=config.length_penalty,
+                    repetition_penalty=config.repetition_penalty,
+                    top_k=config.top_k,
+                    top_p=config.top_p,
+                ):
+                    chunk = chunk.detach().cpu().numpy()
+                    metrics.add_audio_seconds(len(chunk) / OUTPUT_SAMPLE_RATE)
+                    yield chunk
 
     def get_model_info(self):
-        """Return information about the loaded model."""
+        """Return information about the configured model (loaded or not)."""
         if self.is_custom_model:
             return {
                 "type": "custom",
-                "checkpoint": os.getenv("CUSTOM_MODEL_PATH"),
-                "config": os.getenv("CUSTOM_CONFIG_PATH"),
+                "checkpoint": self.checkpoint_dir,
+                "config": self.config_path,
                 "device": self.device,
+                "engine": self.engine,
             }
         else:
             return {
                 "type": "public",
-                "model": "tts_models/multilingual/multi-dataset/xtts_v2",
+                "model": PUBLIC_MODEL_NAME,
                 "device": self.device,
+                "engine": self.engine,
             }
 
 
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Model Registry
+
+Serves several XTTS checkpoints from one process. Requests name a model;
+models load on first use and stay resident until the memory budget is
+exceeded, at which point the least recently used idle model is unloaded.
+
+The default model (public XTTS v2, or CUSTOM_MODEL_PATH/CUSTOM_CONFIG_PATH)
+is always resident: startup warms it up and worker processes fork from it.
+Every subdirectory of MODELS_DIR holding a config.json and model.pth is an
+additional model named after the directory. MODELS_DIR is rescanned when an
+unknown model is requested and when models are listed, so new checkpoints
+are picked up without a restart.
+
+Environment Variables:
+    MODELS_DIR: Directory of additional fine-tuned checkpoints (default: models)
+    MODEL_MEMORY_BUDGET_MB: Memory for resident models, including the default; 0 means unlimited (default: 0)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from model_loader import XTTSModelLoader, get_model_loader
+
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
+DEFAULT_MODEL = "default"
+
+
+class UnknownModelError(KeyError):
+    """Raised when a request names a model that is not in the registry."""
+
+    def __str__(self):
+        return f"Unknown model: {self.args[0]}"
+
+
+class ModelRegistry:
+    """Named models with on-demand loading and LRU eviction under a memory budget."""
+
+    def __init__(self, models_dir: str = MODELS_DIR, budget_mb: float = MODEL_MEMORY_BUDGET_MB,
+                 default_loader=None):
+        self.models_dir = Path(models_dir)
+        self.budget_bytes = int(budget_mb * 1024 ** 2)
+        self.default_loader = default_loader or get_model_loader()
+        self._available = {}
+        self._loaded = OrderedDict()
+        self._last_used = {}
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.rescan()
+
+    def rescan(self) -> list:
+        """Re-read MODELS_DIR and return the names of the models found."""
+        default_dir = self.default_loader.checkpoint_dir
+        default_dir = Path(default_dir).resolve() if default_dir else None
+        found = {}
+        if self.models_dir.is_dir():
+            for path in sorted(self.models_dir.iterdir()):
+                if not ((path / "config.json").is_file() and (path / "model.pth").is_file()):
+                    continue
+                # The default model is served under DEFAULT_MODEL only
+                if path.name != DEFAULT_MODEL and path.resolve() != default_dir:
+                    found[path.name] = path
+
+        with self._lock:
+            removed = [name for name in self._available if name not in found]
+            self._available = found
+        for name in removed:
+            # The checkpoint is gone; drop it once no request is using it
+            self._evict(name, only_idle=True)
+        return list(found)
+
+    def has(self, name: str) -> bool:
+        if not name or name == DEFAULT_MODEL:
+            return True
+        with self._lock:
+            if name in self._available:
+                return True
+        return name in self.rescan()
+
+    def get(self, name: str = None) -> XTTSModelLoader:
+        """
+        Return a loader for the named model, loading it (and evicting others) if needed.
+
+        The loader is handed out already marked in use, under the same lock
+        eviction checks, so it cannot be unloaded before the caller starts
+        on it. Call its release() when done, or use use().
+        """
+        if not name or name == DEFAULT_MODEL:
+            self._touch(DEFAULT_MODEL)
+            self.default_loader.acquire()
+            return self.default_loader
+        if not self.has(name):
+            raise UnknownModelError(name)
+
+        with self._lock:
+            loader = self._loaded.get(name)
+            if loader is not None:
+                self._loaded.move_to_end(name)
+                self._last_used[name] = time.time()
+                loader.acquire()
+                return loader
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Concurrent requests for the same model wait for one load; other
+        # models keep serving meanwhile
+        with load_lock:
+            with self._lock:
+                loader = self._loaded.get(name)
+                if loader is not None:
+                    self._loaded.move_to_end(name)
+                    loader.acquire()
+                    return loader
+                path = self._available[name]
+
+            checkpoint_size = (path / "model.pth").stat().st_size
+            self._make_room(checkpoint_size)
+
+            print(f"Loading model '{name}' from {path}...")
+            loader = XTTSModelLoader(
+                checkpoint_dir=str(path),
+                config_path=str(path / "config.json"),
+                latent_cache=self.default_loader.latent_cache,
+                result_cache=self.default_loader.result_cache,
+                segment_cache=self.default_loader.segment_cache,
+            )
+            loader.load_model()
+
+            with self._lock:
+                self._loaded[name] = loader
+                self._last_used[name] = time.time()
+                self.loads += 1
+                loader.acquire()
+            # The checkpoint size was only an estimate; settle up with the real footprint
+            self._make_room(0, keep=name)
+            return loader
+
+    @contextmanager
+    def use(self, name: str = None):
+        """Hold the named model's loader for the duration of the block (see get)."""
+        loader = self.get(name)
+        try:
+            yield loader
+        finally:
+            loader.release()
+
+    def _touch(self, name: str):
+        with self._lock:
+            self._last_used[name] = time.time()
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            loaders = list(self._loaded.values())
+        return self.default_loader.memory_bytes() + sum(loader.memory_bytes() for loader in loaders)
+
+    def _make_room(self, incoming_bytes: int, keep: str = None):
+        """Unload idle models, least recently used first, until incoming_bytes fits the budget."""
+        if self.budget_bytes <= 0:
+            return
+        while self.resident_bytes() + incoming_bytes > self.budget_bytes:
+            with self._lock:
+                victim = next(
+                    (name for name, loader in self._loaded.items()
+                     if name != keep and loader.active_requests == 0),
+                    None,
+                )
+            if victim is None:
+                print("Warning: model memory budget exceeded, but every loaded model is in use")
+                return
+            # Skipped if it was handed out since; the next pass picks another
+            self._evict(victim, only_idle=True)
+
+    def _evict(self, name: str, only_idle: bool = False):
+        with self._lock:
+            loader = self._loaded.get(name)
+            if loader is None or (only_idle and loader.active_requests > 0):
+                return
+            del self._loaded[name]
+            self.evictions += 1
+        print(f"Unloading model '{name}'")
+        loader.unload()
+
+    def list_models(self) -> list:
+        """Describe the default model and every available model, loaded or not."""
+        self.rescan()
+        with self._lock:
+            loaded = dict(self._loaded)
+            available = dict(self._available)
+            last_used = dict(self._last_used)
+
+        default_info = self.default_loader.get_model_info()
+        models = [{
+            "name": DEFAULT_MODEL,
+            "type": default_info["type"],
+            "checkpoint": default_info.get("checkpoint"),
+            "loaded": self.default_loader.model is not None,
+            "pinned": True,
+            "memory_mb": round(self.default_loader.memory_bytes() / 1024 ** 2, 1),
+            "last_used": last_used.get(DEFAULT_MODEL),
+        }]
+        for name, path in available.items():
+            loader = loaded.get(name)
+            models.append({
+                "name": name,
+                "type": "custom",
+                "checkpoint": str(path),
+                "loaded": loader is not None,
+                "pinned": False,
+                "memory_mb": round(loader.memory_bytes() / 1024 ** 2, 1) if loader else 0.0,
+                "last_used": last_used.get(name),
+            })
+        return models
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = len(self._loaded)
+        return {
+            "loaded_models": loaded + (1 if self.default_loader.model is not None else 0),
+            "resident_mb": round(self.resident_bytes() / 1024 ** 2, 1),
+            "budget_mb": round(self.budget_bytes / 1024 ** 2, 1) if self.budget_bytes > 0 else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+# Singleton instance
+_model_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    """Get the global model registry instance."""
+    global _model_registry
+    with _registry_lock:
+        if _model_registry is None:
+            _model_registry = ModelRegistry()
+    return _model_registry
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Synthesis Result Cache
+
+Content-addressed cache of generated audio. Identical requests (same
+normalized text, reference audio, language and model) are served from disk
+without touching the model. Entries are evicted least-recently-used once
+the cache exceeds its byte quota, and expire after a TTL. The index is
+persisted so restarts do not lose the cache.
+
+Several processes (forked inference workers, server processes) can share
+one cache directory: entries one of them writes are found by the others.
+Each process merges its view into the on-disk index under a file lock at
+most every INDEX_FLUSH_SECONDS, or as soon as its view exceeds the quota,
+so the quota applies to the directory as a whole.
+
+Environment Variables:
+    RESULT_CACHE_ENABLED: Set to 0 to disable the cache (default: 1)
+    RESULT_CACHE_DIR: Cache directory (default: cache/results)
+    RESULT_CACHE_MAX_BYTES: Disk quota in bytes (default: 2147483648, i.e. 2 GB)
+    RESULT_CACHE_TTL_SECONDS: Entry lifetime; 0 disables expiry (default: 604800, i.e. 7 days)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") != "0"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache/results")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Bump when the synthesis pipeline changes in a way that alters the audio
+CACHE_FORMAT_VERSION = 1
+
+# Merge new entries and access-time updates into the index at most this often
+INDEX_FLUSH_SECONDS = 30
+# Temporary files older than this were left behind by a writer that died
+STALE_TMP_SECONDS = 3600
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class ResultCache:
+    """LRU cache of synthesized WAV files with a byte quota and TTL."""
+
+    def __init__(self, cache_dir: str = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 ttl_seconds: int = RESULT_CACHE_TTL_SECONDS):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.index_path = self.cache_dir / "index.json"
+        self.lock_path = self.cache_dir / "index.lock"
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = 0.0
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str, audio_hash: str, language: str, model_id: str) -> str:
+        payload = json.dumps({
+            "version": CACHE_FORMAT_VERSION,
+            "text": normalize_text(text),
+            "audio": audio_hash,
+            "language": language,
+            "model": model_id,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.wav"
+
+    def get(self, key: str):
+        """Return the cached file path for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            path = self._path(key)
+            if entry is None and path.exists():
+                entry = self._adopt(key, path)
+            if entry is not None and (self._expired(entry) or not path.exists()):
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry["last_access"] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._dirty = True
+            self._maybe_flush()
+            return str(path)
+
+    def contains(self, key: str) -> bool:
+        """Whether key is probably cached (get() can still miss), without counting a lookup."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                return False
+        return self._path(key).exists()
+
+    def put(self, key: str, source):
+        """
+        Store a freshly synthesized result and enforce the quota.
+
+        source is either the path of a WAV file or the WAV bytes themselves.
+        """
+        size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+        if size > self.max_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        if isinstance(source, bytes):
+            with open(tmp_path, "wb") as f:
+                f.write(source)
+        else:
+            shutil.copyfile(source, tmp_path)
+
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries[key]["size"]
+            self._entries[key] = {"size": size, "created": now, "last_access": now}
+            self._entries.move_to_end(key)
+            self.total_bytes += size
+            self._dirty = True
+            if self.total_bytes > self.max_bytes:
+                with self._index_lock():
+                    self._sync_index()
+            else:
+                self._maybe_flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _expired(self, entry: dict) -> bool:
+        return self.ttl_seconds > 0 and time.time() - entry["created"] > self.ttl_seconds
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+        self._path(key).unlink(missing_ok=True)
+        self._dirty = True
+
+    def _evict(self):
+        for key in [k for k, entry in self._entries.items() if self._expired(entry)]:
+            self._remove(key)
+            self.evictions += 1
+        while self.total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _adopt(self, key: str, path: Path):
+        """Index an entry another process wrote since our last index merge."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        entry = {"size": stat.st_size, "created": stat.st_mtime, "last_access": time.time()}
+        self._entries[key] = entry
+        self.total_bytes += entry["size"]
+        return entry
+
+    @contextmanager
+    def _index_lock(self):
+        """Hold the lock other processes sharing the directory take to change it."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> dict:
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable result cache index: {e}")
+            return {}
+
+    def _sync_index(self):
+        """
+        Merge the on-disk index into ours, enforce the quota and write it back.
+
+        Callers hold both locks. Entries only the on-disk index knows were
+        written (or touched) by another process; they are kept if their
+        file still exists. For entries both know, the later access wins.
+        Runs on the INDEX_FLUSH_SECONDS timer, not per entry, so its cost
+        (linear in the index size) is not paid for every put.
+        """
+        merged = dict(self._entries)
+        for key, entry in self._read_index().items():
+            ours = merged.get(key)
+            if ours is None:
+                if self._path(key).exists():
+                    merged[key] = entry
+            elif entry["last_access"] > ours["last_access"]:
+                merged[key] = entry
+        self._entries = OrderedDict(sorted(merged.items(), key=lambda item: item[1]["last_access"]))
+        self.total_bytes = sum(entry["size"] for entry in self._entries.values())
+        self._evict()
+
+        tmp_path = self.index_path.with_suffix(f".json.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(dict(self._entries), f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+        self._last_flush = time.time()
+
+    def _load_index(self):
+        with self._index_lock():
+            self._sync_index()
+
+            # Files the index does not know about yet were written by a process that
+            # has not flushed its index (or crashed first); they are complete, so keep them
+            adopted = [self._adopt(path.stem, path) for path in self.cache_dir.glob("*.wav")
+                       if path.stem not in self._entries]
+            if adopted:
+                self._sync_index()
+            # Other processes may be writing theirs right now
+            for path in self.cache_dir.glob("*.tmp"):
+                try:
+                    if time.time() - path.stat().st_mtime > STALE_TMP_SECONDS:
+                        path.unlink(missing_ok=True)
+                except OSError:
+                    pass
+
+    def _maybe_flush(self):
+        if self._dirty and time.time() - self._last_flush >= INDEX_FLUSH_SECONDS:
+            with self._index_lock():
+                self._sync_index()
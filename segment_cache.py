@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Sentence Segment Cache
+
+Caches synthesized audio per sentence, so requests that differ overall but
+share sentences (greetings, disclaimers, templated lines) only synthesize
+the sentences that are new. Entries are keyed by normalized sentence text,
+reference audio, language and model; they hold the trimmed sentence audio
+that XTTSModelLoader assembles with fixed pauses, so cached and fresh
+sentences join the same way.
+
+A bounded in-memory LRU sits in front of an on-disk tier, which is a
+ResultCache (byte quota, TTL, persisted index) in its own directory. Worker
+processes share it: they see each other's sentences, and their indexes are
+merged periodically under a file lock so they stay within one quota.
+
+Environment Variables:
+    SEGMENT_CACHE_ENABLED: Set to 0 to disable the cache (default: 1)
+    SEGMENT_CACHE_DIR: Disk tier directory (default: cache/segments)
+    SEGMENT_CACHE_MAX_BYTES: Disk quota in bytes (default: 1073741824, i.e. 1 GB)
+    SEGMENT_CACHE_MEMORY_BYTES: Memory tier size in bytes (default: 134217728, i.e. 128 MB)
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from result_cache import ResultCache
+
+SEGMENT_CACHE_ENABLED = os.getenv("SEGMENT_CACHE_ENABLED", "1") != "0"
+SEGMENT_CACHE_DIR = os.getenv("SEGMENT_CACHE_DIR", "cache/segments")
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(1024 ** 3)))
+SEGMENT_CACHE_MEMORY_BYTES = int(os.getenv("SEGMENT_CACHE_MEMORY_BYTES", str(128 * 1024 ** 2)))
+
+# Bump when sentence trimming or assembly changes
+SEGMENT_FORMAT_VERSION = 1
+
+
+class SegmentCache:
+    """Two-tier cache of per-sentence waveforms (float32 at the output rate)."""
+
+    def __init__(self, cache_dir: str = SEGMENT_CACHE_DIR, max_bytes: int = SEGMENT_CACHE_MAX_BYTES,
+                 memory_bytes: int = SEGMENT_CACHE_MEMORY_BYTES, sample_rate: int = 24000):
+        self.disk = ResultCache(cache_dir=cache_dir, max_bytes=max_bytes)
+        self.memory_bytes = memory_bytes
+        self.sample_rate = sample_rate
+        self._entries = OrderedDict()
+        self._memory_total = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def make_key(sentence: str, audio_hash: str, language: str, namespace: str) -> str:
+        # Same normalization and hashing as whole-request results, in a separate namespace
+        return ResultCache.make_key(sentence, audio_hash, language, f"segment{SEGMENT_FORMAT_VERSION}|{namespace}")
+
+    def get(self, key: str):
+        """Return the cached waveform, or None on a miss."""
+        with self._lock:
+            wav = self._entries.get(key)
+            if wav is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                self.seconds_saved += len(wav) / self.sample_rate
+                return wav
+
+        path = self.disk.get(key)
+        if path is not None:
+            try:
+                wav, _ = sf.read(path, dtype="float32")
+            except Exception as e:
+                print(f"Warning: ignoring unreadable segment cache entry {path}: {e}")
+            else:
+                with self._lock:
+                    self._remember(key, wav)
+                    self.disk_hits += 1
+                    self.seconds_saved += len(wav) / self.sample_rate
+                return wav
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def contains(self, key: str) -> bool:
+        """Whether key is cached, without reading the audio or counting a lookup."""
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.disk.contains(key)
+
+    def put(self, key: str, wav):
+        wav = np.asarray(wav, dtype=np.float32)
+        with self._lock:
+            self._remember(key, wav)
+        buffer = io.BytesIO()
+        sf.write(buffer, wav, self.sample_rate, format="WAV", subtype="FLOAT")
+        try:
+            self.disk.put(key, buffer.getvalue())
+        except OSError as e:
+            print(f"Warning: could not persist segment cache entry: {e}")
+
+    def _remember(self, key: str, wav):
+        if wav.nbytes > self.memory_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._memory_total -= previous.nbytes
+        self._entries[key] = wav
+        self._memory_total += wav.nbytes
+        while self._memory_total > self.memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_total -= evicted.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries_in_memory": len(self._entries),
+                "memory_bytes": self._memory_total,
+                "disk": self.disk.stats(),
+                "audio_seconds_saved": round(self.seconds_saved, 3),
+            }
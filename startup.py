@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Background Startup
+
+Lets the web server bind its port immediately and load the model in a
+background thread, followed by a warm-up synthesis per language so the first
+real request does not pay one-time costs. Progress is tracked in phases and
+reported by /healthz (process alive) and /readyz (model loaded and warm).
+
+Environment Variables:
+    BACKGROUND_LOAD: Set to 0 to load the model before the server binds (default: 1)
+    WARMUP_LANGUAGES: Comma-separated languages to warm up; empty disables warm-up (default: en)
+    WARMUP_TEXT: Sentence synthesized during warm-up (default: a short per-language sentence)
+"""
+
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+
+BACKGROUND_LOAD = os.getenv("BACKGROUND_LOAD", "1") != "0"
+WARMUP_LANGUAGES = [lang.strip() for lang in os.getenv("WARMUP_LANGUAGES", "en").split(",") if lang.strip()]
+WARMUP_TEXT = os.getenv("WARMUP_TEXT") or None
+
+STARTING = "starting"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class StartupState:
+    """Startup status and per-phase timings."""
+
+    def __init__(self):
+        self.status = STARTING
+        self.error = None
+        self.phases = OrderedDict()
+        self.background = False
+        self.started_at = time.time()
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def set_status(self, status: str, error: str = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            if status == READY:
+                self.ready_at = time.time()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase and record its duration."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = round(elapsed, 3)
+            print(f"  Startup phase {name}: {elapsed:.1f}s")
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "status": self.status,
+                "error": self.error,
+                "phases": dict(self.phases),
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "startup_seconds": round(self.ready_at - self.started_at, 1) if self.ready_at else None,
+            }
+
+
+def initialize(state: StartupState, loader, after_load=None,
+               languages=WARMUP_LANGUAGES, warmup_text: str = WARMUP_TEXT):
+    """
+    Load and warm up the model, recording each phase in state.
+
+    after_load(loader) runs once warm-up is done (e.g. to fork workers, which
+    then inherit the warmed model). A failed warm-up is logged but does not
+    keep the server from becoming ready; a failed load does.
+    """
+    try:
+        state.set_status(LOADING)
+        with state.phase("load_model"):
+            loader.load_model()
+
+        state.set_status(WARMING)
+        for language in languages:
+            try:
+                with state.phase(f"warmup_{language}"):
+                    loader.warm_up(language, text=warmup_text)
+            except Exception as e:
+                print(f"Warning: warm-up for {language} failed: {e}")
+
+        if after_load is not None:
+            with state.phase("after_load"):
+                after_load(loader)
+    except Exception as e:
+        traceback.print_exc()
+        state.set_status(FAILED, error=str(e))
+        raise
+
+    state.set_status(READY)
+    print(f"Model ready after {time.time() - state.started_at:.1f}s")
+
+
+def start_background(state: StartupState, target) -> threading.Thread:
+    """Run target() (which should call initialize()) in a daemon thread."""
+    state.background = True
+
+    def run():
+        try:
+            target()
+        except Exception:
+            pass  # Recorded in state and reported by /healthz and /readyz
+
+    thread = threading.Thread(target=run, name="model-startup", daemon=True)
+    thread.start()
+    return thread
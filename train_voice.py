@@ -3,7 +3,14 @@
 Fine-tune XTTS v2 on a custom voice dataset.
 
 This script helps you fine-tune the XTTS model on a specific person's voice
-for higher quality and more accurate voice cloning.
+for higher quality and more accurate voice cloning:
+
+    prepare    validate and resample the recordings (dataset_preparation.py)
+    features   precompute training features (feature_store.py)
+    train      fine-tune the GPT and write a checkpoint directory that
+               CUSTOM_MODEL_PATH or MODELS_DIR can load
+    tiny-base  write a small randomly initialised base checkpoint, for
+               checking the whole pipeline on CPU in minutes
 
 Requirements:
 - 1-3 hours of clean audio recordings
@@ -14,63 +21,262 @@ Requirements:
 import os
 import argparse
 import json
+import random
+import shutil
+import time
 from pathlib import Path
 
 import torch
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 
+from dataset_preparation import DATASET_WORKERS, ClipLimits, prepare_dataset
+from feature_store import default_store_dir, extract_features
+from model_loader import get_public_model_dir
+
+
+# Loss weights from Coqui's GPT trainer (gpt_loss_text_ce_weight, gpt_loss_mel_ce_weight)
+TEXT_LOSS_WEIGHT = 0.01
+MEL_LOSS_WEIGHT = 1.0
+
+# Model size of the tiny-base checkpoint: XTTS v2's layout with a 2-layer,
+# 64-channel GPT, a 1024-code DVAE and a character vocabulary
+TINY_MODEL_ARGS = {
+    "gpt_layers": 2,
+    "gpt_n_model_channels": 64,
+    "gpt_n_heads": 4,
+    "gpt_num_audio_tokens": 1026,
+    "gpt_start_audio_token": 1024,
+    "gpt_stop_audio_token": 1025,
+    "decoder_input_dim": 64,
+}
+TINY_SPECIAL_TOKENS = ["[STOP]", "[UNK]", "[SPACE]", "[START]", "[en]"]
+TINY_CHARACTERS = "abcdefghijklmnopqrstuvwxyz0123456789.,!?'-:;"
+
+
+def default_base_model() -> str:
+    """Checkpoint fine-tuning starts from: CUSTOM_MODEL_PATH, else the public XTTS v2 download."""
+    return os.getenv("CUSTOM_MODEL_PATH") or str(get_public_model_dir())
+
 
-def prepare_dataset(audio_dir: str, output_dir: str):
+class LengthBucketSampler(torch.utils.data.Sampler):
     """
-    Prepare a dataset for fine-tuning.
-
-    Expected structure:
-    audio_dir/
-        speaker_name/
-            audio1.wav
-            audio1.txt  (transcription)
-            audio2.wav
-            audio2.txt
-            ...
+    Yields batches of indices with similar code lengths.
+
+    Indices are shuffled, cut into pools of BUCKET_BATCHES batches, sorted
+    by length within each pool and batched; the batch order is shuffled
+    again. Batches stay random across the epoch while each one needs little
+    padding. The order depends only on the seed and epoch, so a resumed run
+    replays the same batches and can skip the ones already trained on.
     """
-    audio_path = Path(audio_dir)
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
 
-    metadata = []
+    BUCKET_BATCHES = 50
 
-    for speaker_dir in audio_path.iterdir():
-        if not speaker_dir.is_dir():
-            continue
+    def __init__(self, lengths: list, batch_size: int, seed: int = 0):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+        self.skip = 0
 
-        speaker_name = speaker_dir.name
+    def set_epoch(self, epoch: int, skip: int = 0):
+        self.epoch = epoch
+        self.skip = skip
 
-        for audio_file in speaker_dir.glob("*.wav"):
-            transcript_file = audio_file.with_suffix(".txt")
+    def batches(self) -> list:
+        generator = random.Random(self.seed * 100003 + self.epoch)
+        indices = list(range(len(self.lengths)))
+        generator.shuffle(indices)
+        pool_size = self.batch_size * self.BUCKET_BATCHES
+        batches = []
+        for pool_start in range(0, len(indices), pool_size):
+            pool = sorted(indices[pool_start: pool_start + pool_size], key=self.lengths.__getitem__)
+            batches.extend(pool[i: i + self.batch_size] for i in range(0, len(pool), self.batch_size))
+        generator.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self.batches()[self.skip:])
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size - self.skip
 
-            if not transcript_file.exists():
-                print(f"Warning: No transcript for {audio_file}, skipping...")
-                continue
 
-            with open(transcript_file, "r") as f:
-                transcript = f.read().strip()
+class ConditionedSamples(torch.utils.data.Dataset):
+    """
+    Pairs each training sample with conditioning from another clip of the same speaker.
 
-            metadata.append({
-                "audio_file": str(audio_file),
-                "text": transcript,
-                "speaker_name": speaker_name,
-            })
+    The conditioning is a random slice of up to max_cond_frames mel frames;
+    collate_batch crops the batch to a common length, so it is never padded.
+    """
 
-    # Save metadata
-    metadata_file = output_path / "metadata.json"
-    with open(metadata_file, "w") as f:
-        json.dump(metadata, f, indent=2)
+    def __init__(self, dataset, max_cond_frames: int):
+        self.dataset = dataset
+        self.max_cond_frames = max_cond_frames
+        self.by_speaker = {}
+        for index, record in enumerate(dataset.records):
+            self.by_speaker.setdefault(record["speaker_name"], []).append(index)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index: int) -> dict:
+        sample = self.dataset[index]
+        candidates = self.by_speaker[sample["speaker_name"]]
+        others = [other for other in candidates if other != index] or candidates
+        cond_mel = self.dataset[random.choice(others)]["cond_mel"]
+        frames = cond_mel.shape[1]
+        if frames > self.max_cond_frames:
+            start = random.randint(0, frames - self.max_cond_frames)
+            cond_mel = cond_mel[:, start: start + self.max_cond_frames]
+        sample["cond_mel"] = cond_mel
+        return sample
+
+
+def collate_batch(samples: list) -> dict:
+    """Pad text and codes to the longest sample and crop conditioning to the shortest."""
+    text_lengths = torch.tensor([len(sample["text"]) for sample in samples], dtype=torch.long)
+    code_lengths = [len(sample["codes"]) for sample in samples]
+    text = torch.zeros(len(samples), int(text_lengths.max()), dtype=torch.long)
+    codes = torch.zeros(len(samples), max(code_lengths), dtype=torch.long)
+    cond_frames = min(sample["cond_mel"].shape[1] for sample in samples)
+    cond_mels = torch.empty(len(samples), 1, samples[0]["cond_mel"].shape[0], cond_frames)
+    for i, sample in enumerate(samples):
+        text[i, : len(sample["text"])] = sample["text"]
+        codes[i, : code_lengths[i]] = sample["codes"]
+        cond_mels[i, 0] = sample["cond_mel"][:, :cond_frames]
+    return {
+        "text_inputs": text,
+        "text_lengths": text_lengths,
+        "audio_codes": codes,
+        "wav_lengths": torch.tensor([sample["wav_length"] for sample in samples], dtype=torch.long),
+        "cond_mels": cond_mels,
+        "padding": 1.0 - sum(code_lengths) / (len(samples) * max(code_lengths)),
+    }
+
+
+def save_atomic(state, path: Path):
+    """torch.save through a temporary file, so an interrupted save never replaces a good file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def export_model(model, base_model: str, output_dir: Path):
+    """
+    Write a checkpoint directory XTTSModelLoader._load_custom_model can load.
 
-    print(f"Prepared {len(metadata)} audio samples")
-    print(f"Metadata saved to: {metadata_file}")
+    The model must not hold the GPT inference wrapper, so the state dict
+    has the layout load_checkpoint tries first.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    save_atomic({"model": model.state_dict()}, output_dir / "model.pth")
+    # The architecture is unchanged, so the base config and vocabulary apply as is;
+    # the DVAE and mel statistics let the result be fine-tuned again
+    for name in ("config.json", "vocab.json", "speakers_xtts.pth", "dvae.pth", "mel_stats.pth"):
+        source = Path(base_model) / name
+        if source.exists() and source.resolve() != (output_dir / name).resolve():
+            shutil.copy2(source, output_dir / name)
+    print(f"Fine-tuned model saved to: {output_dir}")
+
+
+def tiny_vocab() -> dict:
+    """Character-level tokenizer file for the tiny-base checkpoint (English only)."""
+    tokens = TINY_SPECIAL_TOKENS + list(TINY_CHARACTERS)
+    return {
+        "version": "1.0",
+        "truncation": None,
+        "padding": None,
+        "added_tokens": [
+            {"id": i, "content": token, "single_word": False, "lstrip": False, "rstrip": False,
+             "normalized": False, "special": True}
+            for i, token in enumerate(TINY_SPECIAL_TOKENS)
+        ],
+        "normalizer": None,
+        "pre_tokenizer": None,
+        "post_processor": None,
+        "decoder": None,
+        "model": {
+            "type": "BPE",
+            "dropout": None,
+            "unk_token": "[UNK]",
+            "continuing_subword_prefix": None,
+            "end_of_word_suffix": None,
+            "fuse_unk": False,
+            "byte_fallback": False,
+            "vocab": {token: i for i, token in enumerate(tokens)},
+            "merges": [],
+        },
+    }
+
+
+def write_tiny_base(output_dir: str, seed: int = 1):
+    """
+    Write a randomly initialised XTTS checkpoint small enough to train on CPU.
 
-    return metadata_file
+    It has every file features and train need (config.json, vocab.json,
+    model.pth and dvae.pth), so the full prepare, features and train
+    pipeline can be checked end to end without the public weights. The
+    audio it produces is noise.
+    """
+    from TTS.tts.layers.xtts.dvae import DiscreteVAE
+    from TTS.tts.models.xtts import XttsArgs
+
+    from feature_store import N_MELS
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    torch.manual_seed(seed)
+
+    vocab_file = output_path / "vocab.json"
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        json.dump(tiny_vocab(), f, indent=2)
+
+    config = XttsConfig()
+    config.model_args = XttsArgs(
+        **TINY_MODEL_ARGS,
+        gpt_number_text_tokens=len(TINY_SPECIAL_TOKENS) + len(TINY_CHARACTERS),
+        tokenizer_file=str(vocab_file),
+    )
+    config.languages = ["en"]
+    config.save_json(str(output_path / "config.json"))
+
+    model = Xtts(config)
+    model.init_models()
+    save_atomic({"model": model.state_dict()}, output_path / "model.pth")
+
+    # Same shape as feature_store.FeatureExtractor builds
+    dvae = DiscreteVAE(
+        channels=N_MELS,
+        normalization=None,
+        positional_dims=1,
+        num_tokens=TINY_MODEL_ARGS["gpt_num_audio_tokens"] - 2,
+        codebook_dim=512,
+        hidden_dim=512,
+        num_resnet_blocks=3,
+        kernel_size=3,
+        num_layers=2,
+        use_transposed_convs=False,
+    )
+    save_atomic(dvae.state_dict(), output_path / "dvae.pth")
+    print(f"Tiny base checkpoint saved to: {output_path}")
+    return output_dir
+
+
+def autocast_settings(precision: str, device: str):
+    """Return (enabled, dtype, use_grad_scaler) for the requested precision."""
+    if precision == "auto":
+        if device != "cuda":
+            precision = "fp32"
+        else:
+            precision = "bf16" if torch.cuda.is_bf16_supported() else "fp16"
+    if precision == "fp32":
+        return False, torch.float32, False
+    if precision == "fp16" and device != "cuda":
+        raise ValueError("fp16 training needs a CUDA device; use bf16 or fp32 on CPU")
+    dtype = torch.float16 if precision == "fp16" else torch.bfloat16
+    return True, dtype, precision == "fp16"
 
 
 def fine_tune(
@@ -79,60 +285,190 @@ def fine_tune(
     epochs: int = 10,
     batch_size: int = 2,
     learning_rate: float = 5e-6,
+    base_model: str = None,
+    grad_accum: int = 16,
+    precision: str = "auto",
+    save_every: int = 500,
+    log_every: int = 10,
+    features_dir: str = None,
+    language: str = "en",
+    max_steps: int = None,
+    workers: int = 2,
+    seed: int = 1,
+    restart: bool = False,
 ):
     """
-    Fine-tune XTTS v2 on the prepared dataset.
-
-    Note: This requires significant GPU memory (12GB+ recommended).
+    Fine-tune the XTTS GPT on the prepared dataset.
+
+    Only the GPT (including its conditioning encoder) is trained, as in
+    Coqui's GPT trainer; the HiFi-GAN decoder is kept from the base model.
+    One optimizer step covers batch_size * grad_accum samples. A training
+    checkpoint (GPT, optimizer and position in the epoch) is written
+    atomically every save_every steps and at the end of each epoch, and a
+    rerun with the same output_dir resumes from it unless restart is set.
     """
     device = "cuda" if torch.cuda.is_available() else "cpu"
 
     if device == "cpu":
         print("WARNING: Fine-tuning on CPU is very slow. GPU recommended.")
 
+    base_model = base_model or default_base_model()
+    output_path = Path(output_dir)
+    checkpoint_path = output_path / "training" / "checkpoint.pt"
     print(f"Using device: {device}")
+    print(f"Base model: {base_model}")
     print(f"Loading metadata from: {metadata_file}")
 
-    with open(metadata_file, "r") as f:
-        metadata = json.load(f)
-
-    print(f"Found {len(metadata)} training samples")
+    _, dataset = extract_features(
+        metadata_file, base_model, store_dir=features_dir or default_store_dir(metadata_file), language=language
+    )
+    if len(dataset) == 0:
+        raise ValueError("No usable training samples")
+    print(f"Found {len(dataset)} training samples")
 
     # Load base XTTS model
-    print("Loading base XTTS v2 model...")
+    print("Loading base XTTS model...")
     config = XttsConfig()
-    config.load_json("path_to_config.json")  # Will be downloaded with model
+    config.load_json(os.path.join(base_model, "config.json"))
 
     model = Xtts.init_from_config(config)
-    model.load_checkpoint(config, checkpoint_dir="path_to_checkpoint")
-    model.to(device)
-
-    # Training loop would go here
-    # Note: Full fine-tuning implementation requires more setup
-    # Consider using the TTS trainer API for production use
-
-    print("""
-    ============================================================
-    FINE-TUNING GUIDE
-    ============================================================
-
-    For full fine-tuning, you have several options:
-
-    1. Use Coqui TTS Trainer (recommended):
-       - See: https://tts.readthedocs.io/en/latest/training.html
-
-    2. Use the XTTS fine-tuning script:
-       - Clone: https://github.com/coqui-ai/TTS
-       - Run: python TTS/demos/xtts_ft_demo/xtts_demo.py
-
-    3. Quick voice cloning (no training needed):
-       - Use clone_voice.py with 6+ seconds of audio
-       - This works well for most use cases!
+    model.load_checkpoint(config, checkpoint_dir=base_model, use_deepspeed=False)
+    # Drop the inference wrapper (as Coqui's trainer does after test runs); it is
+    # rebuilt on load, and leaving it out keeps the exported state dict minimal
+    del model.gpt.gpt_inference
+    del model.gpt.gpt.wte
+    model.requires_grad_(False)
+    gpt = model.gpt
+    gpt.to(device)
+    gpt.requires_grad_(True)
+    gpt.train()
+
+    # 3-6 s of conditioning, as in Coqui's trainer (min/max_conditioning_length)
+    cond_hop = dataset.cond_hop
+    max_cond_frames = 132300 // cond_hop
+    samples = ConditionedSamples(dataset, max_cond_frames)
+    sampler = LengthBucketSampler(dataset.lengths, batch_size, seed=seed)
+    loader = torch.utils.data.DataLoader(
+        samples,
+        batch_sampler=sampler,
+        collate_fn=collate_batch,
+        num_workers=workers,
+        pin_memory=device == "cuda",
+        persistent_workers=False,
+    )
 
-    Your prepared dataset is at: {metadata_file}
-    ============================================================
-    """)
+    optimizer = torch.optim.AdamW(
+        [p for p in gpt.parameters() if p.requires_grad],
+        lr=learning_rate, betas=(0.9, 0.96), eps=1e-8, weight_decay=1e-2,
+    )
+    use_autocast, autocast_dtype, use_scaler = autocast_settings(precision, device)
+    scaler = torch.amp.GradScaler("cuda", enabled=use_scaler)
+    print(f"Precision: {autocast_dtype if use_autocast else torch.float32}; "
+          f"effective batch: {batch_size} x {grad_accum} = {batch_size * grad_accum}")
+
+    settings = {
+        "base_model": str(Path(base_model).resolve()),
+        "samples": len(dataset),
+        "batch_size": batch_size,
+        "grad_accum": grad_accum,
+        "seed": seed,
+    }
+    step = epoch = skip_batches = 0
+    if checkpoint_path.exists() and not restart:
+        state = torch.load(checkpoint_path, map_location="cpu", weights_only=True)
+        if state["settings"] != settings:
+            raise ValueError(
+                f"{checkpoint_path} was written with different data or settings "
+                f"({state['settings']}); pass --restart to start over"
+            )
+        gpt.load_state_dict(state["gpt"])
+        optimizer.load_state_dict(state["optimizer"])
+        scaler.load_state_dict(state["scaler"])
+        step, epoch, skip_batches = state["step"], state["epoch"], state["batch"]
+        print(f"Resuming from {checkpoint_path}: epoch {epoch + 1}, step {step}")
+
+    def save_checkpoint(next_epoch: int, next_batch: int):
+        save_atomic({
+            "gpt": gpt.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scaler": scaler.state_dict(),
+            "step": step,
+            "epoch": next_epoch,
+            "batch": next_batch,
+            "settings": settings,
+        }, checkpoint_path)
+
+    sample_rate = config.audio.sample_rate
+    window = {"samples": 0, "audio": 0.0, "loss": 0.0, "mel": 0.0, "padding": 0.0, "batches": 0,
+              "start": time.perf_counter()}
+    finished = False
+
+    while epoch < epochs and not finished:
+        sampler.set_epoch(epoch, skip=skip_batches)
+        epoch_batches = len(sampler.batches())
+        batch_index = skip_batches
+        skip_batches = 0
+        pending = 0
+        for batch in loader:
+            padding = batch.pop("padding")
+            batch = {key: value.to(device, non_blocking=True) for key, value in batch.items()}
+            with torch.autocast(device_type=device, dtype=autocast_dtype, enabled=use_autocast):
+                loss_text, loss_mel, _ = gpt(
+                    batch["text_inputs"],
+                    batch["text_lengths"],
+                    batch["audio_codes"],
+                    batch["wav_lengths"],
+                    cond_mels=batch["cond_mels"],
+                    cond_idxs=None,
+                    cond_lens=None,
+                )
+                loss = loss_text * TEXT_LOSS_WEIGHT + loss_mel * MEL_LOSS_WEIGHT
+            scaler.scale(loss / grad_accum).backward()
+            pending += 1
+            batch_index += 1
+
+            window["samples"] += len(batch["text_lengths"])
+            window["audio"] += float(batch["wav_lengths"].sum()) / sample_rate
+            window["loss"] += float(loss)
+            window["mel"] += float(loss_mel)
+            window["padding"] += padding
+            window["batches"] += 1
+
+            if pending < grad_accum and batch_index < epoch_batches:
+                continue
 
+            scaler.unscale_(optimizer)
+            torch.nn.utils.clip_grad_norm_(gpt.parameters(), 1.0)
+            scaler.step(optimizer)
+            scaler.update()
+            optimizer.zero_grad(set_to_none=True)
+            pending = 0
+            step += 1
+
+            if step % log_every == 0:
+                elapsed = time.perf_counter() - window["start"]
+                batches = window["batches"]
+                print(
+                    f"epoch {epoch + 1} step {step}: loss {window['loss'] / batches:.4f} "
+                    f"(mel {window['mel'] / batches:.4f}), {window['samples'] / elapsed:.2f} samples/s, "
+                    f"{window['audio'] / elapsed:.1f}s audio/s, padding {window['padding'] / batches:.1%}"
+                )
+                window.update(samples=0, audio=0.0, loss=0.0, mel=0.0, padding=0.0, batches=0,
+                              start=time.perf_counter())
+            if max_steps and step >= max_steps:
+                finished = True
+                break
+            if save_every and step % save_every == 0:
+                save_checkpoint(epoch, batch_index)
+
+        if not finished:
+            epoch += 1
+            save_checkpoint(epoch, 0)
+            print(f"Epoch {epoch}/{epochs} done (step {step})")
+
+    if finished:
+        save_checkpoint(epoch, batch_index)
+    export_model(model, base_model, output_path)
     return output_dir
 
 
@@ -157,6 +493,56 @@ def main():
         default="datasets/prepared",
         help="Output directory for prepared dataset"
     )
+    prep_parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=DATASET_WORKERS,
+        help="Worker processes for decoding and validation"
+    )
+    prep_parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=1.0,
+        help="Reject clips shorter than this"
+    )
+    prep_parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=11.6,
+        help="Reject clips longer than this"
+    )
+    prep_parser.add_argument(
+        "--max-silence",
+        type=float,
+        default=0.5,
+        help="Reject clips with a larger share of silent frames"
+    )
+
+    # Extract features command
+    features_parser = subparsers.add_parser(
+        "features",
+        help="Precompute training features (incremental)"
+    )
+    features_parser.add_argument(
+        "--metadata", "-m",
+        required=True,
+        help="Path to metadata.json from prepare step"
+    )
+    features_parser.add_argument(
+        "--base-model", "-b",
+        default=None,
+        help="Base checkpoint directory (default: CUSTOM_MODEL_PATH or the public XTTS v2 model)"
+    )
+    features_parser.add_argument(
+        "--features-dir", "-f",
+        default=None,
+        help="Feature store directory (default: features/ next to metadata.json)"
+    )
+    features_parser.add_argument(
+        "--language", "-l",
+        default="en",
+        help="Language of samples without a language field"
+    )
 
     # Train command
     train_parser = subparsers.add_parser(
@@ -179,13 +565,136 @@ def main():
         default=10,
         help="Number of training epochs"
     )
+    train_parser.add_argument(
+        "--base-model", "-b",
+        default=None,
+        help="Base checkpoint directory (default: CUSTOM_MODEL_PATH or the public XTTS v2 model)"
+    )
+    train_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=2,
+        help="Samples per forward pass"
+    )
+    train_parser.add_argument(
+        "--grad-accum",
+        type=int,
+        default=16,
+        help="Forward passes accumulated per optimizer step"
+    )
+    train_parser.add_argument(
+        "--lr",
+        type=float,
+        default=5e-6,
+        help="Learning rate"
+    )
+    train_parser.add_argument(
+        "--precision",
+        choices=["auto", "fp32", "fp16", "bf16"],
+        default="auto",
+        help="Autocast precision (auto: bf16 or fp16 on CUDA, fp32 on CPU)"
+    )
+    train_parser.add_argument(
+        "--save-every",
+        type=int,
+        default=500,
+        help="Optimizer steps between training checkpoints"
+    )
+    train_parser.add_argument(
+        "--log-every",
+        type=int,
+        default=10,
+        help="Optimizer steps between throughput logs"
+    )
+    train_parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=None,
+        help="Stop after this many optimizer steps"
+    )
+    train_parser.add_argument(
+        "--features-dir", "-f",
+        default=None,
+        help="Feature store directory (default: features/ next to metadata.json)"
+    )
+    train_parser.add_argument(
+        "--language", "-l",
+        default="en",
+        help="Language of samples without a language field"
+    )
+    train_parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=2,
+        help="DataLoader worker processes"
+    )
+    train_parser.add_argument(
+        "--seed",
+        type=int,
+        default=1,
+        help="Seed for the batch order"
+    )
+    train_parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore an existing training checkpoint in the output directory"
+    )
+
+    # Tiny base checkpoint command
+    tiny_parser = subparsers.add_parser(
+        "tiny-base",
+        help="Write a small random base checkpoint for testing on CPU"
+    )
+    tiny_parser.add_argument(
+        "--output-dir", "-o",
+        default="models/tiny_base",
+        help="Output directory for the checkpoint"
+    )
+    tiny_parser.add_argument(
+        "--seed",
+        type=int,
+        default=1,
+        help="Seed for the random weights"
+    )
 
     args = parser.parse_args()
 
     if args.command == "prepare":
-        prepare_dataset(args.audio_dir, args.output_dir)
+        limits = ClipLimits(
+            min_seconds=args.min_seconds,
+            max_seconds=args.max_seconds,
+            max_silence_ratio=args.max_silence,
+        )
+        prepare_dataset(args.audio_dir, args.output_dir, workers=args.workers, limits=limits)
+    elif args.command == "features":
+        store, _ = extract_features(
+            args.metadata,
+            args.base_model or default_base_model(),
+            store_dir=args.features_dir or default_store_dir(args.metadata),
+            language=args.language,
+        )
+        print(f"Store: {store.stats()}")
     elif args.command == "train":
-        fine_tune(args.metadata, args.output_dir, args.epochs)
+        fine_tune(
+            args.metadata,
+            args.output_dir,
+            epochs=args.epochs,
+            batch_size=args.batch_size,
+            learning_rate=args.lr,
+            base_model=args.base_model,
+            grad_accum=args.grad_accum,
+            precision=args.precision,
+            save_every=args.save_every,
+            log_every=args.log_every,
+            features_dir=args.features_dir,
+            language=args.language,
+            max_steps=args.max_steps,
+            workers=args.workers,
+            seed=args.seed,
+            restart=args.restart,
+        )
+    elif args.command == "tiny-base":
+        write_tiny_base(args.output_dir, seed=args.seed)
 
 
 if __name__ == "__main__":
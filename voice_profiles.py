@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Voice Profile Registry
+
+Stores reusable voice profiles so that reference samples are uploaded once
+and referred to by ID afterwards. Samples are stored content-addressed, so
+the same clip uploaded twice is kept (and conditioned) only once.
+
+Environment Variables:
+    VOICE_PROFILES_DIR: Directory holding profile metadata (default: voice_profiles)
+    VOICE_SAMPLES_DIR: Directory holding reference samples (default: voice_samples)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from model_loader import hash_audio_files
+
+VOICE_PROFILES_DIR = os.getenv("VOICE_PROFILES_DIR", "voice_profiles")
+VOICE_SAMPLES_DIR = os.getenv("VOICE_SAMPLES_DIR", "voice_samples")
+
+
+class VoiceProfileStore:
+    """Persists voice profiles as JSON files next to content-addressed samples."""
+
+    def __init__(self, profiles_dir: str = VOICE_PROFILES_DIR, samples_dir: str = VOICE_SAMPLES_DIR):
+        self.profiles_dir = Path(profiles_dir)
+        self.samples_dir = Path(samples_dir)
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        self.samples_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def save_sample(self, stream, filename: str) -> str:
+        """
+        Store an uploaded sample under its content hash and return its path.
+
+        The stream is hashed while it is copied to a temporary file, so a
+        sample that already exists is detected without a second read.
+        """
+        extension = Path(filename).suffix.lower() or ".wav"
+        digest = hashlib.sha256()
+        tmp_path = self.samples_dir / f".upload-{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as out:
+            for block in iter(lambda: stream.read(1024 * 1024), b""):
+                digest.update(block)
+                out.write(block)
+
+        sample_path = self.samples_dir / f"{digest.hexdigest()[:32]}{extension}"
+        if sample_path.exists():
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, sample_path)
+        return str(sample_path)
+
+    def create_profile(self, sample_paths, name: str = None, loader=None) -> dict:
+        """
+        Register a profile for the given samples and return it.
+
+        Duplicate samples are dropped. The profile ID is derived from the
+        sample contents, so registering the same samples again returns the
+        existing profile. If a model loader is given, the conditioning
+        latents are computed now so the first synthesis does not pay for it,
+        and samples the preprocessing rejects raise before anything is stored.
+        """
+        unique_paths = list(dict.fromkeys(str(p) for p in sample_paths))
+        if not unique_paths:
+            raise ValueError("At least one voice sample is required")
+
+        audio_hash = hash_audio_files(unique_paths)
+        voice_id = audio_hash[:16]
+
+        # Conditioning first, so unusable samples never become a profile
+        if loader is not None:
+            loader.get_conditioning_latents(unique_paths, audio_hash=audio_hash)
+
+        with self._lock:
+            profile = self.get(voice_id)
+            if profile is None:
+                profile = {
+                    "voice_id": voice_id,
+                    "name": name or voice_id,
+                    "samples": unique_paths,
+                    "audio_hash": audio_hash,
+                    "created_at": time.time(),
+                }
+                self._write(profile)
+
+        return profile
+
+    def get(self, voice_id: str):
+        """Return the profile for voice_id, or None if it does not exist."""
+        path = self._path(voice_id)
+        if path is None or not path.exists():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def list_profiles(self) -> list:
+        profiles = []
+        for path in sorted(self.profiles_dir.glob("*.json")):
+            with open(path, "r") as f:
+                profiles.append(json.load(f))
+        return profiles
+
+    def delete(self, voice_id: str) -> bool:
+        """
+        Remove a profile. Samples are left in place because other profiles
+        may share them.
+        """
+        path = self._path(voice_id)
+        if path is None or not path.exists():
+            return False
+        path.unlink()
+        return True
+
+    def _path(self, voice_id: str):
+        # Voice IDs are hex digests; reject anything else before touching the filesystem
+        if not voice_id or not all(c in "0123456789abcdef" for c in voice_id):
+            return None
+        return self.profiles_dir / f"{voice_id}.json"
+
+    def _write(self, profile: dict):
+        path = self._path(profile["voice_id"])
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(profile, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+# Singleton instance
+_voice_store = None
+
+
+def get_voice_store():
+    """Get the global voice profile store."""
+    global _voice_store
+    if _voice_store is None:
+        _voice_store = VoiceProfileStore()
+    return _voice_store
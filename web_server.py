@@ -5,43 +5,179 @@ Simple Web Interface for Voice Cloning
 Provides a REST API and basic web UI for voice cloning.
 """
 
+import io
+import json
 import os
+import select
+import socket
+import ssl
+import struct
+import threading
+import time
 import uuid
+import zipfile
+from contextlib import contextmanager
 from pathlib import Path
 
-from flask import Flask, request, jsonify, send_file, render_template_string
+from flask import (Flask, Request, Response, g, has_request_context, request, jsonify, send_file,
+                   render_template_string, stream_with_context)
 from flask_cors import CORS
+from werkzeug.serving import WSGIRequestHandler
 from werkzeug.utils import secure_filename
 
-from model_loader import get_model_loader
+import metrics
+from admission import ADMISSION_ENABLED, AdmissionRejected, ClientDisconnected, all_controllers, get_admission_controller
+from audio_preprocessing import get_preprocessor
+from audio_store import NAME_PREFIX, get_audio_store
+from batch_synthesis import safe_name
+from job_queue import QueueFullError, get_job_manager
+from model_loader import OUTPUT_SAMPLE_RATE, InMemoryAudio, get_device, get_model_loader
+from model_registry import DEFAULT_MODEL, get_model_registry
+from startup import BACKGROUND_LOAD, FAILED, STARTING, StartupState, start_background
+from startup import initialize as initialize_model
+from voice_profiles import get_voice_store
+from worker_pool import start_worker_pool, worker_pool_enabled
+
+
+class InMemoryRequest(Request):
+    """Request that keeps multipart uploads in memory instead of spooling them to temp files."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
-app = Flask(__name__)
-CORS(app)
 
 # Configuration
-UPLOAD_FOLDER = "voice_samples"
 OUTPUT_FOLDER = "output"
 ALLOWED_EXTENSIONS = {"wav", "mp3", "ogg", "flac"}
+SSE_KEEPALIVE_SECONDS = 15
+# Decode uploads and keep generated audio in memory; write files only on request
+IN_MEMORY_MODE = os.getenv("IN_MEMORY_MODE", "0") == "1"
+# Maximum number of texts accepted by /api/batch
+BATCH_API_MAX_ITEMS = int(os.getenv("BATCH_API_MAX_ITEMS", "500"))
+# Largest request body accepted, uploads included; 0 removes the limit
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 ** 2)))
+
+app = Flask(__name__)
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES or None
+CORS(app)
+if IN_MEMORY_MODE:
+    app.request_class = InMemoryRequest
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 # Global model loader (loaded once)
 model_loader = None
+startup_state = StartupState()
+_startup_lock = threading.Lock()
+
+# Routes that need the model answer 503 until background startup finishes
+MODEL_ENDPOINTS = {
+    "clone_voice", "stream_voice", "batch_voice", "create_voice", "list_models", "cache_stats",
+    # Served by async_server.py only
+    "stream_text",
+}
 
 
 def get_loader():
+    """Return the default model's loader, loading and warming it up on first use."""
     global model_loader
     if model_loader is None:
-        model_loader = get_model_loader()
-        model_loader.load_model()
+        with _startup_lock:
+            if model_loader is None:
+                loader = get_model_loader()
+                # Fork inference workers (if configured) once the model is warm
+                initialize_model(startup_state, loader, after_load=start_worker_pool)
+                model_loader = loader
     return model_loader
 
 
+def acquire_loader(model=None):
+    """
+    Return the loader for the named model, marked in use; call its release() when done.
+
+    Other models than the default load on demand in the registry (see
+    model_registry.py), which only unloads models nobody is using.
+    """
+    if model and model != DEFAULT_MODEL:
+        return get_model_registry().get(model)
+    loader = get_loader()
+    loader.acquire()
+    return loader
+
+
+@contextmanager
+def loader_in_use(model=None):
+    """Hold the named model's loader for the duration of the block (see acquire_loader)."""
+    loader = acquire_loader(model)
+    try:
+        yield loader
+    finally:
+        loader.release()
+
+
+def report_model(loader):
+    model_info = loader.get_model_info()
+    print(f"Model loaded successfully!")
+    print(f"  Type: {model_info['type']}")
+    print(f"  Device: {model_info['device']}")
+
+    if model_info['type'] == 'custom':
+        print(f"  Config: {model_info['config']}")
+        print(f"  Checkpoint: {model_info['checkpoint']}")
+
+
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def streaming_wav_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """
+    WAV header for a stream of unknown length.
+
+    The RIFF and data sizes are set to the maximum value, which players
+    treat as "read until the end of the stream".
+    """
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def pcm16_bytes(wav) -> bytes:
+    """Convert a float waveform in [-1, 1] to little-endian 16-bit PCM."""
+    import numpy as np
+
+    return (np.clip(wav, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+class ArchiveStream:
+    """
+    Write-only sink for a zip archive built on the fly.
+
+    zipfile writes to unseekable outputs using data descriptors, so each
+    member can be sent as soon as it is added; take() returns the bytes
+    written since the last call.
+    """
+
+    def __init__(self):
+        self._pending = bytearray()
+
+    def write(self, data) -> int:
+        self._pending += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self._pending)
+        self._pending.clear()
+        return data
+
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -89,6 +225,8 @@ HTML_TEMPLATE = """
         .status { color: #ffd700; margin-top: 10px; }
         .error { color: #ff6b6b; }
         .info { background: #0f3460; padding: 15px; border-radius: 8px; margin-bottom: 20px; }
+        label.checkbox { font-weight: normal; }
+        label.checkbox input { width: auto; margin-right: 8px; }
     </style>
 </head>
 <body>
@@ -136,6 +274,18 @@ HTML_TEMPLATE = """
             </select>
         </div>
 
+        <div class="form-group" id="modelGroup" style="display: none;">
+            <label for="model">Model</label>
+            <select id="model" name="model"></select>
+        </div>
+
+        <div class="form-group">
+            <label class="checkbox">
+                <input type="checkbox" id="stream" checked>
+                Start playback while the audio is being generated
+            </label>
+        </div>
+
         <button type="submit" id="submitBtn">Generate Speech</button>
     </form>
 
@@ -156,39 +306,178 @@ HTML_TEMPLATE = """
         const downloadLink = document.getElementById('downloadLink');
         const submitBtn = document.getElementById('submitBtn');
 
+        const streamToggle = document.getElementById('stream');
+
+        // Offer a model choice when fine-tuned models are registered
+        fetch('/api/models').then((response) => response.json()).then((data) => {
+            if (!data.models || data.models.length < 2) return;
+            const select = document.getElementById('model');
+            for (const model of data.models) {
+                const option = document.createElement('option');
+                option.value = model.name;
+                option.textContent = model.name;
+                select.appendChild(option);
+            }
+            document.getElementById('modelGroup').style.display = 'block';
+        }).catch(() => {});
+
+        function showAudio(url) {
+            audioPlayer.src = url;
+            downloadLink.href = url;
+            result.style.display = 'block';
+        }
+
+        // Wrap raw 16-bit PCM chunks in a WAV header so the result can be replayed and downloaded
+        function pcmToWavBlob(chunks, sampleRate) {
+            const dataLength = chunks.reduce((total, c) => total + c.byteLength, 0);
+            const header = new DataView(new ArrayBuffer(44));
+            const writeString = (offset, text) => {
+                for (let i = 0; i < text.length; i++) header.setUint8(offset + i, text.charCodeAt(i));
+            };
+            writeString(0, 'RIFF');
+            header.setUint32(4, 36 + dataLength, true);
+            writeString(8, 'WAVE');
+            writeString(12, 'fmt ');
+            header.setUint32(16, 16, true);
+            header.setUint16(20, 1, true);
+            header.setUint16(22, 1, true);
+            header.setUint32(24, sampleRate, true);
+            header.setUint32(28, sampleRate * 2, true);
+            header.setUint16(32, 2, true);
+            header.setUint16(34, 16, true);
+            writeString(36, 'data');
+            header.setUint32(40, dataLength, true);
+            return new Blob([header, ...chunks], { type: 'audio/wav' });
+        }
+
+        // Play /api/stream output through Web Audio as chunks arrive
+        async function streamSpeech(formData) {
+            const response = await fetch('/api/stream', { method: 'POST', body: formData });
+            if ((response.headers.get('Content-Type') || '').includes('application/json')) {
+                const data = await response.json();
+                throw new Error(data.error);
+            }
+
+            const audioContext = new AudioContext();
+            const reader = response.body.getReader();
+            const chunks = [];
+            let sampleRate = null;
+            let pending = new Uint8Array(0);
+            let playAt = 0;
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                let bytes = new Uint8Array(pending.length + value.length);
+                bytes.set(pending);
+                bytes.set(value, pending.length);
+
+                if (sampleRate === null) {
+                    if (bytes.length < 44) {
+                        pending = bytes;
+                        continue;
+                    }
+                    sampleRate = new DataView(bytes.buffer).getUint32(24, true);
+                    bytes = bytes.slice(44);
+                }
+
+                // Keep an odd trailing byte for the next read
+                const usable = bytes.length - (bytes.length % 2);
+                pending = bytes.slice(usable);
+                if (usable === 0) continue;
+
+                const samples = new Int16Array(bytes.slice(0, usable).buffer);
+                chunks.push(samples);
+
+                const buffer = audioContext.createBuffer(1, samples.length, sampleRate);
+                const channel = buffer.getChannelData(0);
+                for (let i = 0; i < samples.length; i++) channel[i] = samples[i] / 32768;
+
+                const source = audioContext.createBufferSource();
+                source.buffer = buffer;
+                source.connect(audioContext.destination);
+                playAt = Math.max(playAt, audioContext.currentTime + 0.05);
+                source.start(playAt);
+                playAt += buffer.duration;
+
+                status.textContent = 'Playing while generating...';
+            }
+
+            if (sampleRate === null) throw new Error('No audio received');
+            return URL.createObjectURL(pcmToWavBlob(chunks, sampleRate));
+        }
+
         form.addEventListener('submit', async (e) => {
             e.preventDefault();
 
             submitBtn.disabled = true;
-            status.textContent = 'Processing... This may take a minute...';
+            status.textContent = 'Submitting...';
             status.className = 'status';
             result.style.display = 'none';
 
             const formData = new FormData(form);
 
+            const showError = (message) => {
+                status.textContent = 'Error: ' + message;
+                status.className = 'status error';
+                submitBtn.disabled = false;
+            };
+
+            if (streamToggle.checked) {
+                try {
+                    status.textContent = 'Waiting for first audio...';
+                    const url = await streamSpeech(formData);
+                    status.textContent = 'Success!';
+                    showAudio(url);
+                    submitBtn.disabled = false;
+                } catch (error) {
+                    showError(error.message);
+                }
+                return;
+            }
+
             try {
-                const response = await fetch('/api/clone', {
+                const response = await fetch('/api/jobs', {
                     method: 'POST',
                     body: formData
                 });
 
                 const data = await response.json();
 
-                if (data.success) {
-                    status.textContent = 'Success!';
-                    audioPlayer.src = data.audio_url;
-                    downloadLink.href = data.audio_url;
-                    result.style.display = 'block';
-                } else {
-                    status.textContent = 'Error: ' + data.error;
-                    status.className = 'status error';
+                if (!data.success) {
+                    showError(data.error);
+                    return;
                 }
+
+                status.textContent = 'Queued...';
+                const events = new EventSource(data.events_url);
+
+                events.onmessage = (event) => {
+                    const job = JSON.parse(event.data);
+
+                    if (job.status === 'running') {
+                        status.textContent = job.total
+                            ? `Generating... ${job.completed}/${job.total} sentences`
+                            : 'Generating...';
+                    } else if (job.status === 'done') {
+                        events.close();
+                        status.textContent = 'Success!';
+                        showAudio(job.audio_url);
+                        submitBtn.disabled = false;
+                    } else if (job.status === 'failed') {
+                        events.close();
+                        showError(job.error);
+                    }
+                };
+
+                events.onerror = () => {
+                    events.close();
+                    showError('Lost connection to progress stream');
+                };
             } catch (error) {
-                status.textContent = 'Error: ' + error.message;
-                status.className = 'status error';
+                showError(error.message);
             }
-
-            submitBtn.disabled = false;
         });
     </script>
 </body>
@@ -196,62 +485,669 @@ HTML_TEMPLATE = """
 """
 
 
+def queue_depths():
+    depths = {("jobs",): get_job_manager().queue_depth()}
+    if model_loader is not None and model_loader.batcher is not None:
+        depths[("batch",)] = model_loader.batcher.queue_depth()
+    return depths
+
+
+def busy_workers():
+    if model_loader is None or model_loader.worker_pool is None:
+        return {}
+    stats = model_loader.worker_pool.stats()
+    return {(): stats["workers"] - stats["idle"]}
+
+
+def model_memory():
+    return {
+        (model["name"],): model["memory_mb"] * 1024 ** 2
+        for model in get_model_registry().list_models() if model["loaded"]
+    }
+
+
+metrics.register_gauge("xtts_queue_depth", "Work waiting to be processed", queue_depths, labels=("queue",))
+metrics.register_gauge("xtts_workers_busy", "Inference worker processes currently busy", busy_workers)
+metrics.register_gauge("xtts_model_memory_bytes", "Memory held by each loaded model", model_memory, labels=("model",))
+metrics.register_gauge("xtts_ready", "1 once the model is loaded and warm", lambda: {(): int(startup_state.ready)})
+metrics.register_gauge(
+    "xtts_startup_phase_seconds", "Duration of each startup phase",
+    lambda: {(name,): seconds for name, seconds in startup_state.to_dict()["phases"].items()},
+    labels=("phase",),
+)
+
+
+@app.before_request
+def track_request_start():
+    if metrics.METRICS_ENABLED and request.endpoint != "metrics_endpoint":
+        g.request_start = time.perf_counter()
+        metrics.REQUESTS_IN_FLIGHT.inc(1, request.endpoint or "unknown")
+
+
+def not_ready_error(endpoint):
+    """Error body for routes that need the model while background startup is unfinished, else None."""
+    if endpoint in MODEL_ENDPOINTS and startup_state.background and not startup_state.ready:
+        return {
+            "success": False,
+            "error": f"Model is {startup_state.status}, try again shortly",
+            "startup": startup_state.to_dict(),
+        }
+    return None
+
+
+@app.before_request
+def require_ready_model():
+    error = not_ready_error(request.endpoint)
+    if error is not None:
+        response = jsonify(error)
+        response.status_code = 503
+        response.headers["Retry-After"] = "10"
+        return response
+
+
+@app.after_request
+def track_request_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def track_request_end(exc):
+    start = g.pop("request_start", None)
+    if start is None:
+        return
+    endpoint = request.endpoint or "unknown"
+    status = "500" if exc is not None else str(g.pop("response_status", 500))
+    metrics.REQUESTS_IN_FLIGHT.dec(1, endpoint)
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint)
+    metrics.REQUESTS_TOTAL.inc(1, endpoint, status)
+
+
 @app.route("/")
 def index():
     return render_template_string(HTML_TEMPLATE)
 
 
-@app.route("/api/clone", methods=["POST"])
-def clone_voice():
+def wants_in_memory(form=None):
+    """In-memory mode is on globally (IN_MEMORY_MODE) or per request (in_memory=1)."""
+    form = request.form if form is None else form
+    return IN_MEMORY_MODE or form.get("in_memory") == "1"
+
+
+def resolve_speaker(in_memory=False, form=None, files=None):
+    """
+    Resolve the reference audio for a request.
+
+    Accepts either a `voice_id` form field naming a stored voice profile or
+    a `voice_sample` upload. In in-memory mode the upload is decoded straight
+    from the request into an InMemoryAudio buffer instead of being saved.
+    form and files default to those of the current Flask request.
+    Returns (speaker_wav, audio_hash, error).
+    """
+    form = request.form if form is None else form
+    files = request.files if files is None else files
+    voice_id = form.get("voice_id", "").strip()
+    if voice_id:
+        profile = get_voice_store().get(voice_id)
+        if profile is None:
+            return None, None, f"Unknown voice_id: {voice_id}"
+        return profile["samples"], profile["audio_hash"], None
+
+    # Check for voice sample
+    if "voice_sample" not in files:
+        return None, None, "No voice sample provided"
+
+    file = files["voice_sample"]
+    if file.filename == "":
+        return None, None, "No file selected"
+
+    if not allowed_file(file.filename):
+        return None, None, "Invalid file type"
+
+    if in_memory:
+        try:
+            with metrics.stage("decode"):
+                clip = InMemoryAudio.from_bytes(file.read())
+        except ValueError as e:
+            return None, None, str(e)
+        return clip, clip.content_hash, None
+
+    # Save uploaded file (content-addressed, so repeat uploads are stored once)
+    with metrics.stage("upload"):
+        input_path = get_voice_store().save_sample(file.stream, secure_filename(file.filename))
+    return input_path, None, None
+
+
+def parse_synthesis_request(in_memory=False, form=None, files=None):
+    """
+    Validate the text/language/voice/model fields shared by the synthesis endpoints.
+
+    Returns (params, error) where params holds the tts_to_file arguments
+    plus the requested model name. form and files default to those of the
+    current Flask request.
+    """
+    if form is None:
+        # Accessing the form parses the whole multipart body
+        with metrics.stage("upload"):
+            request.files
+        form, files = request.form, request.files
+    # Get text and language
+    text = form.get("text", "").strip()
+    if not text:
+        return None, "No text provided"
+
+    language = form.get("language", "en")
+
+    model = form.get("model", "").strip() or None
+    if not get_model_registry().has(model):
+        return None, f"Unknown model: {model}"
+
+    speaker_wav, audio_hash, error = resolve_speaker(in_memory=in_memory, form=form, files=files)
+    if error:
+        return None, error
+
+    return {
+        "text": text,
+        "language": language,
+        "speaker_wav": speaker_wav,
+        "audio_hash": audio_hash,
+        "model": model,
+    }, None
+
+
+def disconnect_probe():
+    """
+    Return a callable reporting whether the current request's client hung up.
+
+    The connection is readable with no data once the client has closed it.
+    Returns None when the server does not expose the socket (or it is TLS,
+    which cannot be peeked), so queued requests are then only shed by deadline.
+    """
+    sock = request.environ.get("werkzeug.socket") or request.environ.get("gunicorn.socket")
+    if sock is None or isinstance(sock, ssl.SSLSocket):
+        return None
+
+    def disconnected():
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    return disconnected
+
+
+def acquire_slot(loader, text_length, deadline=True):
+    """
+    Wait for an inference slot on the loader's device (see admission.py).
+
+    Returns (controller, ticket), or (None, None) when admission control is
+    disabled. Raises AdmissionRejected or ClientDisconnected. Called outside
+    a request (jobs), the wait does not watch for a disconnect.
+    """
+    if not ADMISSION_ENABLED:
+        return None, None
+    controller = get_admission_controller(loader.device)
+    probe = disconnect_probe() if has_request_context() else None
+    return controller, controller.acquire(text_length, is_disconnected=probe, deadline=deadline)
+
+
+def release_slot(controller, ticket, success=True):
+    if controller is not None:
+        controller.release(ticket, success=success)
+
+
+def shed_response(error):
+    """Response for a request turned away by admission control."""
+    if isinstance(error, ClientDisconnected):
+        # Nobody is listening; nginx's "client closed request" status keeps it out of the 5xx rates
+        return Response(status=499)
+    response = jsonify({"success": False, "error": str(error)})
+    response.status_code = error.status
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+@contextmanager
+def admitted(loader, text_length, deadline=True):
+    """Hold an inference slot for the duration of the block (see acquire_slot)."""
+    controller, ticket = acquire_slot(loader, text_length, deadline=deadline)
+    success = False
     try:
-        # Check for voice sample
-        if "voice_sample" not in request.files:
-            return jsonify({"success": False, "error": "No voice sample provided"})
+        yield
+        success = True
+    finally:
+        release_slot(controller, ticket, success)
 
-        file = request.files["voice_sample"]
-        if file.filename == "":
-            return jsonify({"success": False, "error": "No file selected"})
 
-        if not allowed_file(file.filename):
-            return jsonify({"success": False, "error": "Invalid file type"})
+def synthesize_job(progress_callback=None, model=None, **params):
+    """Job worker entry point: queue for a slot without a deadline, then synthesize."""
+    with loader_in_use(model) as loader, admitted(loader, len(params["text"]), deadline=False):
+        return synthesize_to_output(loader, progress_callback=progress_callback, **params)
 
-        # Get text and language
-        text = request.form.get("text", "").strip()
-        if not text:
-            return jsonify({"success": False, "error": "No text provided"})
 
-        language = request.form.get("language", "en")
+def write_output(audio: bytes) -> str:
+    """Save WAV bytes to OUTPUT_FOLDER under a new name and return the name."""
+    output_filename = f"{str(uuid.uuid4())[:8]}_output.wav"
+    with open(os.path.join(OUTPUT_FOLDER, output_filename), "wb") as f:
+        f.write(audio)
+    return output_filename
 
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        unique_id = str(uuid.uuid4())[:8]
-        input_path = os.path.join(UPLOAD_FOLDER, f"{unique_id}_{filename}")
-        file.save(input_path)
 
-        # Generate output path
-        output_filename = f"{unique_id}_output.wav"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+def synthesize_to_output(loader, text, speaker_wav, language, audio_hash=None, progress_callback=None,
+                         in_memory=False, save=False):
+    """
+    Synthesize speech with loader and return the URL of the result.
 
-        # Generate speech
-        loader = get_loader()
+    By default the result is written to OUTPUT_FOLDER. In in-memory mode it
+    is kept in the in-memory audio store instead, unless save is set.
+    """
+    if in_memory and not save:
+        buffer = io.BytesIO()
         loader.tts_to_file(
             text=text,
-            file_path=output_path,
-            speaker_wav=input_path,
+            file_path=buffer,
+            speaker_wav=speaker_wav,
             language=language,
+            audio_hash=audio_hash,
+            progress_callback=progress_callback,
+        )
+        return f"/audio/{get_audio_store().put(buffer.getvalue())}"
+
+    # Generate output path
+    unique_id = str(uuid.uuid4())[:8]
+    output_filename = f"{unique_id}_output.wav"
+    output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+
+    # Generate speech
+    loader.tts_to_file(
+        text=text,
+        file_path=output_path,
+        speaker_wav=speaker_wav,
+        language=language,
+        audio_hash=audio_hash,
+        progress_callback=progress_callback,
+    )
+    return f"/audio/{output_filename}"
+
+
+@app.route("/api/clone", methods=["POST"])
+def clone_voice():
+    try:
+        in_memory = wants_in_memory()
+        params, error = parse_synthesis_request(in_memory=in_memory)
+        if error:
+            return jsonify({"success": False, "error": error})
+
+        save = request.form.get("save") == "1"
+
+        # Return the audio itself in this response, saving the second round-trip
+        if request.form.get("response") == "audio":
+            buffer = io.BytesIO()
+            with loader_in_use(params.pop("model")) as loader, admitted(loader, len(params["text"])):
+                loader.tts_to_file(file_path=buffer, **params)
+            audio = buffer.getvalue()
+            if save:
+                write_output(audio)
+            return Response(audio, mimetype="audio/wav")
+
+        with loader_in_use(params.pop("model")) as loader, admitted(loader, len(params["text"])):
+            audio_url = synthesize_to_output(loader, in_memory=in_memory, save=save, **params)
+
+        return jsonify({
+            "success": True,
+            "audio_url": audio_url,
+        })
+
+    except (AdmissionRejected, ClientDisconnected) as e:
+        return shed_response(e)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+
+@app.route("/api/stream", methods=["POST"])
+def stream_voice():
+    """
+    Stream synthesized audio while it is generated.
+
+    The response is a WAV header followed by 16-bit PCM chunks, sent with
+    chunked transfer encoding, so clients can start playback after the
+    first chunk instead of after the whole synthesis.
+    """
+    try:
+        params, error = parse_synthesis_request(in_memory=wants_in_memory())
+        if error:
+            return jsonify({"success": False, "error": error})
+
+        # The model and the slot are held until the last chunk is sent
+        loader = acquire_loader(params.pop("model"))
+        try:
+            controller, ticket = acquire_slot(loader, len(params["text"]))
+            try:
+                chunks = loader.tts_stream(**params)
+            except Exception:
+                release_slot(controller, ticket, success=False)
+                raise
+        except Exception:
+            loader.release()
+            raise
+
+        def finish():
+            release_slot(controller, ticket)
+            loader.release()
+
+        response = Response(
+            wav_stream(chunks),
+            mimetype="audio/wav",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.call_on_close(finish)
+        return response
+
+    except (AdmissionRejected, ClientDisconnected) as e:
+        return shed_response(e)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+
+def wav_stream(chunks):
+    """Body of a streamed WAV response: the header, then each chunk as 16-bit PCM."""
+    yield streaming_wav_header(OUTPUT_SAMPLE_RATE)
+    for chunk in chunks:
+        yield pcm16_bytes(chunk)
+
+
+def parse_batch_items(form=None):
+    """
+    Read the `items` form field of /api/batch.
+
+    items is a JSON list of texts or of {"text", "language", "id"} objects;
+    language defaults to the `language` form field. Returns (items, error).
+    """
+    form = request.form if form is None else form
+    try:
+        raw = json.loads(form.get("items", ""))
+    except json.JSONDecodeError:
+        return None, "items must be a JSON list"
+    if not isinstance(raw, list) or not raw:
+        return None, "items must be a non-empty JSON list"
+    if len(raw) > BATCH_API_MAX_ITEMS:
+        return None, f"Too many items: {len(raw)} (limit {BATCH_API_MAX_ITEMS})"
+
+    default_language = form.get("language", "en")
+    items = []
+    for index, item in enumerate(raw):
+        if isinstance(item, str):
+            item = {"text": item}
+        if not isinstance(item, dict) or not str(item.get("text", "")).strip():
+            return None, f"Item {index} has no text"
+        name = f"{index + 1:04d}"
+        if item.get("id"):
+            name = f"{name}-{safe_name(str(item['id']))}"
+        items.append({
+            "id": item.get("id"),
+            "text": str(item["text"]).strip(),
+            "language": item.get("language") or default_language,
+            "file": f"{name}.wav",
+        })
+    return items, None
+
+
+def parse_batch_request(form=None, files=None):
+    """
+    Validate the items, model and voice of a /api/batch request.
+
+    Returns (batch, error) where batch holds items, model, speaker_wav and
+    audio_hash. form and files default to those of the current Flask request.
+    """
+    if form is None:
+        with metrics.stage("upload"):
+            request.files
+        form, files = request.form, request.files
+    items, error = parse_batch_items(form)
+    if error:
+        return None, error
+
+    model = form.get("model", "").strip() or None
+    if not get_model_registry().has(model):
+        return None, f"Unknown model: {model}"
+
+    speaker_wav, audio_hash, error = resolve_speaker(in_memory=True, form=form, files=files)
+    if error:
+        return None, error
+    return {"items": items, "model": model, "speaker_wav": speaker_wav, "audio_hash": audio_hash}, None
+
+
+def archive_stream(loader, items, speaker_wav, audio_hash):
+    """
+    Body of a /api/batch response: a zip archive streamed item by item.
+
+    Each WAV is yielded as soon as it is synthesized; manifest.json, with
+    every item's file or error, comes last.
+    """
+    sink = ArchiveStream()
+    manifest = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        for item in items:
+            entry = {"id": item["id"], "text": item["text"], "language": item["language"]}
+            try:
+                buffer = io.BytesIO()
+                loader.tts_to_file(
+                    text=item["text"],
+                    file_path=buffer,
+                    speaker_wav=speaker_wav,
+                    language=item["language"],
+                    audio_hash=audio_hash,
+                )
+                archive.writestr(item["file"], buffer.getvalue())
+                entry.update(success=True, file=item["file"])
+            except Exception as e:
+                entry.update(success=False, error=str(e))
+            manifest.append(entry)
+            data = sink.take()
+            if data:
+                yield data
+        archive.writestr("manifest.json", json.dumps({
+            "items": manifest,
+            "succeeded": sum(1 for entry in manifest if entry["success"]),
+            "failed": sum(1 for entry in manifest if not entry["success"]),
+        }, indent=2, ensure_ascii=False))
+    yield sink.take()
+
+
+@app.route("/api/batch", methods=["POST"])
+def batch_voice():
+    """
+    Synthesize a list of texts in one voice and stream back a zip archive.
+
+    The reference is conditioned once, before the response starts, so a bad
+    sample is still reported as a JSON error. Items are synthesized in order
+    and each WAV is streamed as soon as it is ready. The archive ends with
+    manifest.json, which lists every item with its file or its error; one
+    failed item does not stop the batch.
+    """
+    try:
+        batch, error = parse_batch_request()
+        if error:
+            return jsonify({"success": False, "error": error})
+
+        loader = acquire_loader(batch["model"])
+        try:
+            # One slot covers the whole archive. Like a job it waits its turn without a
+            # deadline: one summed over hundreds of items would be capped far below the
+            # time they take, and the batch would be shed under any load
+            controller, ticket = acquire_slot(loader, sum(len(item["text"]) for item in batch["items"]),
+                                              deadline=False)
+            try:
+                loader.get_conditioning_latents(batch["speaker_wav"], audio_hash=batch["audio_hash"])
+            except Exception:
+                release_slot(controller, ticket, success=False)
+                raise
+        except Exception:
+            loader.release()
+            raise
+
+    except (AdmissionRejected, ClientDisconnected) as e:
+        return shed_response(e)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+    response = Response(
+        archive_stream(loader, batch["items"], batch["speaker_wav"], batch["audio_hash"]),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=batch.zip",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+    def finish():
+        release_slot(controller, ticket)
+        loader.release()
+
+    response.call_on_close(finish)
+    return response
+
+
+@app.route("/api/jobs", methods=["POST"])
+def submit_job():
+    """Queue a synthesis job and return its ID immediately."""
+    try:
+        in_memory = wants_in_memory()
+        params, error = parse_synthesis_request(in_memory=in_memory)
+        if error:
+            return jsonify({"success": False, "error": error})
+
+        job = get_job_manager().submit(
+            synthesize_job,
+            in_memory=in_memory,
+            save=request.form.get("save") == "1",
+            **params,
         )
 
         return jsonify({
             "success": True,
-            "audio_url": f"/audio/{output_filename}",
+            "job_id": job.id,
+            "status_url": f"/api/jobs/{job.id}",
+            "events_url": f"/api/jobs/{job.id}/events",
+        }), 202
+
+    except QueueFullError as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+
+def job_status(job):
+    status = job.to_dict()
+    status["audio_url"] = status.pop("result")
+    return status
+
+
+@app.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": f"Unknown job: {job_id}"}), 404
+    return jsonify({"success": True, **job_status(job)})
+
+
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    """Server-Sent Events stream of job progress, ending when the job finishes."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": f"Unknown job: {job_id}"}), 404
+
+    def generate():
+        version = None
+        while True:
+            current = job.wait_for_change(version, timeout=SSE_KEEPALIVE_SECONDS)
+            if current == version:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            yield f"data: {json.dumps(job_status(job))}\n\n"
+            if job.finished:
+                return
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/voices", methods=["POST"])
+def create_voice():
+    """Register a voice profile from one or more uploaded samples."""
+    try:
+        files = [f for f in request.files.getlist("voice_sample") if f.filename]
+        if not files:
+            return jsonify({"success": False, "error": "No voice sample provided"})
+
+        for file in files:
+            if not allowed_file(file.filename):
+                return jsonify({"success": False, "error": f"Invalid file type: {file.filename}"})
+
+        model = request.form.get("model", "").strip() or None
+        if not get_model_registry().has(model):
+            return jsonify({"success": False, "error": f"Unknown model: {model}"})
+
+        store = get_voice_store()
+        sample_paths = [store.save_sample(f.stream, secure_filename(f.filename)) for f in files]
+        with loader_in_use(model) as loader:
+            profile = store.create_profile(
+                sample_paths,
+                name=request.form.get("name", "").strip() or None,
+                loader=loader,
+            )
+
+        return jsonify({
+            "success": True,
+            "voice_id": profile["voice_id"],
+            "name": profile["name"],
+            "num_samples": len(profile["samples"]),
         })
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
+@app.route("/api/voices")
+def list_voices():
+    """List registered voice profiles."""
+    profiles = get_voice_store().list_profiles()
+    return jsonify({
+        "voices": [
+            {
+                "voice_id": p["voice_id"],
+                "name": p["name"],
+                "num_samples": len(p["samples"]),
+                "created_at": p["created_at"],
+            }
+            for p in profiles
+        ]
+    })
+
+
+@app.route("/api/voices/<voice_id>", methods=["DELETE"])
+def delete_voice(voice_id):
+    if not get_voice_store().delete(voice_id):
+        return jsonify({"success": False, "error": f"Unknown voice_id: {voice_id}"}), 404
+    return jsonify({"success": True})
+
+
 @app.route("/audio/<filename>")
 def serve_audio(filename):
+    if filename.startswith(NAME_PREFIX):
+        audio = get_audio_store().get(filename)
+        if audio is None:
+            return jsonify({"success": False, "error": "Audio expired or not found"}), 404
+        return send_file(io.BytesIO(audio), mimetype="audio/wav", download_name=filename)
+
     return send_file(
         os.path.join(OUTPUT_FOLDER, filename),
         mimetype="audio/wav"
@@ -260,7 +1156,7 @@ def serve_audio(filename):
 
 @app.route("/api/models")
 def list_models():
-    """List current model information."""
+    """List the default model and all registered models with their memory use."""
     loader = get_loader()
     model_info = loader.get_model_info()
 
@@ -278,25 +1174,96 @@ def list_models():
         response["custom_checkpoint"] = model_info["checkpoint"]
     else:
         response["model_name"] = model_info["model"]
+    response["inference_engine"] = model_info["engine"]
 
-    return jsonify(response)
+    # Every servable model, loaded or not; select one with the `model` form field
+    registry = get_model_registry()
+    response["models"] = registry.list_models()
+    response["registry"] = registry.stats()
 
+    return jsonify(response)
 
-if __name__ == "__main__":
-    print("Starting Voice Cloning Web Server...")
-    print("Loading model (this may take a moment)...")
 
+@app.route("/api/stats")
+def cache_stats():
+    """Report cache hit/miss, batching, worker pool and admission counters."""
     loader = get_loader()
-    model_info = loader.get_model_info()
+    stats = {
+        "latent_cache": loader.latent_cache.stats(),
+        "preprocessing": get_preprocessor().stats(),
+    }
+    if loader.result_cache is not None:
+        stats["result_cache"] = loader.result_cache.stats()
+    if loader.segment_cache is not None:
+        stats["segment_cache"] = loader.segment_cache.stats()
+    if loader.batcher is not None:
+        stats["batching"] = {
+            "batches_run": loader.batcher.batches_run,
+            "items_run": loader.batcher.items_run,
+            "queue_depth": loader.batcher.queue_depth(),
+        }
+    if loader.worker_pool is not None:
+        stats["worker_pool"] = loader.worker_pool.stats()
+    if ADMISSION_ENABLED:
+        stats["admission"] = [controller.stats() for controller in all_controllers()]
+    return jsonify(stats)
 
-    print(f"Model loaded successfully!")
-    print(f"  Type: {model_info['type']}")
-    print(f"  Device: {model_info['device']}")
 
-    if model_info['type'] == 'custom':
-        print(f"  Config: {model_info['config']}")
-        print(f"  Checkpoint: {model_info['checkpoint']}")
+@app.route("/healthz")
+def healthz():
+    """Liveness: the process is up, startup has not failed and inference workers (if any) remain."""
+    state = startup_state.to_dict()
+    if state["status"] == FAILED:
+        return jsonify({"status": "failed", "error": state["error"]}), 500
+    pool = model_loader.worker_pool if model_loader is not None else None
+    if pool is not None and not pool.live_workers():
+        return jsonify({"status": "failed", "error": "Every inference worker has died"}), 500
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    """Readiness: the model is loaded and warmed up."""
+    if not startup_state.background and model_loader is None and startup_state.status == STARTING:
+        # Foreground mode: the model loads on first use
+        get_loader()
+    state = startup_state.to_dict()
+    return jsonify(state), 200 if startup_state.ready else 503
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus metrics in text exposition format."""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"success": False, "error": "Metrics are disabled"}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def load_on_startup():
+    """
+    Load the model in the background or right away, depending on BACKGROUND_LOAD.
+
+    Worker processes must be forked before the server starts its threads,
+    so with a worker pool the model is always loaded before binding.
+    """
+    background = BACKGROUND_LOAD
+    if background and worker_pool_enabled(get_device()):
+        print("WORKER_PROCESSES is set, so the model loads before the server starts")
+        background = False
+    if background:
+        print("Loading model in the background; /readyz reports when it is warm")
+        start_background(startup_state, lambda: report_model(get_loader()))
+    else:
+        print("Loading model (this may take a moment)...")
+        report_model(get_loader())
+        print("\nServer ready!")
+
+
+if __name__ == "__main__":
+    print("Starting Voice Cloning Web Server...")
+    load_on_startup()
 
-    print("\nServer ready!")
     print("Open http://localhost:5002 in your browser")
+    # HTTP/1.1 lets streamed responses use chunked transfer encoding
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
     app.run(host="0.0.0.0", port=5002, debug=False)
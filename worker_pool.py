@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Multi-Process Inference Worker Pool
+
+Loads the model once in the parent process and forks inference workers that
+share its weights copy-on-write: inference never writes to the weights, so
+their pages stay shared and resident memory does not grow with the number
+of workers. Each worker gets its own slice of the CPUs and a matching torch
+thread count, and a dispatcher hands each request to an idle worker.
+
+The pool plugs into XTTSModelLoader: once installed, cache lookups still
+happen in the parent, and only synthesis is sent to a worker.
+
+CPU only: CUDA contexts do not survive fork(), so GPU deployments run
+inference in-process.
+
+Workers are only forked at startup. A worker that dies is not replaced,
+since forking from the serving process could hand the new worker a lock
+that another thread held; the pool shrinks instead, and once every worker
+is gone /healthz fails so the process supervisor restarts the server.
+
+Environment Variables:
+    WORKER_PROCESSES: Number of forked inference workers; 0 disables the pool (default: 0)
+    WORKER_THREADS: torch threads per worker (default: size of the worker's CPU slice)
+"""
+
+import gc
+import io
+import multiprocessing
+import os
+import queue
+import traceback
+
+import torch
+
+import metrics
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "0"))
+
+# Stands in for an in-memory output buffer, which cannot cross the process boundary
+BUFFER_TARGET = "<buffer>"
+
+# Methods a worker will run on its loader
+WORKER_METHODS = {"tts_to_file", "tts_stream", "get_conditioning_latents"}
+
+
+def cpu_slices(num_workers: int) -> list:
+    """Split the CPUs this process may use into one contiguous slice per worker."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+
+    if num_workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(num_workers)]
+
+    size = len(cpus) // num_workers
+    slices = [cpus[i * size:(i + 1) * size] for i in range(num_workers)]
+    # Spread the remainder over the first workers
+    for i, cpu in enumerate(cpus[num_workers * size:]):
+        slices[i].append(cpu)
+    return slices
+
+
+def _send_metrics(conn):
+    records = metrics.drain_forwarded()
+    if records:
+        conn.send(("metrics", records))
+
+
+def _worker_main(conn, loader, cpus, num_threads):
+    """Worker loop: run loader methods on request and send results back."""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(num_threads)
+
+    # Caching, dispatch and /metrics are the parent's job
+    loader.worker_pool = None
+    loader.result_cache = None
+    # The parent's batch scheduler thread did not survive fork(); build our own
+    loader.batcher = None
+    metrics.start_forwarding()
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        if message == "cancel":
+            # Arrived after the stream it was meant for had already finished
+            continue
+
+        method, kwargs = message
+        try:
+            if method not in WORKER_METHODS:
+                raise ValueError(f"Unsupported worker method: {method}")
+
+            if method == "tts_stream":
+                for chunk in loader.tts_stream(**kwargs):
+                    conn.send(("chunk", chunk))
+                    # The parent asks to stop when its client goes away
+                    if conn.poll() and conn.recv() == "cancel":
+                        break
+                _send_metrics(conn)
+                conn.send(("ok", None))
+                continue
+
+            buffer = None
+            if method == "tts_to_file":
+                if kwargs.get("file_path") == BUFFER_TARGET:
+                    buffer = kwargs["file_path"] = io.BytesIO()
+                kwargs["progress_callback"] = lambda done, total: conn.send(("progress", (done, total)))
+
+            result = getattr(loader, method)(**kwargs)
+            _send_metrics(conn)
+            conn.send(("ok", buffer.getvalue() if buffer is not None else result))
+        except Exception as e:
+            traceback.print_exc()
+            _send_metrics(conn)
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class WorkerProcess:
+    """Parent-side handle for one forked worker."""
+
+    def __init__(self, index, context, loader, cpus, num_threads):
+        self.index = index
+        self.cpus = cpus
+        self.num_threads = num_threads
+        self.tasks_completed = 0
+        self.alive = True
+        self._context = context
+        self._loader = loader
+        self._start()
+
+    def _start(self):
+        self.conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self._loader, self.cpus, self.num_threads),
+            name=f"inference-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def retire(self):
+        """Stop using a worker that failed; it is not replaced (see the module docstring)."""
+        print(f"Warning: inference worker {self.index} died and was removed from the pool")
+        self.alive = False
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Dispatches loader calls to idle forked workers."""
+
+    def __init__(self, loader, num_workers: int = WORKER_PROCESSES, threads_per_worker: int = WORKER_THREADS):
+        loader.load_model()
+        # Keep the garbage collector from touching (and so copying) inherited object pages
+        gc.collect()
+        gc.freeze()
+
+        context = multiprocessing.get_context("fork")
+        self.workers = []
+        for index, cpus in enumerate(cpu_slices(num_workers)):
+            threads = threads_per_worker or len(cpus)
+            self.workers.append(WorkerProcess(index, context, loader, cpus, threads))
+            print(f"  Worker {index}: CPUs {cpus}, {threads} threads")
+
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def live_workers(self) -> int:
+        return sum(1 for worker in self.workers if worker.alive)
+
+    def _acquire(self):
+        while True:
+            if not self.live_workers():
+                raise RuntimeError("Every inference worker has died; the server needs a restart")
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+    def _release(self, worker):
+        if worker.alive:
+            self._idle.put(worker)
+
+    def _send(self, worker, message):
+        try:
+            worker.conn.send(message)
+        except OSError:
+            worker.retire()
+            raise RuntimeError(f"Inference worker {worker.index} died")
+
+    def _receive(self, worker):
+        """Next message from a worker; metrics it forwards are applied on the way."""
+        while True:
+            try:
+                kind, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.retire()
+                raise RuntimeError(f"Inference worker {worker.index} died")
+            if kind != "metrics":
+                return kind, payload
+            metrics.replay(payload)
+
+    def call(self, method: str, progress_callback=None, **kwargs):
+        """Run loader.method(**kwargs) on an idle worker and return its result."""
+        worker = self._acquire()
+        try:
+            self._send(worker, (method, kwargs))
+            while True:
+                kind, payload = self._receive(worker)
+                if kind == "progress":
+                    if progress_callback:
+                        progress_callback(*payload)
+                elif kind == "error":
+                    raise RuntimeError(payload)
+                else:
+                    worker.tasks_completed += 1
+                    return payload
+        finally:
+            self._release(worker)
+
+    def stream(self, method: str, **kwargs):
+        """
+        Run a generator method on an idle worker and return an iterator over its items.
+
+        The first item is awaited before returning, so errors raised before
+        the generator produces anything (e.g. bad reference audio) surface
+        here rather than mid-stream.
+        """
+        worker = self._acquire()
+        try:
+            self._send(worker, (method, kwargs))
+            first = self._receive(worker)
+            if first[0] == "error":
+                raise RuntimeError(first[1])
+        except BaseException:
+            self._release(worker)
+            raise
+        return self._iterate(worker, first)
+
+    def _iterate(self, worker, message):
+        finished = False
+        try:
+            while True:
+                kind, payload = message
+                if kind == "chunk":
+                    yield payload
+                elif kind == "error":
+                    finished = True
+                    raise RuntimeError(payload)
+                else:
+                    finished = True
+                    worker.tasks_completed += 1
+                    return
+                try:
+                    message = self._receive(worker)
+                except RuntimeError:
+                    finished = True
+                    raise
+        finally:
+            if not finished:
+                # Consumer stopped early: cancel and drain so the worker is clean for reuse
+                try:
+                    self._send(worker, "cancel")
+                    while self._receive(worker)[0] == "chunk":
+                        pass
+                except RuntimeError:
+                    pass
+            self._release(worker)
+
+    def tts_to_file(self, file_path, progress_callback=None, **kwargs):
+        """Synthesize on a worker; in-memory buffers are filled from the returned bytes."""
+        in_memory = not isinstance(file_path, (str, os.PathLike))
+        result = self.call(
+            "tts_to_file",
+            progress_callback=progress_callback,
+            file_path=BUFFER_TARGET if in_memory else file_path,
+            **kwargs,
+        )
+        if in_memory:
+            file_path.write(result)
+
+    def tts_stream(self, **kwargs):
+        return self.stream("tts_stream", **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.live_workers(),
+            "dead": len(self.workers) - self.live_workers(),
+            "idle": self._idle.qsize(),
+            "tasks_completed": sum(w.tasks_completed for w in self.workers),
+            "cpus": {w.index: w.cpus for w in self.workers},
+        }
+
+    def shutdown(self):
+        live = [worker for worker in self.workers if worker.alive]
+        for worker in live:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in live:
+            worker.process.join(timeout=5)
+
+
+def worker_pool_enabled(device: str, num_workers: int = WORKER_PROCESSES) -> bool:
+    """Whether start_worker_pool forks workers for a model on device."""
+    return num_workers > 0 and device == "cpu"
+
+
+def start_worker_pool(loader, num_workers: int = WORKER_PROCESSES):
+    """
+    Fork the worker pool and install it on the loader.
+
+    Call this right after the model is loaded and before serving threads
+    start, so workers are forked from a quiet process: a lock another
+    thread holds at fork() stays locked forever in the child.
+    """
+    if num_workers <= 0:
+        return None
+    if loader.device != "cpu":
+        print(f"Worker pool disabled: fork() is not supported with device {loader.device}")
+        return None
+
+    print(f"Starting {num_workers} inference worker processes...")
+    loader.worker_pool = WorkerPool(loader, num_workers)
+    return loader.worker_pool